@@ -0,0 +1,156 @@
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpResponse
+from django.views import View
+from rest_framework import exceptions
+from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from core.authentication import CachedTokenAuthentication
+from core.cache import (
+    aget_phone_search_results, aget_profile, aget_profile_cache_key, aset_phone_search_results, aset_profile
+)
+from core.models import Person
+from core.pagination import AsyncLimitOffsetPagination, KeysetPagination
+from core.phone import phone_number_key
+from core.routers import achoose_read_database, read_database, read_from_primary
+from core.serializers import (
+    PersonSerializer,
+    ProfileQueryParamSerializer,
+    SearchQueryParamSerializer,
+    SearchResultSerializer
+)
+from core.throttling import TokenBucketThrottle
+
+
+class AsyncAPIView(View):
+    """
+    Base of the async API views. DRF views only run synchronously, so this implements the
+    parts of APIView the async views need: token authentication, the IsAuthenticated check,
+    throttling, API exception handling and JSON rendering. With read_from_replica, safe
+    requests read from a replica as with core.routers.ReplicaReadMixin.
+    """
+    authentication = CachedTokenAuthentication()
+    throttle_class = TokenBucketThrottle
+    renderer = JSONRenderer()
+    authentication_required = True
+    read_from_replica = False
+
+    async def dispatch(self, request, *args, **kwargs):
+        request = Request(request)
+        token = read_database.set(None)
+        try:
+            user_auth = await self.authentication.aauthenticate(request)
+            if user_auth is not None:
+                request.user, request.auth = user_auth
+            elif self.authentication_required:
+                raise exceptions.NotAuthenticated()
+            else:
+                request.user, request.auth = AnonymousUser(), None
+            await self.check_throttles(request)
+            if self.read_from_replica and request.method in SAFE_METHODS:
+                read_database.set(await achoose_read_database(request.user))
+            return await super().dispatch(request, *args, **kwargs)
+        except exceptions.APIException as exc:
+            return self.handle_exception(request, exc)
+        finally:
+            read_database.reset(token)
+
+    async def check_throttles(self, request):
+        throttle = self.throttle_class()
+        if not await throttle.aallow_request(request, self):
+            raise exceptions.Throttled(throttle.wait())
+
+    def handle_exception(self, request, exc):
+        """
+        Return the error response of an API exception, as DRF's exception handler does.
+        """
+        headers = {}
+        if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+            exc.status_code = 401
+            headers['WWW-Authenticate'] = self.authentication.authenticate_header(request)
+        if getattr(exc, 'wait', None):
+            headers['Retry-After'] = '%d' % exc.wait
+        data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+        return self.render(data, status=exc.status_code, headers=headers)
+
+    def render(self, data, status=200, headers=None):
+        return HttpResponse(
+            self.renderer.render(data), status=status, headers=headers, content_type=self.renderer.media_type
+        )
+
+
+class AsyncSearchView(AsyncAPIView):
+    """
+    Async version of SearchView, running the search queries with the async ORM and cache.
+    """
+    authentication_required = False
+    read_from_replica = True
+    name_keyset_ordering = ('order_field', 'display_name', 'id')
+
+    def get_throttle_cost(self, request):
+        if request.query_params.get('search_by') == SearchQueryParamSerializer.NAME:
+            return settings.THROTTLE_NAME_SEARCH_COST
+        return 1
+
+    async def get(self, request, *args, **kwargs):
+        query_params = SearchQueryParamSerializer(data=request.query_params)
+        query_params.is_valid(raise_exception=True)
+        query_params = query_params.validated_data
+
+        if query_params['search_by'] == SearchQueryParamSerializer.NAME:
+            people = Person.objects.search_names(query_params['name'])
+            if KeysetPagination.cursor_query_param in request.query_params:
+                paginator = KeysetPagination(self.name_keyset_ordering)
+            else:
+                paginator = AsyncLimitOffsetPagination()
+            page = await paginator.apaginate_queryset(people, request, view=self)
+            if page is None:
+                return self.render(SearchResultSerializer([person async for person in people], many=True).data)
+            data = SearchResultSerializer(page, many=True).data
+        else:
+            phone_number = query_params['phone_number']
+            results = await aget_phone_search_results(phone_number)
+            if results is None:
+                with read_from_primary():
+                    people = await self.get_people_by_phone_number(phone_number)
+                results = [dict(result) for result in SearchResultSerializer(people, many=True).data]
+                await aset_phone_search_results(phone_number, results)
+            paginator = LimitOffsetPagination()
+            data = paginator.paginate_queryset(results, request, view=self)
+            if data is None:
+                return self.render(results)
+        return self.render(paginator.get_paginated_response(data).data)
+
+    async def get_people_by_phone_number(self, phone_number):
+        """
+        Return the registered user with the phone number, else the names it is saved under.
+        """
+        phone_keys = [phone_number_key(phone_number)]
+        people = [person async for person in Person.objects.search_registered_users(phone_keys)]
+        if people:
+            return people
+        return [person async for person in Person.objects.search_contact_names(phone_keys)]
+
+
+class AsyncProfileView(AsyncAPIView):
+    """
+    Async version of ProfileView.
+    """
+    async def get(self, request, *args, **kwargs):
+        query_params = ProfileQueryParamSerializer(data=request.query_params)
+        query_params.is_valid(raise_exception=True)
+        phone_number = query_params.validated_data['phone_number']
+        cache_key = await aget_profile_cache_key(phone_number, request.user.pk)
+        profile = await aget_profile(cache_key)
+        if profile is None:
+            person = await Person.objects.get_profile_queryset(phone_number, request.user).afirst()
+            # Not adding registered user check here as only registered users will have email populated.
+            if person and not (person.saved_viewer or person.pk == request.user.pk):
+                person.email = None
+            profile = dict(PersonSerializer(person).data)
+            if person is not None:
+                await aset_profile(cache_key, profile)
+        return self.render(profile)
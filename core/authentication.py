@@ -0,0 +1,192 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework.authentication import TokenAuthentication, get_authorization_header
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.authtoken.models import Token
+
+# Fields of the user kept by the token caches, the id first, then the ones the authenticated
+# views read. The others, the password hash included, are loaded on access.
+CACHED_USER_FIELDS = ('id', 'phone_number', 'is_active')
+
+
+def get_cached_user_values(user):
+    """
+    Return the values of the cached fields of the user.
+    """
+    return tuple(getattr(user, field) for field in CACHED_USER_FIELDS)
+
+
+def get_cached_user(values):
+    """
+    Return a user instance built from the values of its cached fields, with the other fields
+    deferred. Every request gets its own instance, so it can't change the cached user.
+    """
+    return get_user_model().from_db(None, CACHED_USER_FIELDS, values)
+
+
+class TokenUserCache:
+    """
+    Thread safe in-process LRU cache of token key to the cached fields of its user, with a time
+    to live per entry. The keys of every user are indexed, to drop them without a scan.
+    """
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.user_keys = {}
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Return the cached user values of the token key, or None if missing or expired.
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            user_id, values, expires_at = entry
+            if expires_at < time.monotonic():
+                self.remove(key)
+                return None
+            self.entries.move_to_end(key)
+            return values
+
+    def set(self, key, values):
+        """
+        Cache the user values of the token key, as returned by get_cached_user_values.
+        """
+        user_id = values[0]
+        with self.lock:
+            self.remove(key)
+            self.entries[key] = (user_id, values, time.monotonic() + self.ttl)
+            self.user_keys.setdefault(user_id, set()).add(key)
+            while len(self.entries) > self.max_size:
+                self.remove(next(iter(self.entries)))
+
+    def remove(self, key):
+        """
+        Drop the entry of the token key, the lock being held.
+        """
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            keys = self.user_keys[entry[0]]
+            keys.discard(key)
+            if not keys:
+                del self.user_keys[entry[0]]
+
+    def delete(self, key):
+        with self.lock:
+            self.remove(key)
+
+    def delete_user(self, user_id):
+        """
+        Drop every cached token of the given user.
+        """
+        with self.lock:
+            for key in list(self.user_keys.get(user_id, ())):
+                self.remove(key)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.user_keys.clear()
+
+
+token_user_cache = TokenUserCache(settings.TOKEN_AUTH_CACHE_SIZE, settings.TOKEN_AUTH_CACHE_TTL)
+
+
+def shared_token_cache_key(key):
+    return f'auth-token:{key}'
+
+
+def invalidate_token(key):
+    """
+    Drop a token from the in-process cache and, if enabled, the shared cache.
+    """
+    token_user_cache.delete(key)
+    if settings.TOKEN_AUTH_SHARED_CACHE:
+        cache.delete(shared_token_cache_key(key))
+
+
+def invalidate_user_tokens(user_id):
+    """
+    Drop every token of a user from the in-process cache and, if enabled, the shared cache.
+    """
+    token_user_cache.delete_user(user_id)
+    if settings.TOKEN_AUTH_SHARED_CACHE:
+        keys = Token.objects.filter(user_id=user_id).values_list('key', flat=True)
+        cache.delete_many([shared_token_cache_key(key) for key in keys])
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Token authentication which caches token to user lookups in a bounded in-process LRU, and
+    optionally in the shared cache, so repeat requests skip the token query. Only the
+    CACHED_USER_FIELDS of the user are cached. Entries expire
+    after TOKEN_AUTH_CACHE_TTL seconds, which bounds how long another process may keep
+    accepting a deleted token or a deactivated user.
+    """
+    def authenticate_credentials(self, key):
+        values = token_user_cache.get(key)
+        if values is None and settings.TOKEN_AUTH_SHARED_CACHE:
+            values = cache.get(shared_token_cache_key(key))
+            if values is not None:
+                token_user_cache.set(key, values)
+        if values is None:
+            user, token = super().authenticate_credentials(key)
+            self.cache_user(key, user)
+            return (user, token)
+        user = get_cached_user(values)
+        return (user, Token(key=key, user=user))
+
+    def cache_user(self, key, user):
+        """
+        Cache the fields of the user of the token key in process and, if enabled, in the
+        shared cache.
+        """
+        values = get_cached_user_values(user)
+        token_user_cache.set(key, values)
+        if settings.TOKEN_AUTH_SHARED_CACHE:
+            cache.set(shared_token_cache_key(key), values, settings.TOKEN_AUTH_CACHE_TTL)
+
+    async def aauthenticate(self, request):
+        """
+        Async version of authenticate, for views using the async ORM.
+        """
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) == 1:
+            raise AuthenticationFailed(_('Invalid token header. No credentials provided.'))
+        elif len(auth) > 2:
+            raise AuthenticationFailed(_('Invalid token header. Token string should not contain spaces.'))
+        try:
+            key = auth[1].decode()
+        except UnicodeError:
+            raise AuthenticationFailed(_('Invalid token header. Token string should not contain invalid characters.'))
+
+        values = token_user_cache.get(key)
+        if values is None and settings.TOKEN_AUTH_SHARED_CACHE:
+            values = await cache.aget(shared_token_cache_key(key))
+            if values is not None:
+                token_user_cache.set(key, values)
+        if values is None:
+            try:
+                token = await self.get_model().objects.select_related('user').aget(key=key)
+            except self.get_model().DoesNotExist:
+                raise AuthenticationFailed(_('Invalid token.'))
+            if not token.user.is_active:
+                raise AuthenticationFailed(_('User inactive or deleted.'))
+            values = get_cached_user_values(token.user)
+            token_user_cache.set(key, values)
+            if settings.TOKEN_AUTH_SHARED_CACHE:
+                await cache.aset(shared_token_cache_key(key), values, settings.TOKEN_AUTH_CACHE_TTL)
+            return (token.user, token)
+        user = get_cached_user(values)
+        return (user, Token(key=key, user=user))
@@ -0,0 +1,556 @@
+import asyncio
+import importlib
+import json
+import statistics
+import tempfile
+import threading
+import time
+import timeit
+from contextlib import contextmanager
+from io import StringIO
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection, connections
+from django.db.models import F
+from django.test import AsyncClient, override_settings
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from django.urls import clear_url_caches
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from core.authentication import token_user_cache
+from core.models import Person, UserContact
+from core.pool import get_connection_pool
+from core.renderers import FastJSONRenderer
+from core.serializers import (
+    FastSearchResultSerializer,
+    FastUserContactOutputSerializer,
+    SearchResultSerializer,
+    UserContactOutputSerializer
+)
+from core.spam_filter import spam_number_filter
+
+BUDGETS_PATH = Path(__file__).resolve().parent / 'benchmark_budgets.json'
+
+SCALES = {
+    'small': {'num_users': 200, 'num_contacts': 1000, 'num_spam_reports': 500},
+    'medium': {'num_users': 2000, 'num_contacts': 10000, 'num_spam_reports': 5000},
+    'large': {'num_users': 20000, 'num_contacts': 100000, 'num_spam_reports': 50000},
+}
+
+# Passwords of the generated users are random, the benchmark user gets a known one
+PASSWORD = 'benchmark-Password-1'
+
+
+class BenchmarkDataset:
+    """
+    Seeded dataset with the people and queries the benchmark requests are built from.
+    """
+    def __init__(self, scale, seed=0):
+        call_command('populate_db', bulk=True, seed=seed, stdout=StringIO(), **SCALES[scale])
+        # A third of the generated people become unregistered contacts, so phone search
+        # exercises both the registered user and the contact names paths.
+        person_ids = list(Person.objects.order_by('pk').values_list('pk', flat=True))
+        Person.objects.filter(pk__in=person_ids[1::3]).update(type='contact', password=None, email=None)
+
+        # The benchmark user is an admin, so it can read the metrics
+        self.user = Person.objects.filter(type='user').order_by('pk').first()
+        self.user.is_admin = True
+        self.user.set_password(PASSWORD)
+        self.user.save()
+        self.token = Token.objects.create(user=self.user)
+        self.registered_phone_number = Person.objects.filter(type='user').order_by('-pk').first().phone_number
+        contact = UserContact.objects.filter(contact__type='contact').select_related('contact').first()
+        self.contact_phone_number = contact.contact.phone_number
+        self.name_query = contact.name.split()[0][:4]
+        self.spam_phone_number = Person.objects.filter(spam_count__gt=0).order_by('pk').first().phone_number
+        self.batch_phone_numbers = list(Person.objects.order_by('pk').values_list('phone_number', flat=True)[:90])
+        self.batch_phone_numbers += [new_phone_number(entry, 6) for entry in range(10)]
+        self.counts = {name: count for name, count in SCALES[scale].items()}
+
+
+class Endpoint:
+    """
+    A benchmarked request. The request callable receives the client, the dataset and the
+    iteration number, so writes can use fresh data on every iteration.
+    """
+    def __init__(self, name, request):
+        self.name = name
+        self.request = request
+
+
+def new_phone_number(iteration, offset=0):
+    return f'+1999{offset:03d}{iteration:05d}'
+
+
+def streamed(response):
+    """
+    Consume a streamed response, so its queries run within the measured request.
+    """
+    if response.streaming:
+        response.getvalue()
+    return response
+
+
+ENDPOINTS = [
+    Endpoint('register', lambda client, data, i: client.post('/api/register/', {
+        'phone_number': new_phone_number(i, 1), 'name': 'Bench User', 'password': PASSWORD,
+    })),
+    Endpoint('login', lambda client, data, i: client.post('/api/login/', {
+        'phone_number': data.user.phone_number, 'password': PASSWORD,
+    })),
+    Endpoint('profile', lambda client, data, i: client.get('/api/profile/', {
+        'phone_number': data.registered_phone_number,
+    })),
+    Endpoint('contacts_list', lambda client, data, i: client.get('/api/contacts/')),
+    Endpoint('contacts_list_cursor', lambda client, data, i: client.get('/api/contacts/', {'cursor': ''})),
+    Endpoint('contacts_export', lambda client, data, i: streamed(client.get('/api/contacts/export/'))),
+    Endpoint('contacts_export_csv', lambda client, data, i: streamed(client.get('/api/contacts/export/', {
+        'export_format': 'csv',
+    }))),
+    Endpoint('contacts_create', lambda client, data, i: client.post('/api/contacts/', {
+        'phone_number': new_phone_number(i, 2), 'name': 'Bench Contact',
+    })),
+    Endpoint('contacts_sync', lambda client, data, i: client.post('/api/contacts/sync/', {
+        'contacts': [
+            {'phone_number': new_phone_number(i * 100 + entry, 3), 'name': f'Bench Sync {entry}'}
+            for entry in range(100)
+        ],
+    }, format='json')),
+    Endpoint('spam_report', lambda client, data, i: client.post('/api/spam/', {
+        'phone_number': new_phone_number(i, 4),
+    })),
+    Endpoint('spam_check_reported', lambda client, data, i: client.get('/api/spam/check/', {
+        'phone_number': data.spam_phone_number,
+    })),
+    Endpoint('spam_check_unreported', lambda client, data, i: client.get('/api/spam/check/', {
+        'phone_number': new_phone_number(i, 5),
+    })),
+    Endpoint('search_name', lambda client, data, i: client.get('/api/search/', {
+        'search_by': 'name', 'name': data.name_query,
+    })),
+    Endpoint('search_name_cursor', lambda client, data, i: client.get('/api/search/', {
+        'search_by': 'name', 'name': data.name_query, 'cursor': '',
+    })),
+    Endpoint('search_registered_phone_number', lambda client, data, i: client.get('/api/search/', {
+        'search_by': 'phone_number', 'phone_number': data.registered_phone_number,
+    })),
+    Endpoint('search_contact_phone_number', lambda client, data, i: client.get('/api/search/', {
+        'search_by': 'phone_number', 'phone_number': data.contact_phone_number,
+    })),
+    Endpoint('search_batch', lambda client, data, i: client.post('/api/search/batch/', {
+        'phone_numbers': data.batch_phone_numbers,
+    }, format='json')),
+    Endpoint('metrics', lambda client, data, i: client.get('/api/metrics/')),
+]
+
+
+def percentile(values, percent):
+    """
+    Return the given percentile of the values, interpolating between the closest ranks.
+    """
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method='inclusive')[percent - 1]
+
+
+@override_settings(THROTTLE_ENABLED=False)
+def run_benchmark(dataset, iterations=20, endpoints=ENDPOINTS):
+    """
+    Send every endpoint's request the given number of times through the test client and
+    return the p50/p95 latency in milliseconds and the most queries a request made, per
+    endpoint. Caches are cleared first, so the most queries include the cold path. The
+    benchmarks send far more requests than the throttle lets through, so it is disabled.
+    """
+    cache.clear()
+    token_user_cache.clear()
+    spam_number_filter.clear()
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Token {dataset.token.key}')
+    results = {}
+    for endpoint in endpoints:
+        latencies = []
+        max_queries = 0
+        for iteration in range(iterations):
+            with CaptureQueriesContext(connection) as queries:
+                started_at = time.perf_counter()
+                response = endpoint.request(client, dataset, iteration)
+                latencies.append((time.perf_counter() - started_at) * 1000)
+            if response.status_code >= 400:
+                raise AssertionError(f'{endpoint.name} returned {response.status_code}: {response.content[:200]}')
+            max_queries = max(max_queries, len(queries))
+        results[endpoint.name] = {
+            'iterations': iterations,
+            'p50_ms': round(percentile(latencies, 50), 3),
+            'p95_ms': round(percentile(latencies, 95), 3),
+            'max_queries': max_queries,
+        }
+    return results
+
+
+def load_budgets(path=BUDGETS_PATH):
+    with open(path) as budgets_file:
+        return json.load(budgets_file)
+
+
+def check_budgets(results, budgets, latency_tolerance=None):
+    """
+    Return a list of messages describing the endpoints exceeding their query count budget
+    or, unless latency_tolerance is None, their p95 latency baseline times the tolerance, and
+    the endpoints missing from either the results or the budgets.
+    """
+    violations = [f'{name}: no result' for name in budgets if name not in results]
+    for name, result in results.items():
+        budget = budgets.get(name)
+        if budget is None:
+            violations.append(f'{name}: no budget')
+            continue
+        if result['max_queries'] > budget['max_queries']:
+            violations.append(f"{name}: {result['max_queries']} queries, budget is {budget['max_queries']}")
+        if latency_tolerance is not None and result['p95_ms'] > budget['p95_ms'] * latency_tolerance:
+            violations.append(
+                f"{name}: p95 {result['p95_ms']}ms, baseline is {budget['p95_ms']}ms x {latency_tolerance}"
+            )
+    return violations
+
+
+# Endpoints served by both the sync and the async views
+CONCURRENCY_ENDPOINTS = [
+    'profile', 'search_name', 'search_name_cursor', 'search_registered_phone_number', 'search_contact_phone_number',
+]
+
+
+@contextmanager
+def serve_async_views(enabled):
+    """
+    Route the endpoints having async versions to the async or the sync views meanwhile.
+    """
+    def reload_urls():
+        importlib.reload(importlib.import_module('core.urls'))
+        importlib.reload(importlib.import_module(settings.ROOT_URLCONF))
+        clear_url_caches()
+
+    try:
+        with override_settings(ASYNC_VIEWS=enabled):
+            reload_urls()
+            yield
+    finally:
+        reload_urls()
+
+
+def summarize(latencies, elapsed):
+    return {
+        'requests': len(latencies),
+        'throughput_rps': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p95_ms': round(percentile(latencies, 95), 3),
+    }
+
+
+def run_wsgi(dataset, endpoint, concurrency, requests):
+    """
+    Send the requests through the WSGI handler from concurrency threads.
+    """
+    latencies = []
+    next_request = iter(range(requests))
+    lock = threading.Lock()
+
+    def worker():
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {dataset.token.key}')
+        try:
+            while True:
+                with lock:
+                    iteration = next(next_request, None)
+                if iteration is None:
+                    return
+                started_at = time.perf_counter()
+                response = endpoint.request(client, dataset, iteration)
+                latency = (time.perf_counter() - started_at) * 1000
+                if response.status_code >= 400:
+                    raise AssertionError(f'{endpoint.name} returned {response.status_code}')
+                with lock:
+                    latencies.append(latency)
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started_at = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(latencies, time.perf_counter() - started_at)
+
+
+class TokenAsyncClient(AsyncClient):
+    """
+    Async test client sending a token with every request. Django 4.2 drops the headers given
+    to the AsyncClient constructor.
+    """
+    def __init__(self, token):
+        super().__init__()
+        self.token = token
+
+    def generic(self, *args, **kwargs):
+        if kwargs.get('headers') is None:
+            kwargs['headers'] = {'Authorization': f'Token {self.token}'}
+        return super().generic(*args, **kwargs)
+
+
+def run_asgi(dataset, endpoint, concurrency, requests):
+    """
+    Send the requests through the ASGI handler from concurrency tasks on one event loop.
+    """
+    latencies = []
+    next_request = iter(range(requests))
+
+    async def worker():
+        client = TokenAsyncClient(dataset.token.key)
+        for iteration in next_request:
+            started_at = time.perf_counter()
+            response = await endpoint.request(client, dataset, iteration)
+            latencies.append((time.perf_counter() - started_at) * 1000)
+            if response.status_code >= 400:
+                raise AssertionError(f'{endpoint.name} returned {response.status_code}')
+
+    async def main():
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+    started_at = time.perf_counter()
+    asyncio.run(main())
+    return summarize(latencies, time.perf_counter() - started_at)
+
+
+@override_settings(THROTTLE_ENABLED=False)
+def run_concurrency_benchmark(dataset, concurrency=8, requests=200, endpoint_names=CONCURRENCY_ENDPOINTS):
+    """
+    Compare the throughput and latency of the sync views behind the WSGI handler with the
+    async views behind the ASGI handler, with the same number of requests in flight.
+    """
+    endpoints = [endpoint for endpoint in ENDPOINTS if endpoint.name in endpoint_names]
+    results = {}
+    for mode, serve, async_views in [('wsgi', run_wsgi, False), ('asgi', run_asgi, True)]:
+        cache.clear()
+        token_user_cache.clear()
+        with serve_async_views(async_views):
+            results[mode] = {
+                endpoint.name: serve(dataset, endpoint, concurrency, requests) for endpoint in endpoints
+            }
+    return results
+
+
+# Endpoints cheap enough for the connection setup to show in their latency
+CONNECTION_ENDPOINTS = ['profile', 'search_registered_phone_number']
+
+
+def served(endpoint):
+    """
+    Return the endpoint closing the obsolete connections after every request, as the WSGI and
+    ASGI handlers do, which the test client skips.
+    """
+    def request(client, data, iteration):
+        response = endpoint.request(client, data, iteration)
+        close_old_connections()
+        return response
+    return Endpoint(endpoint.name, request)
+
+
+@contextmanager
+def connection_max_age(max_age):
+    """
+    Set the CONN_MAX_AGE of the connections opened meanwhile.
+    """
+    old_max_ages = {alias: connections.settings[alias]['CONN_MAX_AGE'] for alias in connections.settings}
+    try:
+        for alias in connections.settings:
+            connections.settings[alias]['CONN_MAX_AGE'] = max_age
+        yield
+    finally:
+        for alias, old_max_age in old_max_ages.items():
+            connections.settings[alias]['CONN_MAX_AGE'] = old_max_age
+
+
+@override_settings(THROTTLE_ENABLED=False)
+def run_connection_benchmark(dataset, concurrency=8, requests=200, endpoint_names=CONNECTION_ENDPOINTS):
+    """
+    Compare opening a database connection per request with persistent connections, sending the
+    requests from concurrency threads, and return the latency and the connection pool counters
+    of every endpoint and mode.
+    """
+    endpoints = [served(endpoint) for endpoint in ENDPOINTS if endpoint.name in endpoint_names]
+    pool = get_connection_pool()
+    results = {}
+    for mode, max_age in [('per_request', 0), ('persistent', settings.DATABASES['default']['CONN_MAX_AGE'] or 600)]:
+        results[mode] = {}
+        with connection_max_age(max_age):
+            for endpoint in endpoints:
+                cache.clear()
+                token_user_cache.clear()
+                connections.close_all()
+                pool.reset()
+                result = run_wsgi(dataset, endpoint, concurrency, requests)
+                result['pool'] = pool.stats()
+                results[mode][endpoint.name] = result
+    return results
+
+
+# Hashers of the login benchmark, Django's default PBKDF2 hashing in the request thread first
+LOGIN_HASHERS = {
+    'django_default': ['django.contrib.auth.hashers.PBKDF2PasswordHasher'],
+    'configured': settings.PASSWORD_HASHERS,
+}
+
+
+@override_settings(THROTTLE_ENABLED=False)
+def run_login_benchmark(dataset, concurrency=8, requests=100, login_hashers=LOGIN_HASHERS):
+    """
+    Send the login requests from concurrency threads with the benchmark user's password hashed
+    by every hasher setup, and return their latency, throughput and CPU time per login. The CPU
+    time of the process over the run is divided by the logins, giving the logins per core.
+    """
+    endpoint = next(endpoint for endpoint in ENDPOINTS if endpoint.name == 'login')
+    results = {}
+    for name, password_hashers in login_hashers.items():
+        with override_settings(PASSWORD_HASHERS=password_hashers):
+            dataset.user.set_password(PASSWORD)
+            dataset.user.save(update_fields=['password'])
+            cpu_started_at = time.process_time()
+            result = run_wsgi(dataset, endpoint, concurrency, requests)
+            cpu_time = time.process_time() - cpu_started_at
+        result['hasher'] = password_hashers[0]
+        result['cpu_ms_per_login'] = round(cpu_time / requests * 1000, 3)
+        result['logins_per_core_second'] = round(requests / cpu_time, 1)
+        results[name] = result
+    return results
+
+
+# Name, queryset, DRF serializer and values serializer of the serializer benchmark
+SERIALIZER_CASES = [
+    (
+        'contacts',
+        lambda: UserContact.objects.select_related('contact').order_by('id'),
+        UserContactOutputSerializer,
+        FastUserContactOutputSerializer,
+    ),
+    (
+        'search_results',
+        lambda: Person.objects.annotate(display_name=F('name')).select_related('spam_score').order_by('id'),
+        SearchResultSerializer,
+        FastSearchResultSerializer,
+    ),
+]
+
+
+def microseconds_per_row(function, rows, repeats):
+    """
+    Return the best time of the function over the repeats, in microseconds per row.
+    """
+    return round(min(timeit.repeat(function, number=1, repeat=repeats)) / max(rows, 1) * 1e6, 3)
+
+
+def run_serializer_benchmark(repeats=5):
+    """
+    Compare the per row cost of fetching model instances and serializing them with the DRF
+    serializer and JSONRenderer, with fetching .values() rows and serializing them with the
+    values serializer and FastJSONRenderer. Both must render the same bytes.
+    """
+    results = {}
+    for name, get_queryset, serializer_class, fast_serializer_class in SERIALIZER_CASES:
+        instances = list(get_queryset())
+        rows = list(fast_serializer_class.values(get_queryset()))
+        renderer, fast_renderer = JSONRenderer(), FastJSONRenderer()
+        content = renderer.render(serializer_class(instances, many=True).data)
+        if fast_renderer.render(fast_serializer_class(rows).data) != content:
+            raise AssertionError(f'{name}: the fast serializer output differs')
+        results[name] = {
+            'rows': len(rows),
+            'bytes': len(content),
+            'drf': {
+                'fetch_us_per_row': microseconds_per_row(lambda: list(get_queryset()), len(rows), repeats),
+                'serialize_us_per_row': microseconds_per_row(
+                    lambda: renderer.render(serializer_class(instances, many=True).data), len(rows), repeats
+                ),
+            },
+            'fast': {
+                'fetch_us_per_row': microseconds_per_row(
+                    lambda: list(fast_serializer_class.values(get_queryset())), len(rows), repeats
+                ),
+                'serialize_us_per_row': microseconds_per_row(
+                    lambda: fast_renderer.render(fast_serializer_class(rows).data), len(rows), repeats
+                ),
+            },
+        }
+    return results
+
+
+@contextmanager
+def benchmark_database(sqlite_file=False):
+    """
+    Run the block against a throwaway test database, so the configured database is never
+    touched. SQLite test databases live in memory and are never closed, with sqlite_file they
+    are a temporary file instead, so closing connections really closes them.
+    """
+    test_settings = connection.settings_dict['TEST']
+    test_name = test_settings.get('NAME')
+    with tempfile.TemporaryDirectory() as directory:
+        if sqlite_file and connection.vendor == 'sqlite':
+            test_settings['NAME'] = str(Path(directory) / 'benchmark.sqlite3')
+        setup_test_environment()
+        try:
+            old_database_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+            try:
+                yield
+            finally:
+                connection.creation.destroy_test_db(old_database_name, verbosity=0)
+        finally:
+            teardown_test_environment()
+            test_settings['NAME'] = test_name
+
+
+class BenchmarkCommand(BaseCommand):
+    """
+    Base of the benchmark commands. Seeds a dataset of the --scale in a throwaway test
+    database, runs the command's scenario against it and writes the JSON report. Subclasses
+    add their arguments and implement run.
+    """
+    # Whether SQLite test databases are a file rather than in memory, see benchmark_database
+    sqlite_file = False
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=SCALES, default='small', help='Size of the seeded dataset')
+        parser.add_argument('--seed', type=int, default=0, help='Seed of the generated dataset')
+        parser.add_argument('--output', help='File to write the JSON results to, printed if omitted')
+
+    def run(self, dataset, **kwargs):
+        """
+        Run the benchmark against the dataset and return the entries of the report.
+        """
+        raise NotImplementedError
+
+    def check_report(self, report, **kwargs):
+        """
+        Check the report once written, raising CommandError when it fails.
+        """
+
+    def handle(self, *args, **kwargs):
+        with benchmark_database(self.sqlite_file):
+            dataset = BenchmarkDataset(kwargs['scale'], kwargs['seed'])
+            report = {
+                'scale': kwargs['scale'],
+                'seed': kwargs['seed'],
+                'database': connection.vendor,
+                **self.run(dataset, **kwargs),
+            }
+        content = json.dumps(report, indent=2)
+        if kwargs['output']:
+            with open(kwargs['output'], 'w') as output_file:
+                output_file.write(content)
+        else:
+            self.stdout.write(content)
+        self.check_report(report, **kwargs)
@@ -0,0 +1,129 @@
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from core.phone import phone_number_key
+
+
+def phone_search_cache_key(phone_number):
+    """
+    Return the cache key of the search results for a normalized phone number.
+    """
+    return f'phone-search:{phone_number_key(phone_number)}'
+
+
+def get_phone_search_results(phone_number):
+    """
+    Return the cached search results for a normalized phone number, or None on a miss.
+    """
+    return cache.get(phone_search_cache_key(phone_number))
+
+
+def set_phone_search_results(phone_number, results):
+    """
+    Cache the serialized search results for a normalized phone number.
+    """
+    cache.set(phone_search_cache_key(phone_number), results, settings.PHONE_SEARCH_CACHE_TIMEOUT)
+
+
+async def aget_phone_search_results(phone_number):
+    """
+    Async version of get_phone_search_results.
+    """
+    return await cache.aget(phone_search_cache_key(phone_number))
+
+
+async def aset_phone_search_results(phone_number, results):
+    """
+    Async version of set_phone_search_results.
+    """
+    await cache.aset(phone_search_cache_key(phone_number), results, settings.PHONE_SEARCH_CACHE_TIMEOUT)
+
+
+def get_many_phone_search_results(phone_numbers):
+    """
+    Return a mapping of normalized phone number to cached search results, for the numbers
+    whose results are cached.
+    """
+    keys = {phone_search_cache_key(phone_number): phone_number for phone_number in phone_numbers}
+    return {keys[key]: results for key, results in cache.get_many(keys).items()}
+
+
+def set_many_phone_search_results(results_by_phone_number):
+    """
+    Cache the serialized search results of many normalized phone numbers.
+    """
+    cache.set_many(
+        {phone_search_cache_key(phone_number): results for phone_number, results in results_by_phone_number.items()},
+        settings.PHONE_SEARCH_CACHE_TIMEOUT,
+    )
+
+
+def invalidate_phone_search_results(*phone_numbers):
+    """
+    Drop the cached search results of the given normalized phone numbers once the current
+    transaction commits, so a concurrent search can't cache the old rows again.
+    """
+    keys = [phone_search_cache_key(phone_number) for phone_number in phone_numbers]
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def profile_version_cache_key(phone_number):
+    return f'profile-version:{phone_number_key(phone_number)}'
+
+
+def profile_cache_key(phone_number, viewer_id, version):
+    return f'profile:{phone_number_key(phone_number)}:{version}:{viewer_id}'
+
+
+def get_profile_cache_key(phone_number, viewer_id):
+    """
+    Return the cache key of the profile of a normalized phone number as seen by the viewer, in
+    the current version of the profile. Versions are random, so a profile whose version was
+    evicted or expired never gets an older version's entries back.
+    """
+    version_key = profile_version_cache_key(phone_number)
+    version = cache.get(version_key)
+    if version is None:
+        cache.add(version_key, uuid.uuid4().hex, settings.PROFILE_VERSION_CACHE_TIMEOUT)
+        version = cache.get(version_key)
+    return profile_cache_key(phone_number, viewer_id, version)
+
+
+async def aget_profile_cache_key(phone_number, viewer_id):
+    """
+    Async version of get_profile_cache_key.
+    """
+    version_key = profile_version_cache_key(phone_number)
+    version = await cache.aget(version_key)
+    if version is None:
+        await cache.aadd(version_key, uuid.uuid4().hex, settings.PROFILE_VERSION_CACHE_TIMEOUT)
+        version = await cache.aget(version_key)
+    return profile_cache_key(phone_number, viewer_id, version)
+
+
+def get_profile(cache_key):
+    return cache.get(cache_key)
+
+
+def set_profile(cache_key, profile):
+    cache.set(cache_key, profile, settings.PROFILE_CACHE_TIMEOUT)
+
+
+async def aget_profile(cache_key):
+    return await cache.aget(cache_key)
+
+
+async def aset_profile(cache_key, profile):
+    await cache.aset(cache_key, profile, settings.PROFILE_CACHE_TIMEOUT)
+
+
+def invalidate_profiles(*phone_numbers):
+    """
+    Move the profiles of the given normalized phone numbers to a new version once the current
+    transaction commits, dropping the profiles cached for every viewer at once.
+    """
+    versions = {profile_version_cache_key(phone_number): uuid.uuid4().hex for phone_number in phone_numbers}
+    transaction.on_commit(lambda: cache.set_many(versions, settings.PROFILE_VERSION_CACHE_TIMEOUT))
@@ -0,0 +1,45 @@
+from django.conf import settings
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Error, Tags, register
+from django.utils.module_loading import import_string
+
+SHARED_CACHE_HINT = 'Set CACHE_BACKEND to a shared backend, e.g. django.core.cache.backends.redis.RedisCache.'
+
+
+def uses_process_cache():
+    """
+    Return whether the default cache is local to each process.
+    """
+    return issubclass(import_string(settings.CACHES['default']['BACKEND']), LocMemCache)
+
+
+@register(Tags.caches, Tags.database)
+def check_replica_cache(app_configs, **kwargs):
+    """
+    The users reading from the primary after they write are noted in the cache, see
+    core.routers, so with replicas every process must see the same cache.
+    """
+    if settings.DATABASE_REPLICAS and uses_process_cache():
+        return [Error(
+            'DATABASE_REPLICAS require a cache shared by every process, users reading their own '
+            'writes from the primary are noted in the cache.',
+            hint=SHARED_CACHE_HINT,
+            id='core.E001',
+        )]
+    return []
+
+
+@register(Tags.caches, deploy=True)
+def check_deployed_cache(app_configs, **kwargs):
+    """
+    Cached search results, profiles and spam scores are dropped when they change, which a
+    cache local to each process only does in the process making the change.
+    """
+    if not settings.DEBUG and uses_process_cache():
+        return [Error(
+            'The cache is local to each process, cached entries would only be invalidated in the '
+            'process making the change.',
+            hint=SHARED_CACHE_HINT,
+            id='core.E002',
+        )]
+    return []
@@ -0,0 +1,23 @@
+from faker import Faker
+
+
+def fake_people(batch):
+    """
+    Return a list of (name, email) tuples for a (seed, count) batch, generated by a Faker
+    seeded with the batch seed. Kept free of Django imports so it can run in worker processes.
+    """
+    seed, count = batch
+    fake = Faker()
+    fake.seed_instance(seed)
+    return [(fake.name(), fake.email()) for _ in range(count)]
+
+
+def fake_names(batch):
+    """
+    Return a list of names for a (seed, count) batch, generated by a Faker seeded with the
+    batch seed.
+    """
+    seed, count = batch
+    fake = Faker()
+    fake.seed_instance(seed)
+    return [fake.name() for _ in range(count)]
@@ -0,0 +1,72 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from django.conf import settings
+from django.contrib.auth import hashers
+
+# Marks the hashing pool threads
+_worker = threading.local()
+
+
+def _mark_worker():
+    _worker.active = True
+
+
+@lru_cache(maxsize=None)
+def get_hashing_executor():
+    """
+    Return the pool of PASSWORD_HASHING_WORKERS threads hashing passwords in this process.
+    """
+    return ThreadPoolExecutor(
+        max_workers=settings.PASSWORD_HASHING_WORKERS,
+        thread_name_prefix='password-hashing',
+        initializer=_mark_worker,
+    )
+
+
+def run_in_hashing_pool(function, *args, **kwargs):
+    """
+    Call the function in the hashing pool and return its result, so no more than
+    PASSWORD_HASHING_WORKERS passwords are hashed at once and a login storm queues instead of
+    taking every CPU of the worker. The hash functions release the GIL, so other requests keep
+    running meanwhile. Calls made from a pool thread, such as PBKDF2's verify calling encode,
+    run inline as waiting for another pool thread could deadlock.
+    """
+    if settings.PASSWORD_HASHING_WORKERS <= 0 or getattr(_worker, 'active', False):
+        return function(*args, **kwargs)
+    return get_hashing_executor().submit(function, *args, **kwargs).result()
+
+
+class PooledHasherMixin:
+    """
+    Mixin for password hashers computing their hashes in the hashing pool.
+    """
+    def encode(self, password, salt, *args, **kwargs):
+        return run_in_hashing_pool(super().encode, password, salt, *args, **kwargs)
+
+    def verify(self, password, encoded):
+        return run_in_hashing_pool(super().verify, password, encoded)
+
+
+class Argon2PasswordHasher(PooledHasherMixin, hashers.Argon2PasswordHasher):
+    """
+    Argon2id hasher with the ARGON2_* cost settings. Needs argon2-cffi.
+    """
+    time_cost = settings.ARGON2_TIME_COST
+    memory_cost = settings.ARGON2_MEMORY_COST
+    parallelism = settings.ARGON2_PARALLELISM
+
+
+class BCryptSHA256PasswordHasher(PooledHasherMixin, hashers.BCryptSHA256PasswordHasher):
+    """
+    bcrypt hasher with BCRYPT_ROUNDS rounds. Needs bcrypt.
+    """
+    rounds = settings.BCRYPT_ROUNDS
+
+
+class PBKDF2PasswordHasher(PooledHasherMixin, hashers.PBKDF2PasswordHasher):
+    """
+    PBKDF2-SHA256 hasher with PBKDF2_ITERATIONS iterations.
+    """
+    iterations = settings.PBKDF2_ITERATIONS
@@ -0,0 +1,47 @@
+import json
+
+from django.core.management.base import CommandError
+
+from core.benchmark import BUDGETS_PATH, BenchmarkCommand, check_budgets, load_budgets, run_benchmark
+
+
+class Command(BenchmarkCommand):
+    """
+    Run the command using
+    python manage.py benchmark_api --scale small --iterations 20 --output results.json
+
+    The benchmark runs against a throwaway test database, the configured database is never
+    touched.
+    """
+    help = 'Benchmark every API endpoint and check query count budgets and latency baselines'
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--iterations', type=int, default=20, help='Requests per endpoint')
+        parser.add_argument(
+            '--latency_tolerance', type=float, default=2.0,
+            help='Fail when a p95 latency exceeds its baseline times this factor'
+        )
+        parser.add_argument(
+            '--update_budgets', action='store_true',
+            help='Store this run as the budgets of the scale instead of checking them'
+        )
+
+    def run(self, dataset, **kwargs):
+        return {'dataset': dataset.counts, 'endpoints': run_benchmark(dataset, kwargs['iterations'])}
+
+    def check_report(self, report, **kwargs):
+        scale, results = kwargs['scale'], report['endpoints']
+        budgets = load_budgets()
+        if kwargs['update_budgets']:
+            budgets[scale] = {
+                name: {'max_queries': result['max_queries'], 'p95_ms': result['p95_ms']}
+                for name, result in results.items()
+            }
+            with open(BUDGETS_PATH, 'w') as budgets_file:
+                json.dump(budgets, budgets_file, indent=2)
+                budgets_file.write('\n')
+            return
+        violations = check_budgets(results, budgets.get(scale, {}), kwargs['latency_tolerance'])
+        if violations:
+            raise CommandError('Benchmark budgets exceeded:\n' + '\n'.join(violations))
@@ -0,0 +1,23 @@
+from core.benchmark import BenchmarkCommand, run_concurrency_benchmark
+
+
+class Command(BenchmarkCommand):
+    """
+    Run the command using
+    python manage.py benchmark_asgi --scale small --concurrency 8 --requests 200
+
+    The benchmark runs against a throwaway test database, the configured database is never
+    touched.
+    """
+    help = 'Compare the throughput of the sync views under WSGI with the async views under ASGI'
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--concurrency', type=int, default=8, help='Requests in flight at any time')
+        parser.add_argument('--requests', type=int, default=200, help='Requests per endpoint and mode')
+
+    def run(self, dataset, **kwargs):
+        return {
+            'concurrency': kwargs['concurrency'],
+            'endpoints': run_concurrency_benchmark(dataset, kwargs['concurrency'], kwargs['requests']),
+        }
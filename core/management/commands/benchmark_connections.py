@@ -0,0 +1,40 @@
+from django.test.utils import override_settings
+
+from core.benchmark import BenchmarkCommand, run_connection_benchmark
+from core.pool import get_connection_pool
+
+
+class Command(BenchmarkCommand):
+    """
+    Run the command using
+    python manage.py benchmark_connections --scale small --concurrency 8 --pool_size 4
+
+    The benchmark runs against a throwaway test database, the configured database is never
+    touched. SQLite test databases live in memory and are never closed, so with SQLite the
+    test database is a temporary file instead. Run it against the local MySQL server to
+    measure the real connection setup cost.
+    """
+    help = 'Compare opening a database connection per request with persistent connections'
+    sqlite_file = True
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--concurrency', type=int, default=8, help='Threads sending requests')
+        parser.add_argument('--requests', type=int, default=200, help='Requests per endpoint and mode')
+        parser.add_argument('--pool_size', type=int, help='Connection pool size, DB_POOL_SIZE if omitted')
+
+    def run(self, dataset, **kwargs):
+        return {
+            'concurrency': kwargs['concurrency'],
+            'pool_size': get_connection_pool().size,
+            'endpoints': run_connection_benchmark(dataset, kwargs['concurrency'], kwargs['requests']),
+        }
+
+    def handle(self, *args, **kwargs):
+        pool_settings = {'DB_POOL_SIZE': kwargs['pool_size']} if kwargs['pool_size'] else {}
+        get_connection_pool.cache_clear()
+        try:
+            with override_settings(**pool_settings):
+                super().handle(*args, **kwargs)
+        finally:
+            get_connection_pool.cache_clear()
@@ -0,0 +1,26 @@
+from django.conf import settings
+
+from core.benchmark import BenchmarkCommand, run_login_benchmark
+
+
+class Command(BenchmarkCommand):
+    """
+    Run the command using
+    python manage.py benchmark_login --concurrency 8 --requests 100
+
+    The benchmark runs against a throwaway test database, the configured database is never
+    touched.
+    """
+    help = "Compare the login throughput per core of Django's default hasher and the configured one"
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--concurrency', type=int, default=8, help='Threads sending logins')
+        parser.add_argument('--requests', type=int, default=100, help='Logins per hasher')
+
+    def run(self, dataset, **kwargs):
+        return {
+            'concurrency': kwargs['concurrency'],
+            'hashing_workers': settings.PASSWORD_HASHING_WORKERS,
+            'hashers': run_login_benchmark(dataset, kwargs['concurrency'], kwargs['requests']),
+        }
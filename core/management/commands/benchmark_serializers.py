@@ -0,0 +1,20 @@
+from core.benchmark import BenchmarkCommand, run_serializer_benchmark
+from core.renderers import orjson
+
+
+class Command(BenchmarkCommand):
+    """
+    Run the command using
+    python manage.py benchmark_serializers --scale small --repeats 5
+
+    The benchmark runs against a throwaway test database, the configured database is never
+    touched.
+    """
+    help = 'Compare the per row cost of the DRF serializers with the fast values serializers'
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--repeats', type=int, default=5, help='Timed runs per case, the best one is kept')
+
+    def run(self, dataset, **kwargs):
+        return {'orjson': orjson is not None, 'serializers': run_serializer_benchmark(kwargs['repeats'])}
@@ -1,16 +1,37 @@
+import multiprocessing
 import random
+from array import array
+from contextlib import contextmanager
+from itertools import islice
 
-from django.core.management.base import BaseCommand
+from django.contrib.admin.models import LogEntry
 from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, connections
 from faker import Faker
+from rest_framework.authtoken.models import Token
 
-from core.models import Person, SpamReport, UserContact
+from core.fake_data import fake_names, fake_people
+from core.models import (
+    ContactNameAggregate, NameNgram, Person, SpamReport, SpamReportOutbox, SpamScore, UserContact, Watermark
+)
+from core.phone import phone_number_key
+from core.search import get_name_search_index
+
+# Subscriber numbers of generated phone numbers, all under the +1 country code
+FIRST_SUBSCRIBER_NUMBER = 2000000000
+LAST_SUBSCRIBER_NUMBER = 9999999999
 
 
 class Command(BaseCommand):
     """
     Run the command using 
     python manage.py populate_db --num_users 10 --num_contacts 50 --num_spam_reports 20
+
+    For load testing datasets use the bulk mode, e.g.
+    python manage.py populate_db --bulk --num_users 1000000 --num_contacts 5000000 \
+        --num_spam_reports 1000000 --batch_size 10000 --workers 4 --seed 42
     """
     help = 'Populate the database with sample data'
 
@@ -27,43 +48,193 @@ class Command(BaseCommand):
         parser.add_argument(
             '--num_spam_reports', type=int, default=200, help='Number of spam reports to create'
         )
+        parser.add_argument(
+            '--bulk', action='store_true', help='Insert rows with bulk_create in batches'
+        )
+        parser.add_argument(
+            '--batch_size', type=int, default=10000, help='Number of rows per batch in bulk mode'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=1, help='Number of processes generating fake data in bulk mode'
+        )
+        parser.add_argument(
+            '--seed', type=int, default=None, help='Seed for reproducible data'
+        )
 
     def handle(self, *args, **kwargs):
         num_users = kwargs['num_users']
         num_contacts = kwargs['num_contacts']
         num_spam_reports = kwargs['num_spam_reports']
 
-        fake = Faker()
+        max_pairs = num_users * (num_users - 1)
+        if num_contacts > max_pairs or num_spam_reports > max_pairs:
+            raise CommandError('Too many contacts or spam reports for the number of users')
+
+        self.random = random.Random(kwargs['seed'])
+        self.clear_data()
+        if kwargs['bulk']:
+            self.populate_bulk(
+                num_users, num_contacts, num_spam_reports,
+                kwargs['batch_size'], kwargs['workers'], kwargs['seed'],
+            )
+        else:
+            self.populate(num_users, num_contacts, num_spam_reports, kwargs['seed'])
+        SpamScore.objects.refresh(full=True, batch_size=kwargs['batch_size'])
+
+        self.stdout.write('Database populated with sample data')
+
+    def clear_data(self):
+        """
+        Delete existing people and every row referencing them. Tables are emptied with the
+        statements of the flush command, so no rows are collected and no per row signals run
+        for rows that are all going away.
+        """
+        models = [
+            ContactNameAggregate, NameNgram, SpamScore, Watermark, SpamReport, SpamReportOutbox,
+            UserContact, Token, LogEntry,
+        ]
+        models += [Person.groups.through, Person.user_permissions.through, Person]
+        connection.ops.execute_sql_flush(
+            connection.ops.sql_flush(no_style(), [model._meta.db_table for model in models])
+        )
+
+    def random_pairs(self, person_ids, count):
+        """
+        Yield count distinct (first, second) pairs of different person ids. The pairs are
+        spread evenly over the first ids, each pairing with a random sample of the others, so
+        only the pairs of one id are held at a time.
+        """
+        if not count:
+            return
+        num_people = len(person_ids)
+        pairs_per_person, extra_pairs = divmod(count, num_people)
+        for index, person_id in enumerate(person_ids):
+            size = pairs_per_person
+            # Selection sampling picks the ids getting one more pair without storing them
+            if self.random.randrange(num_people - index) < extra_pairs:
+                size += 1
+                extra_pairs -= 1
+            for offset in self.random.sample(range(num_people - 1), size):
+                # Offsets skip the id itself
+                yield person_id, person_ids[offset + (offset >= index)]
+
+    @contextmanager
+    def worker_map(self, workers):
+        """
+        Yield a map function running the fake data jobs in a pool of worker processes, or in
+        this process for a single worker.
+        """
+        if workers <= 1:
+            yield map
+            return
+        # Forked workers must not share the open database connections
+        connections.close_all()
+        with multiprocessing.Pool(workers) as pool:
+            yield pool.imap
 
-        # Clear existing data
-        Person.objects.all().delete()
+    def populate(self, num_users, num_contacts, num_spam_reports, seed):
+        """
+        Create the sample data one row at a time.
+        """
+        fake = Faker()
+        if seed is not None:
+            fake.seed_instance(seed)
 
-        # Create users
-        for _ in range(num_users):
+        # Create users, with distinct E.164 numbers as Faker's formats don't all normalize
+        phone_numbers = self.random.sample(range(FIRST_SUBSCRIBER_NUMBER, LAST_SUBSCRIBER_NUMBER + 1), num_users)
+        for number in phone_numbers:
             Person.objects.create(
                 name=fake.name(),
-                phone_number=fake.unique.phone_number()[:15],
+                phone_number=f'+1{number}',
                 email=fake.email(),
                 password=make_password(fake.password()),
                 type='user'
             )
 
         # Create contacts
-        person_ids = Person.objects.values_list('pk', flat=True)
-        for _ in range(num_contacts):
-            user_contact_list = random.sample(set(person_ids), 2)
+        person_ids = list(Person.objects.values_list('pk', flat=True))
+        for user_id, contact_id in self.random_pairs(person_ids, num_contacts):
             UserContact.objects.create(
                 name=fake.name(),
-                user_id=user_contact_list[0],
-                contact_id=user_contact_list[1]
+                user_id=user_id,
+                contact_id=contact_id
             )
 
         # Create spam numbers
-        for _ in range(num_spam_reports):
-            user_contact_list = random.sample(set(person_ids), 2)
+        for reported_by_id, spam_person_id in self.random_pairs(person_ids, num_spam_reports):
             SpamReport.objects.create(
-                reported_by_id=user_contact_list[0],
-                spam_person_id=user_contact_list[1]
+                reported_by_id=reported_by_id,
+                spam_person_id=spam_person_id
             )
 
-        self.stdout.write('Database populated with sample data')
+    @staticmethod
+    def get_batch_sizes(total, batch_size):
+        """
+        Return the sizes of the batches needed to create total rows.
+        """
+        return [min(batch_size, total - start) for start in range(0, total, batch_size)]
+
+    def populate_bulk(self, num_users, num_contacts, num_spam_reports, batch_size, workers, seed):
+        """
+        Create the sample data with bulk_create in batches. Fake names are generated by the
+        worker processes, every user shares one password hash and the denormalized
+        spam counters and name search index are rebuilt once at the end.
+        """
+        seed = self.random.randrange(2 ** 32) if seed is None else seed
+        password = make_password(Faker().password())
+        user_batches = self.get_batch_sizes(num_users, batch_size)
+        contact_batches = self.get_batch_sizes(num_contacts, batch_size)
+        # Each batch of users draws distinct phone numbers from its own slice of the range
+        subscriber_span = (LAST_SUBSCRIBER_NUMBER - FIRST_SUBSCRIBER_NUMBER) // max(len(user_batches), 1)
+
+        with self.worker_map(workers) as imap:
+            # Create users
+            created = 0
+            jobs = [(seed + index, size) for index, size in enumerate(user_batches)]
+            for index, people in enumerate(imap(fake_people, jobs)):
+                first_number = FIRST_SUBSCRIBER_NUMBER + index * subscriber_span
+                numbers = self.random.sample(range(first_number, first_number + subscriber_span), len(people))
+                phone_numbers = [f'+1{number}' for number in numbers]
+                Person.objects.bulk_create([
+                    Person(
+                        name=name,
+                        phone_number=phone_number,
+                        phone_key=phone_number_key(phone_number),
+                        email=email,
+                        password=password,
+                        type='user'
+                    )
+                    for (name, email), phone_number in zip(people, phone_numbers)
+                ])
+                created += len(people)
+                self.stdout.write(f'Created {created} users')
+
+            person_ids = array('q', Person.objects.values_list('pk', flat=True).order_by('pk').iterator())
+
+            # Create contacts
+            created = 0
+            pairs = self.random_pairs(person_ids, num_contacts)
+            jobs = [(seed + len(user_batches) + index, size) for index, size in enumerate(contact_batches)]
+            for names in imap(fake_names, jobs):
+                UserContact.objects.bulk_create([
+                    UserContact(name=name, user_id=user_id, contact_id=contact_id)
+                    for name, (user_id, contact_id) in zip(names, pairs)
+                ])
+                created += len(names)
+                self.stdout.write(f'Created {created} contacts')
+
+        # Create spam numbers
+        created = 0
+        pairs = self.random_pairs(person_ids, num_spam_reports)
+        for size in self.get_batch_sizes(num_spam_reports, batch_size):
+            SpamReport.objects.bulk_create([
+                SpamReport(reported_by_id=reported_by_id, spam_person_id=spam_person_id)
+                for reported_by_id, spam_person_id in islice(pairs, size)
+            ])
+            created += size
+            self.stdout.write(f'Created {created} spam reports')
+
+        # Bulk inserts skip the signals maintaining these
+        Person.objects.rebuild_spam_counts()
+        ContactNameAggregate.objects.rebuild()
+        get_name_search_index().rebuild()
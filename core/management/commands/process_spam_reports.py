@@ -0,0 +1,36 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.models import SpamReportOutbox
+
+
+class Command(BaseCommand):
+    """
+    Run the command using
+    python manage.py process_spam_reports --poll_interval 1
+    """
+    help = 'Apply the spam reports queued in the outbox in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch_size', type=int, default=settings.SPAM_REPORT_OUTBOX_BATCH_SIZE,
+            help='Number of queued reports applied per transaction'
+        )
+        parser.add_argument(
+            '--poll_interval', type=float, default=0,
+            help='Seconds to wait for new reports once the outbox is empty, exit when 0'
+        )
+
+    def handle(self, *args, **kwargs):
+        batch_size = kwargs['batch_size']
+        poll_interval = kwargs['poll_interval']
+        while True:
+            processed, created = SpamReportOutbox.objects.process_batch(batch_size)
+            if processed:
+                self.stdout.write(f'Processed {processed} queued reports, created {created} spam reports')
+            elif poll_interval:
+                time.sleep(poll_interval)
+            else:
+                break
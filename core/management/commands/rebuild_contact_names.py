@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from core.models import ContactNameAggregate
+
+
+class Command(BaseCommand):
+    """
+    Run the command using
+    python manage.py rebuild_contact_names
+    """
+    help = 'Rebuild the contact name aggregates from the UserContact table'
+
+    def handle(self, *args, **kwargs):
+        rebuilt = ContactNameAggregate.objects.rebuild()
+        self.stdout.write(f'Rebuilt {rebuilt} contact name aggregates')
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from core.search import get_name_search_index
+
+
+class Command(BaseCommand):
+    """
+    Run the command using
+    python manage.py rebuild_name_index
+    """
+    help = 'Rebuild the name search index from the names of people and their contact entries'
+
+    def handle(self, *args, **kwargs):
+        get_name_search_index().rebuild()
+        self.stdout.write('Rebuilt the name search index')
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.models import Person
+
+
+class Command(BaseCommand):
+    """
+    Run the command using
+    python manage.py rebuild_spam_counts
+    """
+    help = 'Rebuild the denormalized spam report counters from the SpamReport table'
+
+    def handle(self, *args, **kwargs):
+        with transaction.atomic():
+            updated = Person.objects.rebuild_spam_counts()
+        self.stdout.write(f'Rebuilt spam counts for {updated} people')
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from core.models import SpamScore
+
+
+class Command(BaseCommand):
+    """
+    Run the command using
+    python manage.py refresh_spam_scores
+    """
+    help = 'Recompute the spam scores of the numbers reported since the last refresh'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full', action='store_true', help='Recompute the score of every reported number, resuming an interrupted run'
+        )
+        parser.add_argument('--batch_size', type=int, default=1000, help='Number of scores upserted per statement')
+
+    def handle(self, *args, **kwargs):
+        refreshed = SpamScore.objects.refresh(full=kwargs['full'], batch_size=kwargs['batch_size'])
+        self.stdout.write(f'Refreshed {refreshed} spam scores')
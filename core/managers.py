@@ -1,10 +1,129 @@
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.conf import settings
 from django.contrib.auth.models import BaseUserManager
+from django.db import connection, models, transaction
+from django.db.models import (
+    Case, CharField, Count, Exists, F, IntegerField, Max, OuterRef, Q, Subquery, Value, When, Window
+)
+from django.utils import timezone
+from django.db.models.functions import Coalesce, RowNumber
+
+from core.phone import normalize_phone_number, phone_number_key
 
 
 class PersonManager(BaseUserManager):
     """
     Custom manager for the Person model to handle user creation.
     """
+    @classmethod
+    def normalize_phone_number(cls, phone_number):
+        """
+        Return the canonical E.164 form of the phone number.
+        """
+        return normalize_phone_number(phone_number)
+
+    def get_by_natural_key(self, phone_number):
+        """
+        Return the person with the given phone number in any format.
+        """
+        try:
+            phone_key = phone_number_key(self.normalize_phone_number(phone_number))
+        except ValueError:
+            raise self.model.DoesNotExist
+        return self.get(phone_key=phone_key)
+
+    def get_by_phone_number(self, phone_number):
+        """
+        Return the person with the given normalized phone number, or None.
+        """
+        return self.filter(phone_key=phone_number_key(phone_number)).first()
+
+    def get_profile_queryset(self, phone_number, viewer):
+        """
+        Return the queryset of the person with the given normalized phone number, annotated with
+        saved_viewer, whether they saved the viewer as a contact and so show them their email.
+        """
+        user_contacts = self.model._meta.get_field('user_contacts').related_model.objects
+        return self.filter(phone_key=phone_number_key(phone_number)).annotate(
+            saved_viewer=Exists(user_contacts.filter(user=OuterRef('pk'), contact_id=viewer.pk))
+        )
+
+    def search_names(self, search_query):
+        """
+        Return the people whose name or a contact name saved for them contains the search
+        query, as name search results.
+        """
+        from core.search import get_name_search_index
+
+        # This will have the side effect of adding Persons name whose contact name includes the
+        # search query but their name doesn't includes the search query which is intentional as
+        # they are ordered last and it will expose the real name of the same phone number to
+        # the user
+        people = self.select_related('spam_score')
+        candidate_ids = get_name_search_index().candidate_ids(search_query)
+        if candidate_ids is not None:
+            people = people.filter(pk__in=candidate_ids)
+        base_qs = people.annotate(
+            display_name=Case(
+                When(contact_users__name__icontains=search_query, then=F('contact_users__name')),
+                default=F('name'),
+                output_field=CharField()
+            ),
+            order_field=Case(
+                When(
+                    Q(name__istartswith=search_query) |
+                    Q(contact_users__name__istartswith=search_query),
+                    then=Value('1')
+                ),
+                When(
+                    Q(name__icontains=search_query) |
+                    Q(contact_users__name__icontains=search_query),
+                    then=Value('2')
+                ),
+                default=Value('3'),
+                output_field=CharField()
+            )
+        ).filter(
+            Q(name__icontains=search_query) | Q(contact_users__name__icontains=search_query)
+        )
+        final_qs = base_qs.order_by('order_field', 'display_name')
+        return final_qs.distinct()
+
+    def search_registered_users(self, phone_keys):
+        """
+        Return the registered users with the given phone keys, as phone number search results.
+        """
+        return self.filter(phone_key__in=phone_keys, type='user').annotate(
+            display_name=F('name')
+        ).select_related('spam_score')
+
+    def search_contact_names(self, phone_keys):
+        """
+        Return the people with the given phone keys as phone number search results, one row
+        per name they are saved under, up to SEARCH_CONTACT_NAMES_LIMIT names per person, the
+        most common name first.
+        """
+        # The names come from the pre-aggregated counts instead of grouping the user contacts,
+        # and the spam count comes from the person row and the spam score from a single join,
+        # so the results cost no extra queries per row.
+        return self.filter(
+            phone_key__in=phone_keys, name_aggregates__count__gt=0
+        ).annotate(
+            display_name=F('name_aggregates__name'),
+            saved_by=F('name_aggregates__count'),
+            name_rank=Window(
+                RowNumber(),
+                partition_by=F('pk'),
+                order_by=[F('name_aggregates__count').desc(), F('name_aggregates__name').asc()],
+            ),
+        ).filter(
+            name_rank__lte=settings.SEARCH_CONTACT_NAMES_LIMIT
+        ).select_related('spam_score').only(
+            'phone_number', 'spam_count', 'spam_score__score'
+        ).order_by('-saved_by', 'display_name')
+
     def create_user(self, phone_number, name, password=None, email=None, user_type='user'):
         """
         Create and return a user with the given phone number, name, and password.
@@ -12,7 +131,7 @@ class PersonManager(BaseUserManager):
         if not phone_number:
             raise ValueError("Users must have a phone number")
         user = self.model(
-            phone_number=phone_number,
+            phone_number=self.normalize_phone_number(phone_number),
             name=name,
             email=self.normalize_email(email),
             type=user_type
@@ -26,7 +145,7 @@ class PersonManager(BaseUserManager):
         Create and return a contact with the given phone number and name.
         """
         contact = self.model(
-            phone_number=phone_number,
+            phone_number=self.normalize_phone_number(phone_number),
             name=name,
             type='contact',
         )
@@ -38,7 +157,7 @@ class PersonManager(BaseUserManager):
         Create and return a spam person with the given phone number.
         """
         spam_person = self.model(
-            phone_number=phone_number,
+            phone_number=self.normalize_phone_number(phone_number),
             type='spam',
         )
         spam_person.save()
@@ -52,4 +171,325 @@ class PersonManager(BaseUserManager):
         user.is_admin = True
         user.is_superuser = True
         user.save()
-        return user
\ No newline at end of file
+        return user
+
+    def rebuild_spam_counts(self, person_ids=None):
+        """
+        Recompute the spam counters of the given people, or of every person, from the spam
+        reports in a single UPDATE and return the number of rows updated.
+        """
+        from core.models import SpamReport
+
+        report_counts = SpamReport.objects.filter(
+            spam_person=OuterRef('pk')
+        ).order_by().values('spam_person').annotate(total=Count('id')).values('total')
+        people = self.all() if person_ids is None else self.filter(pk__in=person_ids)
+        return people.update(
+            spam_count=Coalesce(Subquery(report_counts, output_field=IntegerField()), 0)
+        )
+
+
+class SpamReportOutboxManager(models.Manager):
+    """
+    Manager for the spam report outbox, applying queued reports in batches.
+    """
+    @transaction.atomic
+    def process_batch(self, batch_size):
+        """
+        Apply the oldest queued reports with set based queries and delete them, and return the
+        number of queued reports processed and of spam reports created. Repeated and already
+        existing reports are dropped. Rows locked by another worker are skipped.
+        """
+        from core.cache import invalidate_phone_search_results
+        from core.models import Person, SpamReport
+
+        queued = list(
+            self.select_for_update(skip_locked=True).order_by('pk').values_list(
+                'pk', 'reported_by_id', 'phone_number'
+            )[:batch_size]
+        )
+        if not queued:
+            return 0, 0
+        pairs = {(reported_by_id, phone_number) for _, reported_by_id, phone_number in queued}
+        phone_numbers = {phone_number for _, phone_number in pairs}
+
+        Person.objects.bulk_create(
+            [
+                Person(phone_number=phone_number, phone_key=phone_number_key(phone_number), type='spam')
+                for phone_number in phone_numbers
+            ],
+            ignore_conflicts=True,
+        )
+        person_ids = dict(Person.objects.filter(
+            phone_key__in=[phone_number_key(phone_number) for phone_number in phone_numbers]
+        ).values_list('phone_number', 'pk'))
+
+        reports = {
+            (reported_by_id, person_ids[phone_number]) for reported_by_id, phone_number in pairs
+            if reported_by_id != person_ids[phone_number]
+        }
+        reports -= set(SpamReport.objects.filter(
+            reported_by_id__in={reported_by_id for reported_by_id, _ in reports},
+            spam_person_id__in={spam_person_id for _, spam_person_id in reports},
+        ).values_list('reported_by_id', 'spam_person_id'))
+        SpamReport.objects.bulk_create(
+            [SpamReport(reported_by_id=reported_by_id, spam_person_id=spam_person_id)
+             for reported_by_id, spam_person_id in reports],
+            ignore_conflicts=True,
+        )
+
+        # Bulk inserts skip the counter signals, and reports inserted meanwhile by another
+        # request are ignored, so recount the reported people from their reports.
+        reported_ids = {spam_person_id for _, spam_person_id in reports}
+        Person.objects.rebuild_spam_counts(reported_ids)
+
+        invalidate_phone_search_results(
+            *(phone_number for phone_number, person_id in person_ids.items() if person_id in reported_ids)
+        )
+        self.filter(pk__in=[pk for pk, _, _ in queued]).delete()
+        return len(queued), len(reports)
+
+
+class SpamScoreManager(models.Manager):
+    """
+    Manager for the spam scores, recomputing them from the spam reports.
+    """
+    WATERMARK = 'spam_score'
+    FULL_WATERMARK = 'spam_score_full'
+
+    @staticmethod
+    def compute_score(reporters, recent_reports, established_reporters):
+        """
+        Return the spam likelihood of a number from its report aggregates. Every reporter
+        counts once, and once more for a recent report and for an established account, so a
+        burst from new accounts weighs less than steady reports from long time users.
+        """
+        weight = reporters + recent_reports + established_reporters
+        return round(weight / (weight + settings.SPAM_SCORE_HALF_WEIGHT), 4)
+
+    def get_aggregates(self, person_ids=None):
+        """
+        Return the spam report aggregates of the given people, or of every reported person,
+        computed with a single GROUP BY.
+        """
+        from core.models import SpamReport
+
+        now = timezone.now()
+        reports = SpamReport.objects.filter(spam_person__isnull=False)
+        if person_ids is not None:
+            reports = reports.filter(spam_person_id__in=person_ids)
+        return reports.values('spam_person_id').annotate(
+            reporters=Count('reported_by', distinct=True),
+            recent_reports=Count(
+                'id', filter=Q(created_at__gte=now - timedelta(days=settings.SPAM_SCORE_RECENT_DAYS))
+            ),
+            established_reporters=Count('reported_by', distinct=True, filter=Q(
+                reported_by__created_at__lt=now - timedelta(days=settings.SPAM_SCORE_ESTABLISHED_DAYS)
+            )),
+            last_reported_at=Max('created_at'),
+        ).order_by()
+
+    def upsert(self, aggregates):
+        """
+        Insert or update the scores of the given aggregates with a single statement.
+        """
+        scores = [
+            self.model(
+                person_id=aggregate['spam_person_id'],
+                score=self.compute_score(
+                    aggregate['reporters'], aggregate['recent_reports'], aggregate['established_reporters']
+                ),
+                reporters=aggregate['reporters'],
+                recent_reports=aggregate['recent_reports'],
+                established_reporters=aggregate['established_reporters'],
+                last_reported_at=aggregate['last_reported_at'],
+            )
+            for aggregate in aggregates
+        ]
+        # MySQL upserts on any unique key and doesn't accept a conflict target
+        unique_fields = ['person'] if connection.features.supports_update_conflicts_with_target else None
+        self.bulk_create(
+            scores,
+            update_conflicts=True,
+            unique_fields=unique_fields,
+            update_fields=[
+                'score', 'reporters', 'recent_reports', 'established_reporters', 'last_reported_at', 'updated_at'
+            ],
+        )
+
+    def refresh(self, full=False, batch_size=1000):
+        """
+        Recompute the scores of the people reported since the last refresh, or of every
+        reported person when full, and return the number of scores refreshed. Report ids are
+        taken at insert but seen at commit, so a report committed after a higher id was seen
+        would fall behind the watermark. The last SPAM_SCORE_REFRESH_OVERLAP ids behind it are
+        scanned again to catch them. Scores also depend on the time of the refresh, so a
+        periodic full refresh keeps recency current, catches reports committed even later and
+        drops the scores of people whose reports were all deleted.
+        """
+        if full:
+            return self.refresh_all(batch_size)
+
+        from core.models import SpamReport, Watermark
+
+        with transaction.atomic():
+            watermark, _ = Watermark.objects.select_for_update().get_or_create(name=self.WATERMARK)
+            last_id = SpamReport.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+            person_ids = list(SpamReport.objects.filter(
+                id__gt=watermark.last_id - settings.SPAM_SCORE_REFRESH_OVERLAP, id__lte=last_id,
+                spam_person__isnull=False,
+            ).values_list('spam_person_id', flat=True).distinct().order_by())
+            for start in range(0, len(person_ids), batch_size):
+                self.refresh_batch(list(self.get_aggregates(person_ids[start:start + batch_size])))
+            watermark.last_id = last_id
+            watermark.save()
+        return len(person_ids)
+
+    def refresh_all(self, batch_size=1000):
+        """
+        Recompute the score of every reported person in batches of people, each committed on
+        its own, and return the number of scores refreshed. The FULL_WATERMARK is the highest
+        person id recomputed so far, so an interrupted run resumes where it stopped. Starting
+        a run moves the watermark of the incremental refresh past the existing reports, which
+        the run recomputes.
+        """
+        from core.models import SpamReport, Watermark
+
+        refreshed = 0
+        while True:
+            with transaction.atomic():
+                progress, _ = Watermark.objects.select_for_update().get_or_create(name=self.FULL_WATERMARK)
+                if not progress.last_id:
+                    watermark, _ = Watermark.objects.select_for_update().get_or_create(name=self.WATERMARK)
+                    last_id = SpamReport.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+                    watermark.last_id = max(watermark.last_id, last_id)
+                    watermark.save()
+                aggregates = list(self.get_aggregates().filter(
+                    spam_person_id__gt=progress.last_id
+                ).order_by('spam_person_id')[:batch_size])
+                # Drop the scores of the people in the batch's range who are no longer reported
+                stale_scores = self.filter(person_id__gt=progress.last_id).exclude(
+                    person_id__in=[aggregate['spam_person_id'] for aggregate in aggregates]
+                )
+                if len(aggregates) == batch_size:
+                    stale_scores = stale_scores.filter(person_id__lte=aggregates[-1]['spam_person_id'])
+                stale_scores.delete()
+                self.refresh_batch(aggregates)
+                refreshed += len(aggregates)
+                progress.last_id = aggregates[-1]['spam_person_id'] if len(aggregates) == batch_size else 0
+                progress.save()
+            if not progress.last_id:
+                return refreshed
+
+    def refresh_batch(self, aggregates):
+        """
+        Upsert the scores of the given aggregates, and drop the cached search results showing
+        them once the transaction commits.
+        """
+        from core.cache import invalidate_phone_search_results
+        from core.models import Person
+
+        self.upsert(aggregates)
+        invalidate_phone_search_results(*Person.objects.filter(
+            pk__in=[aggregate['spam_person_id'] for aggregate in aggregates]
+        ).values_list('phone_number', flat=True))
+
+
+class ContactNameAggregateManager(models.Manager):
+    """
+    Manager for the contact name aggregates, counting the names people are saved under.
+    """
+    @staticmethod
+    def normalize_name(name):
+        """
+        Return the form of a contact name its count is kept under, case folded and with runs
+        of whitespace collapsed, so variants of the same name count together.
+        """
+        return ' '.join(name.split()).casefold()[:255]
+
+    def get_ids(self, keys, batch_size=1000):
+        """
+        Return the ids of the aggregates with the given (contact id, normalized name) keys.
+        """
+        keys = list(keys)
+        ids = {}
+        for start in range(0, len(keys), batch_size):
+            batch = set(keys[start:start + batch_size])
+            rows = self.filter(
+                contact_id__in={contact_id for contact_id, _ in batch},
+                normalized_name__in={normalized_name for _, normalized_name in batch},
+            ).values_list('pk', 'contact_id', 'normalized_name')
+            ids.update(
+                ((contact_id, normalized_name), pk) for pk, contact_id, normalized_name in rows
+                if (contact_id, normalized_name) in batch
+            )
+        return ids
+
+    def apply(self, added=(), removed=(), batch_size=1000):
+        """
+        Count the added (contact id, name) pairs and uncount the removed ones. Missing
+        aggregates are created with the first name added as the name shown, then the counts
+        change with one UPDATE per distinct change, so concurrent writers don't lose counts.
+        Aggregates whose count drops to 0 are kept until the next rebuild, search skips them.
+        """
+        deltas = Counter()
+        names = {}
+        for contact_id, name in added:
+            key = (contact_id, self.normalize_name(name))
+            deltas[key] += 1
+            names.setdefault(key, name)
+        for contact_id, name in removed:
+            deltas[(contact_id, self.normalize_name(name))] -= 1
+        deltas = {key: delta for key, delta in deltas.items() if delta}
+        if not deltas:
+            return
+
+        # Inserting every added name, existing ones being ignored, saves looking them up first
+        self.bulk_create(
+            [
+                self.model(contact_id=key[0], normalized_name=key[1], name=name[:255])
+                for key, name in names.items() if deltas.get(key, 0) > 0
+            ],
+            ignore_conflicts=True,
+            batch_size=batch_size,
+        )
+        ids = self.get_ids(deltas, batch_size)
+
+        ids_by_delta = defaultdict(list)
+        for key, delta in deltas.items():
+            if key in ids:
+                ids_by_delta[delta].append(ids[key])
+        for delta, aggregate_ids in ids_by_delta.items():
+            count = F('count') + delta
+            if delta < 0:
+                # The count is unsigned on MySQL, where it can't go below 0 even in the
+                # expression, so counts smaller than the decrement are set to 0 instead
+                count = Case(When(count__gte=-delta, then=count), default=Value(0))
+            for start in range(0, len(aggregate_ids), batch_size):
+                self.filter(pk__in=aggregate_ids[start:start + batch_size]).update(count=count)
+
+    @transaction.atomic
+    def rebuild(self, batch_size=10000):
+        """
+        Recompute every aggregate from the user contacts and return the number of aggregates.
+        Names are shown as first saved, as when counted incrementally.
+        """
+        from core.models import UserContact
+
+        self.all().delete()
+        created = 0
+        batch = {}
+        names = UserContact.objects.order_by('contact_id', 'pk').values_list('contact_id', 'name')
+        for contact_id, name in names.iterator(chunk_size=batch_size):
+            key = (contact_id, self.normalize_name(name))
+            if key not in batch:
+                if len(batch) >= batch_size and contact_id != next(reversed(batch))[0]:
+                    self.bulk_create(batch.values(), batch_size=batch_size)
+                    created += len(batch)
+                    batch = {}
+                batch[key] = self.model(
+                    contact_id=contact_id, normalized_name=key[1], name=name[:255], count=0
+                )
+            batch[key].count += 1
+        self.bulk_create(batch.values(), batch_size=batch_size)
+        return created + len(batch)
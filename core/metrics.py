@@ -0,0 +1,153 @@
+import json
+import threading
+import time
+from contextvars import ContextVar
+
+from rest_framework import renderers, serializers
+
+# Metrics of the sampled request being handled in the current context, None when not sampled
+request_metrics = ContextVar('request_metrics', default=None)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class RequestMetrics:
+    """
+    Database and serializer time of a sampled request.
+    """
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.serializing = False
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Database execute wrapper adding the query to the metrics of the current request, if
+    it is sampled.
+    """
+    metrics = request_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started_at = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries += 1
+        metrics.db_time += time.perf_counter() - started_at
+
+
+class MetricsRegistry:
+    """
+    Thread safe in-process aggregate of request metrics per view. Every worker process
+    keeps its own registry.
+    """
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.views = {}
+
+    def observe(self, view_name, duration, metrics=None):
+        """
+        Add a request of the given view and duration, and its sampled metrics if any.
+        """
+        with self.lock:
+            view = self.views.get(view_name)
+            if view is None:
+                view = self.views[view_name] = {
+                    'buckets': [0] * len(self.buckets),
+                    'count': 0,
+                    'duration': 0.0,
+                    'sampled': 0,
+                    'queries': 0,
+                    'db_time': 0.0,
+                    'serializer_time': 0.0,
+                }
+            view['count'] += 1
+            view['duration'] += duration
+            for index, upper_bound in enumerate(self.buckets):
+                if duration <= upper_bound:
+                    view['buckets'][index] += 1
+                    break
+            if metrics is not None:
+                view['sampled'] += 1
+                view['queries'] += metrics.queries
+                view['db_time'] += metrics.db_time
+                view['serializer_time'] += metrics.serializer_time
+
+    def render(self):
+        """
+        Return the metrics in the Prometheus text exposition format.
+        """
+        with self.lock:
+            views = {name: dict(view, buckets=list(view['buckets'])) for name, view in self.views.items()}
+
+        lines = [
+            '# HELP spam_api_request_duration_seconds Wall time of requests by view.',
+            '# TYPE spam_api_request_duration_seconds histogram',
+        ]
+        for name, view in sorted(views.items()):
+            cumulative = 0
+            for upper_bound, count in zip(self.buckets, view['buckets']):
+                cumulative += count
+                lines.append(f'spam_api_request_duration_seconds_bucket{{view="{name}",le="{upper_bound}"}} {cumulative}')
+            lines.append(f'spam_api_request_duration_seconds_bucket{{view="{name}",le="+Inf"}} {view["count"]}')
+            lines.append(f'spam_api_request_duration_seconds_sum{{view="{name}"}} {view["duration"]}')
+            lines.append(f'spam_api_request_duration_seconds_count{{view="{name}"}} {view["count"]}')
+
+        counters = [
+            ('sampled_requests_total', 'sampled', 'Requests sampled for database and serializer metrics.'),
+            ('db_queries_total', 'queries', 'Database queries of sampled requests.'),
+            ('db_query_seconds_total', 'db_time', 'Database time of sampled requests.'),
+            ('serializer_seconds_total', 'serializer_time', 'Serializer time of sampled requests.'),
+        ]
+        for metric, key, description in counters:
+            lines.append(f'# HELP spam_api_{metric} {description}')
+            lines.append(f'# TYPE spam_api_{metric} counter')
+            for name, view in sorted(views.items()):
+                lines.append(f'spam_api_{metric}{{view="{name}"}} {view[key]}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+class TimedSerializerMixin:
+    """
+    Mixin for serializers adding the time spent producing their data to the metrics of the
+    current request. Nested serializers are only counted once, by the outermost one.
+    """
+    @property
+    def data(self):
+        metrics = request_metrics.get()
+        if metrics is None or metrics.serializing:
+            return super().data
+        metrics.serializing = True
+        started_at = time.perf_counter()
+        try:
+            return super().data
+        finally:
+            metrics.serializer_time += time.perf_counter() - started_at
+            metrics.serializing = False
+
+
+class TimedListSerializer(TimedSerializerMixin, serializers.ListSerializer):
+    """
+    List serializer counting its serialization time, for Meta.list_serializer_class.
+    """
+
+
+class PrometheusRenderer(renderers.BaseRenderer):
+    """
+    Renderer for metrics already in the Prometheus text exposition format. Error responses
+    are rendered as JSON text.
+    """
+    media_type = 'text/plain'
+    format = 'prometheus'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if not isinstance(data, str):
+            data = json.dumps(data)
+        return data.encode(self.charset)
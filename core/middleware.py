@@ -0,0 +1,214 @@
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.http import JsonResponse
+
+from core.metrics import RequestMetrics, registry, request_metrics
+from core.pool import get_connection_pool
+from core.routers import RequestWrites, mark_sticky, request_writes
+
+
+class PerformanceMiddleware:
+    """
+    Middleware recording the wall time of every request per view. A PERF_SAMPLE_RATE fraction
+    of requests also records its database queries and time, and its serializer time, and
+    reports them in a Server-Timing header. Queries are counted by the execute wrapper
+    installed on every database connection, see core.metrics.record_query.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        metrics, token, started_at = self.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            if token is not None:
+                request_metrics.reset(token)
+        return self.finish(request, response, metrics, started_at)
+
+    async def __acall__(self, request):
+        metrics, token, started_at = self.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            if token is not None:
+                request_metrics.reset(token)
+        return self.finish(request, response, metrics, started_at)
+
+    def start(self):
+        """
+        Return the metrics of the request, None if it isn't sampled, the context variable
+        token to reset once it is handled and its start time.
+        """
+        metrics = token = None
+        if random.random() < settings.PERF_SAMPLE_RATE:
+            metrics = RequestMetrics()
+            token = request_metrics.set(metrics)
+        return metrics, token, time.perf_counter()
+
+    def finish(self, request, response, metrics, started_at):
+        duration = time.perf_counter() - started_at
+        resolver_match = getattr(request, 'resolver_match', None)
+        view_name = resolver_match.view_name if resolver_match else 'unresolved'
+        registry.observe(view_name, duration, metrics)
+        if metrics is not None:
+            response['Server-Timing'] = ', '.join([
+                f'db;dur={metrics.db_time * 1000:.3f};desc="{metrics.queries} queries"',
+                f'serialize;dur={metrics.serializer_time * 1000:.3f}',
+                f'total;dur={duration * 1000:.3f}',
+            ])
+        return response
+
+
+class ReplicaStickinessMiddleware:
+    """
+    Middleware noting the users whose request wrote to the primary, so their reads stay on
+    the primary while the replicas catch up. Writes are seen by the execute wrapper installed
+    on the primary connection, see core.routers.record_write. It does nothing without replicas.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+        writes = RequestWrites()
+        token = request_writes.set(writes)
+        try:
+            response = self.get_response(request)
+        finally:
+            request_writes.reset(token)
+        self.finish(request, writes)
+        return response
+
+    async def __acall__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return await self.get_response(request)
+        writes = RequestWrites()
+        token = request_writes.set(writes)
+        try:
+            response = await self.get_response(request)
+        finally:
+            request_writes.reset(token)
+        self.finish(request, writes)
+        return response
+
+    def finish(self, request, writes):
+        # DRF sets the user it authenticated on the underlying request
+        user = getattr(request, 'user', None)
+        if writes.wrote and user is not None and user.is_authenticated:
+            mark_sticky(user.pk)
+
+
+class SlotReleasingContent:
+    """
+    Streamed content releasing the slot of the connection pool of its request once it is
+    exhausted, fails or is closed, whichever comes first. Responses close their content when
+    the server closes them, even if it never started sending it.
+    """
+    def __init__(self, content, release):
+        self.content = content
+        self.release = release
+
+    def close(self):
+        release, self.release = self.release, None
+        if release is not None:
+            release()
+
+
+class SlotReleasingIterator(SlotReleasingContent):
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self.content)
+        except BaseException:
+            self.close()
+            raise
+
+
+class SlotReleasingAsyncIterator(SlotReleasingContent):
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return await anext(self.content)
+        except BaseException:
+            self.close()
+            raise
+
+
+class ConnectionPoolMiddleware:
+    """
+    Middleware checking a slot of the connection pool out for every request, see core.pool.
+    Requests finding no free slot within DB_POOL_TIMEOUT seconds get a 503. Streamed responses
+    keep their slot until they are fully sent.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        pool = get_connection_pool()
+        if not pool.acquire():
+            return self.busy_response()
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            pool.release()
+            raise
+        return self.finish(pool, response)
+
+    async def __acall__(self, request):
+        pool = get_connection_pool()
+        # Waiting for a slot blocks, so it happens off the event loop
+        if not pool.try_acquire() and not await sync_to_async(pool.acquire, thread_sensitive=False)():
+            return self.busy_response()
+        try:
+            response = await self.get_response(request)
+        except BaseException:
+            pool.release()
+            raise
+        return self.finish(pool, response)
+
+    def finish(self, pool, response):
+        if not response.streaming:
+            pool.release()
+        elif response.is_async:
+            response.streaming_content = SlotReleasingAsyncIterator(response.streaming_content, pool.release)
+        else:
+            response.streaming_content = SlotReleasingIterator(response.streaming_content, pool.release)
+        return response
+
+    def busy_response(self):
+        response = JsonResponse({'detail': 'The service is busy, try again later.'}, status=503)
+        response['Retry-After'] = '1'
+        return response
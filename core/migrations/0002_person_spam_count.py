@@ -0,0 +1,32 @@
+# Generated by Django 4.2.14 on 2026-10-18 13:52
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_spam_counts(apps, schema_editor):
+    Person = apps.get_model('core', 'Person')
+    SpamReport = apps.get_model('core', 'SpamReport')
+    report_counts = SpamReport.objects.filter(
+        spam_person=OuterRef('pk')
+    ).order_by().values('spam_person').annotate(total=Count('id')).values('total')
+    Person.objects.update(
+        spam_count=Coalesce(Subquery(report_counts, output_field=IntegerField()), 0)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='person',
+            name='spam_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_spam_counts, migrations.RunPython.noop),
+    ]
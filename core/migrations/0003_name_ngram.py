@@ -0,0 +1,65 @@
+# Generated by Django 4.2.14 on 2026-10-18 13:53
+
+import unicodedata
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+BATCH_SIZE = 1000
+
+
+def fold_name(name):
+    # Frozen copy of core.search.fold_name, so later changes to it don't change this migration
+    name = unicodedata.normalize('NFKD', (name or '').casefold())
+    return ''.join(char for char in name if not unicodedata.combining(char))
+
+
+def backfill_name_ngrams(apps, schema_editor):
+    """
+    Index the names of the people and the contact names saved for them, by ranges of person
+    ids, so only the postings of one batch are held and inserted at a time.
+    """
+    Person = apps.get_model('core', 'Person')
+    UserContact = apps.get_model('core', 'UserContact')
+    NameNgram = apps.get_model('core', 'NameNgram')
+    last_pk = 0
+    while True:
+        names = list(Person.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', 'name')[:BATCH_SIZE])
+        if not names:
+            break
+        first_pk, last_pk = names[0][0], names[-1][0]
+        names += UserContact.objects.filter(
+            contact_id__gte=first_pk, contact_id__lte=last_pk
+        ).values_list('contact_id', 'name')
+        postings = set()
+        for person_id, name in names:
+            name = fold_name(name)
+            postings.update((person_id, name[i:i + 3]) for i in range(len(name) - 2))
+        NameNgram.objects.bulk_create(
+            [NameNgram(person_id=person_id, gram=gram) for person_id, gram in postings],
+            batch_size=BATCH_SIZE,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_person_spam_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NameNgram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('gram', models.CharField(max_length=3)),
+                ('person', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='name_ngrams', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='namengram',
+            constraint=models.UniqueConstraint(fields=('gram', 'person'), name='unique_name_ngram_posting'),
+        ),
+        migrations.RunPython(backfill_name_ngrams, migrations.RunPython.noop),
+    ]
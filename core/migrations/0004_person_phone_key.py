@@ -0,0 +1,157 @@
+# Generated by Django 4.2.14 on 2026-10-18 13:55
+
+import re
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+# Frozen copy of core.phone as of this migration, so later changes to the normalization don't
+# change what it did.
+EXTENSION_PATTERN = re.compile(r'\s*(?:x|ext\.?|#).*$', re.IGNORECASE)
+NON_DIGIT_PATTERN = re.compile(r'\D')
+
+
+def normalize_phone_number(phone_number):
+    country_code = settings.DEFAULT_COUNTRY_CODE
+    national_lengths = getattr(settings, 'DEFAULT_NATIONAL_NUMBER_LENGTHS', [7, 10])
+    value = EXTENSION_PATTERN.sub('', str(phone_number).strip())
+    digits = NON_DIGIT_PATTERN.sub('', value)
+    if value.startswith('+'):
+        pass
+    elif value.startswith('00'):
+        digits = digits[2:]
+    else:
+        digits = digits.lstrip('0')
+        has_country_code = (
+            digits.startswith(country_code) and len(digits) not in national_lengths
+            and len(digits) - len(country_code) in national_lengths
+        )
+        if not has_country_code:
+            digits = country_code + digits
+    if not 4 <= len(digits) <= 15 or digits.startswith('0'):
+        raise ValueError(f'Invalid phone number: {phone_number!r}')
+    return f'+{digits}'
+
+
+def phone_number_key(phone_number):
+    return int(phone_number[1:])
+
+
+def delete_duplicates(model, fields, person_ids):
+    """
+    Delete all but the oldest row of each group of rows sharing the given fields, among the
+    rows of the given people.
+    """
+    filters = {f'{fields[0]}__in': person_ids}
+    duplicates = model.objects.filter(**filters).values(*fields).annotate(
+        keep_id=Min('id'), total=Count('id')
+    ).filter(total__gt=1)
+    for duplicate in duplicates:
+        model.objects.filter(**{field: duplicate[field] for field in fields}).exclude(
+            id=duplicate['keep_id']
+        ).delete()
+
+
+def merge_duplicate_people(apps, schema_editor):
+    """
+    Normalize every phone number and merge people whose numbers normalize to the same value
+    into a single person, preferring a registered user and then the oldest row.
+    """
+    Person = apps.get_model('core', 'Person')
+    UserContact = apps.get_model('core', 'UserContact')
+    SpamReport = apps.get_model('core', 'SpamReport')
+    NameNgram = apps.get_model('core', 'NameNgram')
+
+    people_by_number = defaultdict(list)
+    for person_id, phone_number, person_type, name in Person.objects.values_list(
+        'id', 'phone_number', 'type', 'name'
+    ).iterator():
+        try:
+            normalized = normalize_phone_number(phone_number)
+        except ValueError:
+            continue
+        people_by_number[normalized].append((person_type != 'user', person_id, name))
+
+    survivor_ids = set()
+    for people in people_by_number.values():
+        if len(people) == 1:
+            continue
+        people.sort()
+        (_, survivor_id, survivor_name), duplicates = people[0], people[1:]
+        duplicate_ids = [person_id for _, person_id, _ in duplicates]
+        UserContact.objects.filter(user_id__in=duplicate_ids).update(user_id=survivor_id)
+        UserContact.objects.filter(contact_id__in=duplicate_ids).update(contact_id=survivor_id)
+        SpamReport.objects.filter(reported_by_id__in=duplicate_ids).update(reported_by_id=survivor_id)
+        SpamReport.objects.filter(spam_person_id__in=duplicate_ids).update(spam_person_id=survivor_id)
+        if not survivor_name:
+            fallback_name = next((name for _, _, name in duplicates if name), None)
+            Person.objects.filter(id=survivor_id).update(name=fallback_name)
+        Person.objects.filter(id__in=duplicate_ids).delete()
+        survivor_ids.add(survivor_id)
+
+    if survivor_ids:
+        survivor_ids = list(survivor_ids)
+        delete_duplicates(UserContact, ['user_id', 'contact_id'], survivor_ids)
+        delete_duplicates(UserContact, ['contact_id', 'user_id'], survivor_ids)
+        delete_duplicates(SpamReport, ['reported_by_id', 'spam_person_id'], survivor_ids)
+        delete_duplicates(SpamReport, ['spam_person_id', 'reported_by_id'], survivor_ids)
+        SpamReport.objects.filter(reported_by_id__in=survivor_ids, spam_person_id__in=survivor_ids).filter(
+            reported_by_id=models.F('spam_person_id')
+        ).delete()
+
+        report_counts = SpamReport.objects.filter(
+            spam_person=OuterRef('pk')
+        ).order_by().values('spam_person').annotate(total=Count('id')).values('total')
+        Person.objects.filter(id__in=survivor_ids).update(
+            spam_count=Coalesce(Subquery(report_counts, output_field=IntegerField()), 0)
+        )
+
+        NameNgram.objects.filter(person_id__in=survivor_ids).delete()
+        names = list(Person.objects.filter(id__in=survivor_ids).values_list('id', 'name'))
+        names += UserContact.objects.filter(contact_id__in=survivor_ids).values_list('contact_id', 'name')
+        postings = set()
+        for person_id, name in names:
+            name = (name or '').lower()
+            postings.update((person_id, name[i:i + 3]) for i in range(len(name) - 2))
+        NameNgram.objects.bulk_create(
+            [NameNgram(person_id=person_id, gram=gram) for person_id, gram in postings],
+            batch_size=1000,
+        )
+
+    people = []
+    for normalized, ((_, person_id, _), *_) in people_by_number.items():
+        people.append(Person(id=person_id, phone_number=normalized, phone_key=phone_number_key(normalized)))
+        if len(people) == 1000:
+            Person.objects.bulk_update(people, ['phone_number', 'phone_key'])
+            people = []
+    Person.objects.bulk_update(people, ['phone_number', 'phone_key'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_name_ngram'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='person',
+            name='phone_key',
+            field=models.BigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AlterField(
+            model_name='person',
+            name='phone_number',
+            field=models.CharField(max_length=16, unique=True),
+        ),
+        migrations.RunPython(merge_duplicate_people, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='person',
+            name='phone_key',
+            field=models.BigIntegerField(blank=True, editable=False, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 4.2.14 on 2026-10-18 13:58
+
+from django.db import migrations, models
+from django.db.models import Count, F, Min
+
+
+def delete_duplicate_rows(apps, schema_editor):
+    """
+    Delete all but the oldest of duplicate contacts and spam reports, so the unique
+    constraints below can be created, and fix the spam counters of the affected people.
+    """
+    Person = apps.get_model('core', 'Person')
+    UserContact = apps.get_model('core', 'UserContact')
+    SpamReport = apps.get_model('core', 'SpamReport')
+
+    duplicates = UserContact.objects.values('user', 'contact').annotate(
+        keep_id=Min('id'), total=Count('id')
+    ).filter(total__gt=1)
+    for duplicate in duplicates.iterator():
+        UserContact.objects.filter(
+            user=duplicate['user'], contact=duplicate['contact']
+        ).exclude(id=duplicate['keep_id']).delete()
+
+    duplicates = SpamReport.objects.filter(spam_person__isnull=False).values(
+        'reported_by', 'spam_person'
+    ).annotate(keep_id=Min('id'), total=Count('id')).filter(total__gt=1)
+    for duplicate in duplicates.iterator():
+        SpamReport.objects.filter(
+            reported_by=duplicate['reported_by'], spam_person=duplicate['spam_person']
+        ).exclude(id=duplicate['keep_id']).delete()
+        Person.objects.filter(id=duplicate['spam_person']).update(
+            spam_count=F('spam_count') - (duplicate['total'] - 1)
+        )
+
+
+class Migration(migrations.Migration):
+    # Each index is built in its own statement outside a wrapping transaction. MySQL builds
+    # secondary and unique indexes in place without blocking writes, so large tables stay
+    # available while this runs.
+    atomic = False
+
+    dependencies = [
+        ('core', '0004_person_phone_key'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_duplicate_rows, migrations.RunPython.noop, atomic=True),
+        migrations.AddIndex(
+            model_name='usercontact',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='usercontact_user_created_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='spamreport',
+            constraint=models.UniqueConstraint(fields=('reported_by', 'spam_person'), name='unique_spam_report'),
+        ),
+        migrations.AddConstraint(
+            model_name='usercontact',
+            constraint=models.UniqueConstraint(fields=('user', 'contact'), name='unique_user_contact'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.14 on 2026-10-18 14:22
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_contact_and_report_constraints'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SpamReportOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('phone_number', models.CharField(max_length=16)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('reported_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='queued_spam_reports', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
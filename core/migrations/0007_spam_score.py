@@ -0,0 +1,34 @@
+# Generated by Django 4.2.14 on 2026-10-18 14:23
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_spam_report_outbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SpamScore',
+            fields=[
+                ('person', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='spam_score', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('score', models.FloatField()),
+                ('reporters', models.PositiveIntegerField()),
+                ('recent_reports', models.PositiveIntegerField()),
+                ('established_reporters', models.PositiveIntegerField()),
+                ('last_reported_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Watermark',
+            fields=[
+                ('name', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('last_id', models.BigIntegerField(default=0)),
+            ],
+        ),
+    ]
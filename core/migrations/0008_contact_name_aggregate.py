@@ -0,0 +1,56 @@
+# Generated by Django 4.2.14 on 2026-10-18 15:03
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+BATCH_SIZE = 10000
+
+
+def backfill_contact_name_aggregates(apps, schema_editor):
+    """
+    Count the contact names, inserting the aggregates of a batch of contacts at a time as
+    ContactNameAggregateManager.rebuild does, so a contact's names never span two batches.
+    """
+    UserContact = apps.get_model('core', 'UserContact')
+    ContactNameAggregate = apps.get_model('core', 'ContactNameAggregate')
+    batch = {}
+    names = UserContact.objects.order_by('contact_id', 'pk').values_list('contact_id', 'name')
+    for contact_id, name in names.iterator(chunk_size=BATCH_SIZE):
+        normalized_name = ' '.join(name.split()).casefold()[:255]
+        key = (contact_id, normalized_name)
+        if key not in batch:
+            if len(batch) >= BATCH_SIZE and contact_id != next(reversed(batch))[0]:
+                ContactNameAggregate.objects.bulk_create(batch.values(), batch_size=BATCH_SIZE)
+                batch = {}
+            batch[key] = ContactNameAggregate(
+                contact_id=contact_id, normalized_name=normalized_name, name=name[:255], count=0
+            )
+        batch[key].count += 1
+    ContactNameAggregate.objects.bulk_create(batch.values(), batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_spam_score'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContactNameAggregate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('normalized_name', models.CharField(max_length=255)),
+                ('name', models.CharField(max_length=255)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('contact', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='name_aggregates', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='contactnameaggregate',
+            constraint=models.UniqueConstraint(fields=('contact', 'normalized_name'), name='unique_contact_name_aggregate'),
+        ),
+        migrations.RunPython(backfill_contact_name_aggregates, migrations.RunPython.noop),
+    ]
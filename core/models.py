@@ -1,7 +1,10 @@
 from django.db import models
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin
 
-from core.managers import PersonManager
+from core.managers import (
+    ContactNameAggregateManager, PersonManager, SpamReportOutboxManager, SpamScoreManager
+)
+from core.phone import normalize_phone_number, phone_number_key
 
 
 class Person(AbstractBaseUser, PermissionsMixin):
@@ -15,7 +18,10 @@ class Person(AbstractBaseUser, PermissionsMixin):
     )
 
     name = models.CharField(max_length=255, null=True, blank=True)
-    phone_number = models.CharField(max_length=15, unique=True)
+    # Canonical E.164 form of the phone number, see core.phone
+    phone_number = models.CharField(max_length=16, unique=True)
+    # Numeric form of the phone number, used for equality lookups
+    phone_key = models.BigIntegerField(unique=True, null=True, blank=True, editable=False)
     email = models.EmailField(null=True, blank=True)
     password = models.CharField(max_length=128, null=True, blank=True)
     type = models.CharField(max_length=7, choices=USER_TYPE_CHOICES)
@@ -23,6 +29,8 @@ class Person(AbstractBaseUser, PermissionsMixin):
     updated_at = models.DateTimeField(auto_now=True)
     is_active = models.BooleanField(default=True)
     is_admin = models.BooleanField(default=False)
+    # Denormalized number of spam reports against this person, kept in sync by core.signals.
+    spam_count = models.PositiveIntegerField(default=0)
 
     objects = PersonManager()
 
@@ -33,6 +41,18 @@ class Person(AbstractBaseUser, PermissionsMixin):
     def is_staff(self):
         return self.is_admin
 
+    def save(self, *args, **kwargs):
+        """
+        Normalize the phone number and keep its lookup key in sync. Legacy numbers which can't
+        be normalized are saved as they are, without a lookup key.
+        """
+        try:
+            self.phone_number = normalize_phone_number(self.phone_number)
+            self.phone_key = phone_number_key(self.phone_number)
+        except ValueError:
+            self.phone_key = None
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f'{self.name}->{self.phone_number}->{self.type}'
 
@@ -46,6 +66,15 @@ class UserContact(models.Model):
     contact = models.ForeignKey(Person, related_name='contact_users', on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'contact'], name='unique_user_contact'),
+        ]
+        indexes = [
+            # Serves the contact list keyset pagination on (created_at, id)
+            models.Index(fields=['user', 'created_at', 'id'], name='usercontact_user_created_idx'),
+        ]
+
     def __str__(self):
         return f'{self.name}->{self.user.phone_number}->{self.contact.phone_number}'
 
@@ -60,5 +89,101 @@ class SpamReport(models.Model):
     )
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['reported_by', 'spam_person'], name='unique_spam_report'),
+        ]
+
     def __str__(self):
         return f'{self.reported_by.phone_number}->{self.spam_person.phone_number}'
+
+
+class SpamReportOutbox(models.Model):
+    """
+    Model representing a spam report accepted by the API and waiting to be applied by the
+    process_spam_reports worker.
+    """
+    reported_by = models.ForeignKey(Person, related_name='queued_spam_reports', on_delete=models.CASCADE)
+    # Normalized phone number of the reported person
+    phone_number = models.CharField(max_length=16)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = SpamReportOutboxManager()
+
+    def __str__(self):
+        return f'{self.reported_by_id}->{self.phone_number}'
+
+
+class SpamScore(models.Model):
+    """
+    Model representing the precomputed spam likelihood of a reported phone number, refreshed
+    by the refresh_spam_scores command from the spam reports against it.
+    """
+    person = models.OneToOneField(
+        Person, related_name='spam_score', primary_key=True, on_delete=models.CASCADE
+    )
+    # Likelihood between 0 and 1 that the number is spam
+    score = models.FloatField()
+    reporters = models.PositiveIntegerField()
+    recent_reports = models.PositiveIntegerField()
+    established_reporters = models.PositiveIntegerField()
+    last_reported_at = models.DateTimeField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = SpamScoreManager()
+
+    def __str__(self):
+        return f'{self.person_id}->{self.score}'
+
+
+class Watermark(models.Model):
+    """
+    Model representing how far an incremental job has processed a table, as the highest
+    primary key it has seen.
+    """
+    name = models.CharField(max_length=64, primary_key=True)
+    last_id = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.name}->{self.last_id}'
+
+
+class NameNgram(models.Model):
+    """
+    Model representing a posting of the n-gram index used by name search. Each row maps a
+    lowercased n-gram to a person whose own name or a contact name saved for them contains it.
+    """
+    gram = models.CharField(max_length=3)
+    person = models.ForeignKey(Person, related_name='name_ngrams', on_delete=models.CASCADE)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['gram', 'person'], name='unique_name_ngram_posting'),
+        ]
+
+    def __str__(self):
+        return f'{self.gram}->{self.person_id}'
+
+
+class ContactNameAggregate(models.Model):
+    """
+    Model representing how many users saved a person under a name, kept in sync with the user
+    contacts by core.signals and the contact sync, and rebuilt by the rebuild_contact_names
+    command. Names count together when they only differ in case or whitespace.
+    """
+    contact = models.ForeignKey(Person, related_name='name_aggregates', on_delete=models.CASCADE)
+    # Key of the name, see ContactNameAggregateManager.normalize_name
+    normalized_name = models.CharField(max_length=255)
+    # Name shown in search results, as first saved
+    name = models.CharField(max_length=255)
+    count = models.PositiveIntegerField(default=0)
+
+    objects = ContactNameAggregateManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['contact', 'normalized_name'], name='unique_contact_name_aggregate'),
+        ]
+
+    def __str__(self):
+        return f'{self.contact_id}->{self.name}->{self.count}'
@@ -0,0 +1,193 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, LimitOffsetPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination seeking on a composite ascending ordering. The cursor holds the ordering
+    values of the last row of the previous page, so every page is a bounded range scan instead
+    of an OFFSET. The total count is only computed when the client asks for it with count=true.
+    """
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    page_size_query_param = 'limit'
+    page_size = api_settings.PAGE_SIZE
+    max_page_size = 100
+    invalid_cursor_message = 'Invalid cursor'
+
+    def __init__(self, ordering):
+        self.ordering = tuple(ordering)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset, count_queryset = self.get_page_queryset(queryset, request)
+        self.count = count_queryset.count() if count_queryset is not None else None
+        return self.get_page(list(queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """
+        Async version of paginate_queryset, for views using the async ORM.
+        """
+        queryset, count_queryset = self.get_page_queryset(queryset, request)
+        self.count = await count_queryset.acount() if count_queryset is not None else None
+        return self.get_page([row async for row in queryset])
+
+    def get_page_queryset(self, queryset, request):
+        """
+        Return the queryset of the requested page plus one row, and the queryset to count if
+        the client asked for the total count, else None.
+        """
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        position = self.decode_cursor(request)
+        queryset = queryset.order_by(*self.ordering)
+
+        count_queryset = None
+        if request.query_params.get(self.count_query_param, '').lower() in ('1', 'true'):
+            count_queryset = queryset
+
+        if position is not None:
+            queryset = queryset.filter(self.get_position_filter(self.clean_position(position, queryset)))
+        return queryset[:self.page_size + 1], count_queryset
+
+    def get_page(self, results):
+        """
+        Return the page from the fetched rows, noting whether there is a next page.
+        """
+        self.has_next = len(results) > self.page_size
+        results = results[:self.page_size]
+        self.next_position = self.get_position(results[-1]) if self.has_next else None
+        return results
+
+    def get_paginated_response(self, data):
+        payload = {}
+        if self.count is not None:
+            payload['count'] = self.count
+        payload['next'] = self.get_next_link()
+        payload['results'] = data
+        return Response(payload)
+
+    def get_page_size(self, request):
+        """
+        Return the page size requested by the client, bounded by max_page_size.
+        """
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(page_size, self.max_page_size) if page_size > 0 else self.page_size
+
+    def get_position(self, row):
+        """
+        Return the ordering values of a row, a model instance or a dict from .values(), as a list.
+        """
+        if isinstance(row, dict):
+            return [row[field] for field in self.ordering]
+        return [getattr(row, field) for field in self.ordering]
+
+    def clean_position(self, position, queryset):
+        """
+        Return the cursor position converted to the types of the ordering fields or
+        annotations of the queryset. Raise NotFound for values that don't convert, so a
+        tampered cursor can't reach the query.
+        """
+        cleaned = []
+        for field_name, value in zip(self.ordering, position):
+            annotation = queryset.query.annotations.get(field_name)
+            field = annotation.output_field if annotation is not None else queryset.model._meta.get_field(field_name)
+            if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+                raise NotFound(self.invalid_cursor_message)
+            try:
+                cleaned.append(field.to_python(value))
+            except (ValidationError, TypeError, ValueError):
+                raise NotFound(self.invalid_cursor_message)
+        return cleaned
+
+    def get_position_filter(self, position):
+        """
+        Return a filter selecting the rows strictly after the given position, expanded as
+        (a > x) OR (a = x AND b > y) OR (a = x AND b = y AND c > z) ...
+        """
+        position_filter = Q()
+        for index, field in enumerate(self.ordering):
+            condition = Q(**{f'{field}__gt': position[index]})
+            for previous_field, previous_value in zip(self.ordering[:index], position[:index]):
+                condition &= Q(**{previous_field: previous_value})
+            position_filter |= condition
+        return position_filter
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_position))
+
+    def encode_cursor(self, position):
+        position = [value.isoformat() if isinstance(value, datetime) else value for value in position]
+        return base64.urlsafe_b64encode(json.dumps(position, separators=(',', ':')).encode()).decode()
+
+    def decode_cursor(self, request):
+        """
+        Return the position encoded in the cursor query param, or None for the first page.
+        """
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None
+        try:
+            position = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        except (binascii.Error, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return position
+
+
+class AsyncLimitOffsetPagination(LimitOffsetPagination):
+    """
+    Limit/offset pagination with an async version of paginate_queryset, for views using the
+    async ORM.
+    """
+    async def apaginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.limit = self.get_limit(request)
+        if self.limit is None:
+            return None
+        self.count = await queryset.acount()
+        self.offset = self.get_offset(request)
+        if self.count == 0 or self.offset > self.count:
+            return []
+        return [row async for row in queryset[self.offset:self.offset + self.limit]]
+
+
+class KeysetPaginationMixin:
+    """
+    Mixin for list views to switch to keyset pagination when the client sends the cursor query
+    param, an empty value requesting the first page. Other requests keep the view's
+    pagination_class.
+    """
+    keyset_ordering = None
+
+    def get_keyset_ordering(self):
+        """
+        Return the ordering to seek on, or None when the current request can't be keyset paginated.
+        """
+        return self.keyset_ordering
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            ordering = self.get_keyset_ordering()
+            if ordering and KeysetPagination.cursor_query_param in self.request.query_params:
+                self._paginator = KeysetPagination(ordering)
+            else:
+                return super().paginator
+        return self._paginator
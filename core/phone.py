@@ -0,0 +1,51 @@
+import re
+
+from django.conf import settings
+
+EXTENSION_PATTERN = re.compile(r'\s*(?:x|ext\.?|#).*$', re.IGNORECASE)
+NON_DIGIT_PATTERN = re.compile(r'\D')
+MIN_DIGITS = 4
+MAX_DIGITS = 15
+
+
+def has_default_country_code(digits):
+    """
+    Return whether the digits of a number given without an international prefix start with
+    the DEFAULT_COUNTRY_CODE, judged by their count: they don't have the length of a national
+    number, and do once the code is dropped.
+    """
+    country_code = settings.DEFAULT_COUNTRY_CODE
+    national_lengths = settings.DEFAULT_NATIONAL_NUMBER_LENGTHS
+    return (
+        digits.startswith(country_code) and len(digits) not in national_lengths
+        and len(digits) - len(country_code) in national_lengths
+    )
+
+
+def normalize_phone_number(phone_number):
+    """
+    Return the canonical E.164 form of a phone number, e.g. '+15550100' for '555-0100'.
+    Numbers without an international prefix ('+' or '00') are assumed to belong to the
+    DEFAULT_COUNTRY_CODE setting, unless they already start with it, e.g. '1 555 0100'.
+    Extensions are dropped. Raise ValueError if the number can't be normalized.
+    """
+    value = EXTENSION_PATTERN.sub('', str(phone_number).strip())
+    digits = NON_DIGIT_PATTERN.sub('', value)
+    if value.startswith('+'):
+        pass
+    elif value.startswith('00'):
+        digits = digits[2:]
+    else:
+        digits = digits.lstrip('0')
+        if not has_default_country_code(digits):
+            digits = settings.DEFAULT_COUNTRY_CODE + digits
+    if not MIN_DIGITS <= len(digits) <= MAX_DIGITS or digits.startswith('0'):
+        raise ValueError(f'Invalid phone number: {phone_number!r}')
+    return f'+{digits}'
+
+
+def phone_number_key(phone_number):
+    """
+    Return the numeric lookup key of a normalized phone number.
+    """
+    return int(phone_number[1:])
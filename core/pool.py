@@ -0,0 +1,118 @@
+import threading
+import time
+from functools import lru_cache
+
+from django.conf import settings
+
+
+class ConnectionPool:
+    """
+    Per-process bound on the requests holding a database connection at once. Django keeps one
+    persistent connection per thread, so WSGI workers need as many slots as threads, while the
+    ASGI handler runs the ORM on one thread and the slots bound the requests in flight instead.
+    A request checks a slot out for its whole duration, waiting up to the timeout for one.
+    """
+    def __init__(self, size, timeout):
+        self.size = size
+        self.timeout = timeout
+        self.slots = threading.BoundedSemaphore(size)
+        self.lock = threading.Lock()
+        self.in_use = 0
+        self.reset()
+
+    def reset(self):
+        """
+        Reset the counters, the slots in use are kept.
+        """
+        with self.lock:
+            self.checkouts = 0
+            self.waits = 0
+            self.wait_time = 0.0
+            self.timeouts = 0
+            self.opens = 0
+
+    def try_acquire(self):
+        """
+        Check a slot out if one is free, without waiting.
+        """
+        if not self.slots.acquire(blocking=False):
+            return False
+        with self.lock:
+            self.checkouts += 1
+            self.in_use += 1
+        return True
+
+    def acquire(self):
+        """
+        Check a slot out, waiting up to the timeout. Return False if none was freed meanwhile.
+        """
+        if self.try_acquire():
+            return True
+        started_at = time.perf_counter()
+        acquired = self.slots.acquire(timeout=self.timeout)
+        with self.lock:
+            self.waits += 1
+            self.wait_time += time.perf_counter() - started_at
+            if acquired:
+                self.checkouts += 1
+                self.in_use += 1
+            else:
+                self.timeouts += 1
+        return acquired
+
+    def release(self):
+        with self.lock:
+            self.in_use -= 1
+        self.slots.release()
+
+    def opened(self):
+        """
+        Count a new database connection.
+        """
+        with self.lock:
+            self.opens += 1
+
+    @property
+    def saturated(self):
+        return self.in_use >= self.size
+
+    def stats(self):
+        with self.lock:
+            return {
+                'size': self.size,
+                'in_use': self.in_use,
+                'checkouts': self.checkouts,
+                'waits': self.waits,
+                'wait_time': self.wait_time,
+                'timeouts': self.timeouts,
+                'opens': self.opens,
+            }
+
+    def render(self):
+        """
+        Return the pool metrics in the Prometheus text exposition format.
+        """
+        stats = self.stats()
+        metrics = [
+            ('db_pool_size', 'gauge', 'size', 'Requests allowed to hold a database connection at once.'),
+            ('db_pool_in_use', 'gauge', 'in_use', 'Requests holding a database connection.'),
+            ('db_pool_checkouts_total', 'counter', 'checkouts', 'Connection slots checked out.'),
+            ('db_pool_waits_total', 'counter', 'waits', 'Checkouts that waited for a free slot.'),
+            ('db_pool_wait_seconds_total', 'counter', 'wait_time', 'Time spent waiting for a free slot.'),
+            ('db_pool_timeouts_total', 'counter', 'timeouts', 'Checkouts that gave up waiting.'),
+            ('db_connections_opened_total', 'counter', 'opens', 'Database connections opened.'),
+        ]
+        lines = []
+        for metric, metric_type, key, description in metrics:
+            lines.append(f'# HELP spam_api_{metric} {description}')
+            lines.append(f'# TYPE spam_api_{metric} {metric_type}')
+            lines.append(f'spam_api_{metric} {stats[key]}')
+        return '\n'.join(lines) + '\n'
+
+
+@lru_cache(maxsize=None)
+def get_connection_pool():
+    """
+    Return the connection pool of the process, sized by the DB_POOL_SIZE setting.
+    """
+    return ConnectionPool(settings.DB_POOL_SIZE, settings.DB_POOL_TIMEOUT)
@@ -0,0 +1,127 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework.permissions import SAFE_METHODS
+
+# Database the reads of the current request go to, None for the primary
+read_database = ContextVar('read_database', default=None)
+# Writes of the current request, None outside requests, see core.middleware.ReplicaStickinessMiddleware
+request_writes = ContextVar('request_writes', default=None)
+
+WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+
+class RequestWrites:
+    """
+    Whether the current request wrote to the primary.
+    """
+    def __init__(self):
+        self.wrote = False
+
+
+def record_write(execute, sql, params, many, context):
+    """
+    Database execute wrapper noting that the current request wrote, if it is tracked.
+    """
+    writes = request_writes.get()
+    if writes is not None and not writes.wrote and sql.lstrip()[:7].upper().startswith(WRITE_STATEMENTS):
+        writes.wrote = True
+    return execute(sql, params, many, context)
+
+
+def sticky_cache_key(user_id):
+    return f'db_sticky:{user_id}'
+
+
+def mark_sticky(user_id):
+    """
+    Keep the reads of the user on the primary for REPLICA_STICKY_SECONDS, so they see their
+    own writes while the replicas catch up.
+    """
+    cache.set(sticky_cache_key(user_id), True, settings.REPLICA_STICKY_SECONDS)
+
+
+def choose_read_database(user):
+    """
+    Return a random replica for the reads of the user's request, or None when there are no
+    replicas or the user wrote recently.
+    """
+    if not settings.DATABASE_REPLICAS:
+        return None
+    if user.is_authenticated and cache.get(sticky_cache_key(user.pk)):
+        return None
+    return random.choice(settings.DATABASE_REPLICAS)
+
+
+async def achoose_read_database(user):
+    """
+    Async version of choose_read_database.
+    """
+    if not settings.DATABASE_REPLICAS:
+        return None
+    if user.is_authenticated and await cache.aget(sticky_cache_key(user.pk)):
+        return None
+    return random.choice(settings.DATABASE_REPLICAS)
+
+
+@contextmanager
+def read_from_primary():
+    """
+    Send the reads meanwhile to the primary, e.g. for results written to the shared cache,
+    which would outlive the replication lag.
+    """
+    token = read_database.set(None)
+    try:
+        yield
+    finally:
+        read_database.reset(token)
+
+
+class ReplicaRouter:
+    """
+    Database router sending the reads of the views reading from replicas to the replica chosen
+    for the request, and everything else to the primary. Reads stay on the primary within a
+    transaction on it, so they see its uncommitted writes.
+    """
+    def db_for_read(self, model, **hints):
+        database = read_database.get()
+        if database is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return database
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
+
+
+class ReplicaReadMixin:
+    """
+    Mixin for API views to send the reads of their safe requests to a replica, once the user
+    is authenticated against the primary. Users who wrote in the last REPLICA_STICKY_SECONDS
+    keep reading from the primary.
+    """
+    read_from_replica = True
+
+    def dispatch(self, request, *args, **kwargs):
+        token = read_database.set(None)
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            read_database.reset(token)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if self.read_from_replica and request.method in SAFE_METHODS:
+            read_database.set(choose_read_database(request.user))
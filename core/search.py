@@ -0,0 +1,149 @@
+import unicodedata
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count
+from django.utils.module_loading import import_string
+
+from core.models import NameNgram, Person, UserContact
+
+NGRAM_SIZE = 3
+
+
+def fold_name(name):
+    """
+    Return the name case folded and stripped of accents, as the default MySQL collation
+    compares names, so the index finds 'José' for 'jose'.
+    """
+    name = unicodedata.normalize('NFKD', (name or '').casefold())
+    return ''.join(char for char in name if not unicodedata.combining(char))
+
+
+def name_ngrams(name):
+    """
+    Return the set of folded n-grams of the given name.
+    """
+    name = fold_name(name)
+    return {name[i:i + NGRAM_SIZE] for i in range(len(name) - NGRAM_SIZE + 1)}
+
+
+class NameSearchIndex:
+    """
+    Base name search index which does no indexing, so name search falls back to a full scan.
+    Subclasses resolve a search query to a queryset of candidate person ids and keep their
+    postings up to date when names change.
+    """
+    def candidate_ids(self, search_query):
+        """
+        Return a values queryset of ids of people which may match the search query, or None
+        when every person is a candidate.
+        """
+        return None
+
+    def add(self, names):
+        """
+        Index the given new (person id, name) pairs, keeping the other names of the people.
+        """
+
+    def update(self, person_ids):
+        """
+        Re-index the names of the given people.
+        """
+
+    def rebuild(self):
+        """
+        Re-index the names of every person.
+        """
+
+
+class NgramNameSearchIndex(NameSearchIndex):
+    """
+    Name search index backed by the NameNgram posting table. A person is a candidate for a
+    query when its postings contain every n-gram of the query, which holds for every name
+    the query is a substring of.
+    """
+    batch_size = 1000
+
+    def candidate_ids(self, search_query):
+        grams = name_ngrams(search_query)
+        if not grams:
+            return None
+        return NameNgram.objects.filter(gram__in=grams).values('person').annotate(
+            matched=Count('gram')
+        ).filter(matched=len(grams)).values('person')
+
+    def get_postings(self, person_ids):
+        """
+        Return the set of (person id, gram) postings derived from the current names of the
+        given people and of the contact entries saved for them.
+        """
+        postings = set()
+        names = list(Person.objects.filter(pk__in=person_ids).values_list('pk', 'name'))
+        names += UserContact.objects.filter(contact_id__in=person_ids).values_list('contact_id', 'name')
+        for person_id, name in names:
+            postings.update((person_id, gram) for gram in name_ngrams(name))
+        return postings
+
+    def add(self, names):
+        """
+        Insert the postings of the new names only, without reading the other names of the
+        people, which grow with the users who saved a popular number.
+        """
+        postings = {(person_id, gram) for person_id, name in names for gram in name_ngrams(name)}
+        NameNgram.objects.bulk_create(
+            [NameNgram(person_id=person_id, gram=gram) for person_id, gram in postings],
+            batch_size=self.batch_size,
+            ignore_conflicts=True,
+        )
+
+    @transaction.atomic
+    def update(self, person_ids):
+        person_ids = set(person_ids)
+        if not person_ids:
+            return
+        postings = self.get_postings(person_ids)
+        existing = set(
+            NameNgram.objects.filter(person_id__in=person_ids).values_list('person_id', 'gram')
+        )
+        stale_person_ids = {person_id for person_id, _ in existing - postings}
+        if stale_person_ids:
+            NameNgram.objects.filter(person_id__in=stale_person_ids).delete()
+            existing = {posting for posting in existing if posting[0] not in stale_person_ids}
+        NameNgram.objects.bulk_create(
+            [NameNgram(person_id=person_id, gram=gram) for person_id, gram in postings - existing],
+            batch_size=self.batch_size,
+            ignore_conflicts=True,
+        )
+
+    @transaction.atomic
+    def rebuild(self):
+        """
+        Re-index every person in batches. Postings are inserted with executemany on a raw
+        cursor, as compiling millions of model inserts would dominate the rebuild.
+        """
+        NameNgram.objects.all().delete()
+        quote_name = connection.ops.quote_name
+        insert_sql = 'INSERT INTO {} ({}, {}) VALUES (%s, %s)'.format(
+            quote_name(NameNgram._meta.db_table),
+            quote_name(NameNgram._meta.get_field('gram').column),
+            quote_name(NameNgram._meta.get_field('person').column),
+        )
+        person_ids = Person.objects.values_list('pk', flat=True).order_by('pk')
+        batch = []
+        with connection.cursor() as cursor:
+            for person_id in person_ids.iterator(chunk_size=self.batch_size):
+                batch.append(person_id)
+                if len(batch) == self.batch_size:
+                    cursor.executemany(insert_sql, [(gram, pk) for pk, gram in self.get_postings(batch)])
+                    batch = []
+            if batch:
+                cursor.executemany(insert_sql, [(gram, pk) for pk, gram in self.get_postings(batch)])
+
+
+@lru_cache(maxsize=None)
+def get_name_search_index():
+    """
+    Return the name search index configured by the NAME_SEARCH_INDEX setting.
+    """
+    return import_string(settings.NAME_SEARCH_INDEX)()
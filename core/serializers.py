@@ -1,17 +1,46 @@
+from operator import itemgetter
+
+from django.conf import settings
 from django.contrib.auth.password_validation import validate_password
+from django.db import IntegrityError, transaction
 from rest_framework import serializers
 
-from core.models import Person, SpamReport, UserContact
+from core.cache import invalidate_phone_search_results, invalidate_profiles
+from core.metrics import TimedListSerializer, TimedSerializerMixin
+from core.models import ContactNameAggregate, Person, SpamReport, SpamReportOutbox, UserContact
+from core.phone import normalize_phone_number, phone_number_key
+from core.search import get_name_search_index
+
+
+class PhoneNumberField(serializers.CharField):
+    """
+    Char field accepting a phone number in any format and normalizing it to E.164.
+    """
+    default_error_messages = {
+        'invalid_phone_number': 'Enter a valid phone number.',
+    }
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('max_length', 32)
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        phone_number = super().to_internal_value(data)
+        try:
+            return normalize_phone_number(phone_number)
+        except ValueError:
+            self.fail('invalid_phone_number')
 
 
-class PersonSerializer(serializers.ModelSerializer):
+class PersonSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """
     Serializer for the Person model.
     """
-    phone_number = serializers.CharField(max_length=15)
+    phone_number = PhoneNumberField()
 
     class Meta:
         model = Person
+        list_serializer_class = TimedListSerializer
         fields = ['id', 'name', 'phone_number', 'email', 'password']
         extra_kwargs = {
             'password': {'write_only': True, 'required': True},
@@ -25,13 +54,14 @@ class PersonSerializer(serializers.ModelSerializer):
         validate_password(password)
         return password
 
+    @transaction.atomic
     def create(self, validated_data):
         """
         Create and return a person. If a contact or spam person with the same phone number exists,
-        update it to be a user.
+        update it to be a user. The cached search results are dropped once the write commits.
         """
-        phone_number = validated_data['phone_number']
-        existing_person = Person.objects.filter(phone_number=phone_number).first()
+        existing_person = Person.objects.get_by_phone_number(validated_data['phone_number'])
+        invalidate_phone_search_results(validated_data['phone_number'])
 
         if existing_person:
             if existing_person.type in ['contact', 'spam']:
@@ -51,7 +81,7 @@ class LoginSerializer(serializers.Serializer):
     """
     Serializer for the Login View
     """
-    phone_number = serializers.CharField(max_length=15)
+    phone_number = PhoneNumberField()
     password = serializers.CharField()
 
 
@@ -59,44 +89,77 @@ class ProfileQueryParamSerializer(serializers.Serializer):
     """
     Serializer for the profile query params
     """
-    phone_number = serializers.CharField(max_length=15)
+    phone_number = PhoneNumberField()
+
+
+class SpamCheckQueryParamSerializer(serializers.Serializer):
+    """
+    Serializer for the spam check query params
+    """
+    phone_number = PhoneNumberField()
 
 
 class SpamReportSerializer(serializers.ModelSerializer):
     """
     Serializer for the SpamReport model.
     """
-    phone_number = serializers.CharField(write_only=True)
+    phone_number = PhoneNumberField(write_only=True)
 
     class Meta:
         model = SpamReport
         fields = ['id', 'phone_number']
     
+    def check_not_self(self, phone_number):
+        """
+        Validate that the user isn't reporting their own phone number.
+        """
+        if phone_number == self.context['request'].user.phone_number:
+            raise serializers.ValidationError('Can\'t report self as spam.')
+
+    @transaction.atomic
     def create(self, validated_data):
         """
         Create and return a SpamReport. If the spam person doesn't exist, create a new one.
+        The report insert and the spam counter update commit together.
         """
-        if validated_data['phone_number'] == self.context['request'].user.phone_number:
-            raise serializers.ValidationError('Can\'t report self as spam.')
+        self.check_not_self(validated_data['phone_number'])
         spam_person, _ = Person.objects.get_or_create(
-            phone_number=validated_data['phone_number'],
-            defaults={'type': 'spam'}
+            phone_key=phone_number_key(validated_data['phone_number']),
+            defaults={'phone_number': validated_data['phone_number'], 'type': 'spam'}
         )
-        spam_report, created = SpamReport.objects.get_or_create(
-            reported_by=validated_data['reported_by'],
-            spam_person=spam_person
+        invalidate_phone_search_results(validated_data['phone_number'])
+        # The unique constraint on (reported_by, spam_person) makes the duplicate check part of
+        # the INSERT itself.
+        try:
+            with transaction.atomic():
+                return SpamReport.objects.create(
+                    reported_by=validated_data['reported_by'],
+                    spam_person=spam_person
+                )
+        except IntegrityError:
+            # Only a violation of unique_spam_report means the report exists. The locking read
+            # sees a report committed by another request after this transaction started.
+            if SpamReport.objects.select_for_update().filter(
+                reported_by=validated_data['reported_by'], spam_person=spam_person
+            ).exists():
+                raise serializers.ValidationError('Spam report already exists.')
+            raise
+
+    def enqueue(self, reported_by):
+        """
+        Queue the report in the outbox, to be applied by the process_spam_reports worker.
+        """
+        self.check_not_self(self.validated_data['phone_number'])
+        return SpamReportOutbox.objects.create(
+            reported_by=reported_by, phone_number=self.validated_data['phone_number']
         )
-        if created:
-            return spam_report
-        else:
-            raise serializers.ValidationError('Spam report already exists.')
 
 
 class UserContactSerializer(serializers.ModelSerializer):
     """
     Serializer for the UserContact model, accepting phone number and name of the contact.
     """
-    phone_number = serializers.CharField(max_length=15, write_only=True)
+    phone_number = PhoneNumberField(write_only=True)
 
     class Meta:
         model = UserContact
@@ -108,26 +171,142 @@ class UserContactSerializer(serializers.ModelSerializer):
         """
         phone_number = attrs['phone_number']
         user = self.context['request'].user
-        if UserContact.objects.filter(user=user, contact__phone_number=phone_number).exists():
+        phone_key = phone_number_key(phone_number)
+        if UserContact.objects.filter(user=user, contact__phone_key=phone_key).exists():
             raise serializers.ValidationError("Contact already exists in your contact list.")
         return attrs
 
+    @transaction.atomic
     def create(self, validated_data):
         """
         Create and return a UserContact. If the contact doesn't exist, create a new Person object.
+        The cached search results are dropped once the write commits.
         """
         phone_number = validated_data['phone_number']
         name = validated_data['name']
         user = self.context['request'].user
 
         contact_person, _ = Person.objects.get_or_create(
-            phone_number=phone_number,
-            defaults={'name': name, 'type': 'contact'}
+            phone_key=phone_number_key(phone_number),
+            defaults={'phone_number': phone_number, 'name': name, 'type': 'contact'}
         )
+        invalidate_phone_search_results(phone_number)
         return UserContact.objects.create(user=user, contact=contact_person, name=name)
     
 
-class UserContactOutputSerializer(serializers.ModelSerializer):
+class ContactExportQueryParamSerializer(serializers.Serializer):
+    """
+    Serializer for the contact export query params
+    """
+    NDJSON = 'ndjson'
+    CSV = 'csv'
+    export_format = serializers.ChoiceField(choices=[NDJSON, CSV], default=NDJSON)
+
+
+class ContactSyncEntrySerializer(serializers.Serializer):
+    """
+    Serializer for a single address book entry of a contact sync.
+    """
+    phone_number = PhoneNumberField()
+    name = serializers.CharField(max_length=255)
+
+
+class ContactSyncSerializer(serializers.Serializer):
+    """
+    Serializer for syncing a whole address book into the user's contact list.
+    """
+    contacts = ContactSyncEntrySerializer(
+        many=True, allow_empty=False, max_length=settings.CONTACT_SYNC_MAX_ENTRIES
+    )
+
+    @staticmethod
+    def batched(items, batch_size=settings.CONTACT_SYNC_BATCH_SIZE):
+        """
+        Yield successive batches of the given list.
+        """
+        for start in range(0, len(items), batch_size):
+            yield items[start:start + batch_size]
+
+    def get_person_ids(self, phone_numbers):
+        """
+        Return a mapping of phone number to person id for the people that exist.
+        """
+        person_ids = {}
+        for batch in self.batched([phone_number_key(phone_number) for phone_number in phone_numbers]):
+            person_ids.update(Person.objects.filter(phone_key__in=batch).values_list('phone_number', 'pk'))
+        return person_ids
+
+    @transaction.atomic
+    def create(self, validated_data):
+        """
+        Upsert the address book into the user's contact list with set based queries and return
+        a summary of the changes. Later entries win when a phone number is repeated.
+        """
+        user = self.context['request'].user
+        names = {entry['phone_number']: entry['name'] for entry in validated_data['contacts']}
+
+        person_ids = self.get_person_ids(names)
+        missing_phone_numbers = [phone_number for phone_number in names if phone_number not in person_ids]
+        Person.objects.bulk_create(
+            [
+                Person(
+                    phone_number=phone_number,
+                    phone_key=phone_number_key(phone_number),
+                    name=names[phone_number],
+                    type='contact',
+                )
+                for phone_number in missing_phone_numbers
+            ],
+            batch_size=settings.CONTACT_SYNC_BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+        new_person_ids = self.get_person_ids(missing_phone_numbers)
+        person_ids.update(new_person_ids)
+
+        user_contacts = {}
+        for batch in self.batched(list(person_ids.values())):
+            existing_contacts = UserContact.objects.filter(user=user, contact_id__in=batch).only('contact_id', 'name')
+            user_contacts.update((user_contact.contact_id, user_contact) for user_contact in existing_contacts)
+        to_create = []
+        to_update = []
+        renamed_from = []
+        for phone_number, name in names.items():
+            contact_id = person_ids[phone_number]
+            user_contact = user_contacts.get(contact_id)
+            if user_contact is None:
+                to_create.append(UserContact(user=user, contact_id=contact_id, name=name))
+            elif user_contact.name != name:
+                renamed_from.append((contact_id, user_contact.name))
+                user_contact.name = name
+                to_update.append(user_contact)
+        UserContact.objects.bulk_create(to_create, batch_size=settings.CONTACT_SYNC_BATCH_SIZE)
+        UserContact.objects.bulk_update(to_update, ['name'], batch_size=settings.CONTACT_SYNC_BATCH_SIZE)
+
+        # Bulk writes skip the model signals, so count and re-index the affected names here.
+        ContactNameAggregate.objects.apply(
+            added=[(user_contact.contact_id, user_contact.name) for user_contact in to_create + to_update],
+            removed=renamed_from,
+        )
+        changed_contact_ids = {user_contact.contact_id for user_contact in to_create + to_update}
+        get_name_search_index().add(
+            [(person_ids[phone_number], names[phone_number]) for phone_number in new_person_ids]
+            + [(user_contact.contact_id, user_contact.name) for user_contact in to_create]
+        )
+        get_name_search_index().update({user_contact.contact_id for user_contact in to_update})
+        invalidate_phone_search_results(
+            *(phone_number for phone_number, person_id in person_ids.items() if person_id in changed_contact_ids)
+        )
+        if to_create:
+            # The new contacts now see the user's email
+            invalidate_profiles(user.phone_number)
+        return {
+            'created': len(to_create),
+            'updated': len(to_update),
+            'unchanged': len(names) - len(to_create) - len(to_update),
+        }
+
+
+class UserContactOutputSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """
     Serializer for the UserContact model, outputting the contact details
     """
@@ -135,6 +314,7 @@ class UserContactOutputSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = UserContact
+        list_serializer_class = TimedListSerializer
         fields = ['user', 'phone_number', 'name', 'id']
 
     def get_phone_number(self, user_contact):
@@ -155,7 +335,7 @@ class SearchQueryParamSerializer(serializers.Serializer):
         (PHONE_NUMBER, 'Phone Number'),
     ]
     search_by = serializers.ChoiceField(choices=SEARCH_BY_CHOICES)
-    phone_number = serializers.CharField(max_length=15, required=False)
+    phone_number = PhoneNumberField(required=False)
     name = serializers.CharField(max_length=255, min_length=3, required=False)
 
     def validate(self, attrs):
@@ -169,23 +349,81 @@ class SearchQueryParamSerializer(serializers.Serializer):
         return attrs
 
 
-class SearchResultSerializer(serializers.ModelSerializer):
+class SearchBatchSerializer(serializers.Serializer):
+    """
+    Serializer for a batch of phone numbers to search.
+    """
+    phone_numbers = serializers.ListField(
+        child=PhoneNumberField(), allow_empty=False, max_length=settings.SEARCH_BATCH_MAX_NUMBERS
+    )
+
+
+class SearchResultSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """
     Serializer for the Person search result.
     """
-    spam_reports = serializers.SerializerMethodField()
+    spam_reports = serializers.IntegerField(source='spam_count', read_only=True)
+    # None until the number is reported and its score refreshed
+    spam_score = serializers.FloatField(source='spam_score.score', read_only=True)
     name = serializers.SerializerMethodField()
 
     class Meta:
         model = Person
-        fields = ['name', 'phone_number', 'spam_reports']
+        list_serializer_class = TimedListSerializer
+        fields = ['name', 'phone_number', 'spam_reports', 'spam_score']
 
     def get_name(self, person):
         if hasattr(person, 'display_name'):
             return person.display_name
         return person.name
 
-    def get_spam_reports(self, person):
-        return SpamReport.objects.filter(
-            spam_person__phone_number=person.phone_number
-        ).count()
+
+class ValuesSerializer:
+    """
+    Lean read-only list serializer of rows fetched with .values(), for hot list endpoints. A
+    precompiled itemgetter reads the output fields of a row in one call, so serializing a row
+    costs a single dict instead of a model instance and a pass over the DRF fields. Subclasses
+    declare their output fields in order, each mapped to the value it is read from, and must
+    output exactly what their DRF serializer does.
+    """
+    fields = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.names = tuple(cls.fields)
+        cls.getter = itemgetter(*cls.fields.values())
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    @classmethod
+    def values(cls, queryset, *extra_fields):
+        """
+        Return the queryset fetching the values the fields are read from, and the extra ones.
+        """
+        return queryset.values(*dict.fromkeys([*cls.fields.values(), *extra_fields]))
+
+    @property
+    def data(self):
+        names, getter = self.names, self.getter
+        return [dict(zip(names, getter(row))) for row in self.rows]
+
+
+class FastUserContactOutputSerializer(TimedSerializerMixin, ValuesSerializer):
+    """
+    Values serializer equivalent to UserContactOutputSerializer.
+    """
+    fields = {'user': 'user', 'phone_number': 'contact__phone_number', 'name': 'name', 'id': 'id'}
+
+
+class FastSearchResultSerializer(TimedSerializerMixin, ValuesSerializer):
+    """
+    Values serializer equivalent to SearchResultSerializer, for querysets annotated with the
+    display name.
+    """
+    fields = {
+        'name': 'display_name',
+        'phone_number': 'phone_number',
+        'spam_reports': 'spam_count',
+        'spam_score': 'spam_score__score',
+    }
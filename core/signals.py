@@ -0,0 +1,174 @@
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.backends.signals import connection_created
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from core.authentication import invalidate_token, invalidate_user_tokens
+from core.cache import invalidate_phone_search_results, invalidate_profiles
+from core.metrics import record_query
+from core.models import ContactNameAggregate, Person, SpamReport, UserContact
+from core.pool import get_connection_pool
+from core.routers import record_write
+from core.search import get_name_search_index
+from core.spam_filter import spam_number_filter
+
+
+@receiver(post_save, sender=SpamReport)
+def increment_spam_count(sender, instance, created, **kwargs):
+    """
+    Increment the spam counter of the reported person when a new report is saved.
+    """
+    if created and instance.spam_person_id:
+        Person.objects.filter(pk=instance.spam_person_id).update(spam_count=F('spam_count') + 1)
+
+
+@receiver(post_save, sender=SpamReport)
+def add_to_spam_filter(sender, instance, created, **kwargs):
+    """
+    Add a newly reported number to this process' spam filter without waiting for its refresh.
+    """
+    if created and instance.spam_person_id and instance.spam_person.phone_key is not None:
+        spam_number_filter.add(instance.spam_person.phone_key)
+
+
+@receiver(post_delete, sender=SpamReport)
+def decrement_spam_count(sender, instance, **kwargs):
+    """
+    Decrement the spam counter of the reported person when a report is deleted, including
+    reports removed by a cascade from the reporter, and drop the cached search results showing
+    the old count.
+    """
+    if instance.spam_person_id:
+        Person.objects.filter(
+            pk=instance.spam_person_id, spam_count__gt=0
+        ).update(spam_count=F('spam_count') - 1)
+        phone_number = Person.objects.filter(
+            pk=instance.spam_person_id, phone_key__isnull=False
+        ).values_list('phone_number', flat=True).first()
+        if phone_number:
+            invalidate_phone_search_results(phone_number)
+
+
+@receiver(post_save, sender=Person)
+def index_person_name(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Index the name of a new person, and re-index it whenever it may have changed.
+    """
+    if created:
+        get_name_search_index().add([(instance.pk, instance.name)])
+    elif update_fields is None or 'name' in update_fields:
+        get_name_search_index().update([instance.pk])
+
+
+@receiver(pre_save, sender=UserContact)
+def remember_contact_name(sender, instance, update_fields=None, **kwargs):
+    """
+    Remember the saved contact and name of a user contact being updated, to move its count
+    in the contact name aggregates.
+    """
+    instance.saved_contact_name = None
+    if not instance._state.adding and (update_fields is None or not update_fields.isdisjoint(['name', 'contact'])):
+        instance.saved_contact_name = UserContact.objects.filter(
+            pk=instance.pk
+        ).values_list('contact_id', 'name').first()
+
+
+@receiver(post_save, sender=UserContact)
+def index_contact_name(sender, instance, created, **kwargs):
+    """
+    Index the name a user saves a contact under, and re-index the names of the contact when
+    they rename it.
+    """
+    if created:
+        get_name_search_index().add([(instance.contact_id, instance.name)])
+    elif instance.saved_contact_name not in (None, (instance.contact_id, instance.name)):
+        get_name_search_index().update({instance.saved_contact_name[0], instance.contact_id})
+
+
+@receiver(post_delete, sender=UserContact)
+def unindex_contact_name(sender, instance, **kwargs):
+    """
+    Re-index the names of a contact once the removal of a user's contact commits. Contacts
+    removed by a cascade from the contact itself are gone by then, along with their postings.
+    """
+    transaction.on_commit(lambda: get_name_search_index().update([instance.contact_id]))
+
+
+@receiver(post_save, sender=UserContact)
+def count_contact_name(sender, instance, created, **kwargs):
+    """
+    Count the name of a contact when a user saves it, or move its count when they rename it.
+    """
+    contact_name = (instance.contact_id, instance.name)
+    if created:
+        ContactNameAggregate.objects.apply(added=[contact_name])
+    elif instance.saved_contact_name is not None and instance.saved_contact_name != contact_name:
+        ContactNameAggregate.objects.apply(added=[contact_name], removed=[instance.saved_contact_name])
+
+
+@receiver(post_delete, sender=UserContact)
+def uncount_contact_name(sender, instance, **kwargs):
+    """
+    Uncount the name of a contact when a user removes it, including contacts removed by a
+    cascade from the user.
+    """
+    ContactNameAggregate.objects.apply(removed=[(instance.contact_id, instance.name)])
+
+
+@receiver(post_save, sender=Person)
+@receiver(post_delete, sender=Person)
+def invalidate_person_profile(sender, instance, update_fields=None, **kwargs):
+    """
+    Drop the cached profiles of a person whenever its profile fields may have changed.
+    """
+    if update_fields is None or not update_fields.isdisjoint(['name', 'phone_number', 'email']):
+        invalidate_profiles(instance.phone_number)
+
+
+@receiver(post_save, sender=UserContact)
+@receiver(post_delete, sender=UserContact)
+def invalidate_user_profile(sender, instance, created=True, origin=None, **kwargs):
+    """
+    Drop the cached profiles of a user when they save or remove a contact, which decides
+    whether the contact sees their email. Contacts removed along with the user or the contact
+    need nothing, the user's profile is dropped with them or the contact can't view it anymore.
+    """
+    if not created or (isinstance(origin, Person) and origin.pk in (instance.user_id, instance.contact_id)):
+        return
+    if UserContact.user.is_cached(instance):
+        invalidate_profiles(instance.user.phone_number)
+    else:
+        invalidate_profiles(*Person.objects.filter(pk=instance.user_id).values_list('phone_number', flat=True))
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    """
+    Stop accepting a token from the authentication cache once it is deleted.
+    """
+    invalidate_token(instance.key)
+
+
+@receiver(post_save, sender=Person)
+def invalidate_person_tokens(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Drop the cached tokens of a person when it may have been deactivated or its password
+    changed, but not e.g. when a login updates its last_login.
+    """
+    if not created and (update_fields is None or not update_fields.isdisjoint(['is_active', 'password'])):
+        invalidate_user_tokens(instance.pk)
+
+
+@receiver(connection_created)
+def instrument_connection(sender, connection, **kwargs):
+    """
+    Count the new database connection, and its queries in the metrics of sampled requests.
+    Note the requests writing to the primary.
+    """
+    get_connection_pool().opened()
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+    if connection.alias == DEFAULT_DB_ALIAS and record_write not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_write)
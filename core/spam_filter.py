@@ -0,0 +1,144 @@
+import hashlib
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, connection
+from django.db.models import Max
+
+
+class BloomFilter:
+    """
+    Bloom filter of 64-bit integer keys. Membership tests have no false negatives and a
+    false positive rate close to error_rate while no more than capacity keys are added,
+    using about 1.2 bytes per key at a 1% rate.
+    """
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.num_bits = max(64, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def positions(self, key):
+        """
+        Return the bit positions of a key, derived from one 128-bit hash by double hashing.
+        """
+        digest = hashlib.blake2b(key.to_bytes(8, 'little', signed=True), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return [(first + index * second) % self.num_bits for index in range(self.num_hashes)]
+
+    def add(self, key):
+        """
+        Add a key. Keys already in the filter aren't counted again.
+        """
+        added = False
+        for position in self.positions(key):
+            mask = 1 << (position & 7)
+            if not self.bits[position >> 3] & mask:
+                self.bits[position >> 3] |= mask
+                added = True
+        self.count += added
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self.positions(key))
+
+
+class SpamNumberFilter:
+    """
+    Per-process filter of the phone keys of reported people, answering most "is this number
+    spam" checks without a query. It is built as the worker starts, see warm_up, or else on
+    first use, from the people with spam reports, then extended every
+    SPAM_FILTER_REFRESH_INTERVAL seconds with the reports created since the last one it saw.
+    Reports are never removed, so a positive has to be confirmed against the database.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.bloom_filter = None
+        self.last_report_id = 0
+        self.refreshed_at = 0
+
+    def build(self):
+        """
+        Build a new filter sized for twice the reported people, so it absorbs new reports
+        until the next rebuild without degrading.
+        """
+        from core.models import Person, SpamReport
+
+        last_report_id = SpamReport.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+        reported = Person.objects.filter(spam_count__gt=0, phone_key__isnull=False)
+        capacity = max(settings.SPAM_FILTER_CAPACITY, 2 * reported.count())
+        bloom_filter = BloomFilter(capacity, settings.SPAM_FILTER_ERROR_RATE)
+        for phone_key in reported.values_list('phone_key', flat=True).iterator(chunk_size=10000):
+            bloom_filter.add(phone_key)
+        self.bloom_filter = bloom_filter
+        self.last_report_id = last_report_id
+        self.refreshed_at = time.monotonic()
+
+    def refresh(self):
+        """
+        Add the people reported since the last refresh, rebuilding the filter once it holds
+        more keys than it was sized for. Report ids are taken at insert but seen at commit, so
+        the last SPAM_FILTER_REFRESH_OVERLAP ids before the last report seen are scanned again,
+        catching the reports committed after a higher id was seen. A missed report would be a
+        false negative.
+        """
+        from core.models import SpamReport
+
+        new_reports = SpamReport.objects.filter(
+            id__gt=self.last_report_id - settings.SPAM_FILTER_REFRESH_OVERLAP,
+            spam_person__phone_key__isnull=False,
+        ).order_by('id').values_list('id', 'spam_person__phone_key')
+        for report_id, phone_key in new_reports.iterator(chunk_size=10000):
+            self.bloom_filter.add(phone_key)
+            self.last_report_id = max(self.last_report_id, report_id)
+        self.refreshed_at = time.monotonic()
+        if self.bloom_filter.count > self.bloom_filter.capacity:
+            self.build()
+
+    def warm_up(self):
+        """
+        Build the filter unless built, outside a request, so no spam check waits for the build.
+        The database connection opened for it is closed. When the database can't be reached yet
+        the filter is left to be built on first use.
+        """
+        with self.lock:
+            try:
+                if self.bloom_filter is None:
+                    self.build()
+            except DatabaseError:
+                pass
+            finally:
+                connection.close()
+
+    def add(self, phone_key):
+        """
+        Add a newly reported phone key, if the filter is built.
+        """
+        with self.lock:
+            if self.bloom_filter is not None:
+                self.bloom_filter.add(phone_key)
+
+    def clear(self):
+        with self.lock:
+            self.bloom_filter = None
+            self.last_report_id = 0
+
+    def might_be_spam(self, phone_key):
+        """
+        Return False if the phone key was never reported, True if it may have been.
+        """
+        bloom_filter = self.bloom_filter
+        if bloom_filter is None or time.monotonic() - self.refreshed_at > settings.SPAM_FILTER_REFRESH_INTERVAL:
+            with self.lock:
+                if self.bloom_filter is None:
+                    self.build()
+                elif time.monotonic() - self.refreshed_at > settings.SPAM_FILTER_REFRESH_INTERVAL:
+                    self.refresh()
+                bloom_filter = self.bloom_filter
+        return phone_key in bloom_filter
+
+
+spam_number_filter = SpamNumberFilter()
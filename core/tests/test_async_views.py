@@ -0,0 +1,69 @@
+from django.core.cache import cache
+from django.test import override_settings
+from django.urls import resolve
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.async_views import AsyncAPIView
+from core.authentication import token_user_cache
+from core.benchmark import serve_async_views
+from core.models import Person, SpamReport, UserContact
+from core.tests.utils import ApiTestCase
+
+REQUESTS = [
+    ('/api/search/', {'search_by': 'name', 'name': 'user'}),
+    ('/api/search/', {'search_by': 'name', 'name': 'user', 'limit': 5, 'offset': 10}),
+    ('/api/search/', {'search_by': 'name', 'name': 'user', 'cursor': '', 'limit': 4, 'count': 'true'}),
+    ('/api/search/', {'search_by': 'name', 'name': 'user', 'cursor': 'bad'}),
+    ('/api/search/', {'search_by': 'name', 'name': 'us'}),
+    ('/api/search/', {'search_by': 'phone_number', 'phone_number': '+15559990001'}),
+    ('/api/search/', {'search_by': 'phone_number', 'phone_number': '+15550000003', 'limit': 1}),
+    ('/api/profile/', {'phone_number': '+15550000001'}),
+    ('/api/profile/', {'phone_number': '+15550000002'}),
+    ('/api/profile/', {'phone_number': '+15550009999'}),
+    ('/api/profile/', {'phone_number': 'not a number'}),
+]
+
+
+@override_settings(THROTTLE_ENABLED=False)
+class AsyncViewTests(ApiTestCase):
+    """
+    The async search and profile views answer exactly as the sync views do, anonymous, with
+    a bad token and authenticated.
+    """
+    def setUp(self):
+        super().setUp()
+        users = [
+            self.create_user(f'+15550000{index:03d}', f'User {index}', email=f'user{index}@example.com')
+            for index in range(12)
+        ]
+        spam = Person.objects.create_contact('+15559990001', None)
+        for index, user in enumerate(users):
+            UserContact.objects.create(user=user, contact=spam, name=f'Spam Caller {index % 3}')
+        UserContact.objects.create(user=users[1], contact=users[0], name='Friend')
+        SpamReport.objects.create(reported_by=users[0], spam_person=spam)
+        self.token = f'Token {Token.objects.create(user=users[0]).key}'
+
+    def responses(self, async_views):
+        cache.clear()
+        token_user_cache.clear()
+        responses = []
+        with serve_async_views(async_views):
+            for url, _ in REQUESTS:
+                self.assertEqual(issubclass(resolve(url).func.view_class, AsyncAPIView), async_views)
+            for authorization in [None, 'Token bad', self.token]:
+                client = APIClient()
+                if authorization:
+                    client.credentials(HTTP_AUTHORIZATION=authorization)
+                for url, params in REQUESTS:
+                    response = client.get(url, params)
+                    responses.append((
+                        url, params, authorization,
+                        response.status_code, response.content, response.get('WWW-Authenticate'),
+                    ))
+        return responses
+
+    def test_responses_match_the_sync_views(self):
+        for sync_response, async_response in zip(self.responses(False), self.responses(True)):
+            with self.subTest(request=sync_response[:3]):
+                self.assertEqual(async_response, sync_response)
@@ -0,0 +1,92 @@
+import pickle
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from rest_framework.authtoken.models import Token
+
+from core.authentication import TokenUserCache, shared_token_cache_key, token_user_cache
+from core.tests.utils import PASSWORD, ApiTestCase
+
+
+class TokenUserCacheTests(SimpleTestCase):
+    """
+    The in-process token cache is a bounded LRU indexed by user.
+    """
+    def test_least_recently_used_entry_is_evicted(self):
+        token_cache = TokenUserCache(max_size=2, ttl=60)
+        token_cache.set('a', (1, '+15550000001', True))
+        token_cache.set('b', (2, '+15550000002', True))
+        token_cache.get('a')
+        token_cache.set('c', (3, '+15550000003', True))
+        self.assertIsNone(token_cache.get('b'))
+        self.assertEqual(token_cache.get('a'), (1, '+15550000001', True))
+        self.assertEqual(token_cache.get('c'), (3, '+15550000003', True))
+        self.assertEqual(token_cache.user_keys, {1: {'a'}, 3: {'c'}})
+
+    def test_expired_entry_is_dropped(self):
+        token_cache = TokenUserCache(max_size=2, ttl=-1)
+        token_cache.set('a', (1, '+15550000001', True))
+        self.assertIsNone(token_cache.get('a'))
+        self.assertEqual(token_cache.user_keys, {})
+
+    def test_delete_user_drops_only_their_tokens(self):
+        token_cache = TokenUserCache(max_size=10, ttl=60)
+        token_cache.set('a', (1, '+15550000001', True))
+        token_cache.set('b', (1, '+15550000001', True))
+        token_cache.set('c', (2, '+15550000002', True))
+        token_cache.delete_user(1)
+        self.assertIsNone(token_cache.get('a'))
+        self.assertIsNone(token_cache.get('b'))
+        self.assertIsNotNone(token_cache.get('c'))
+        self.assertEqual(token_cache.user_keys, {2: {'c'}})
+
+
+class CachedTokenAuthenticationTests(ApiTestCase):
+    """
+    Token lookups are cached until the token is deleted or its user deactivated.
+    """
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user('+15550000001', 'Alice')
+        self.client = self.client_for(self.user)
+        self.key = Token.objects.get(user=self.user).key
+
+    def spam_check(self):
+        return self.client.get('/api/spam/check/', {'phone_number': '+15559990001'})
+
+    def test_cached_user_skips_the_token_query(self):
+        self.assertEqual(self.spam_check().status_code, 200)
+        self.assertIsNotNone(token_user_cache.get(self.key))
+        with self.assertNumQueries(0):
+            self.assertEqual(self.spam_check().status_code, 200)
+
+    def test_deleted_token_is_rejected(self):
+        self.spam_check()
+        Token.objects.filter(key=self.key).delete()
+        self.assertEqual(self.spam_check().status_code, 401)
+
+    def test_deactivated_user_is_rejected(self):
+        self.spam_check()
+        self.user.is_active = False
+        self.user.save(update_fields=['is_active'])
+        self.assertEqual(self.spam_check().status_code, 401)
+
+    def test_login_keeps_the_cached_token(self):
+        self.spam_check()
+        response = self.client_for().post('/api/login/', {'phone_number': self.user.phone_number, 'password': PASSWORD})
+        self.assertEqual(response.data, {'token': self.key})
+        self.assertIsNotNone(token_user_cache.get(self.key))
+
+    @override_settings(TOKEN_AUTH_SHARED_CACHE=True)
+    def test_shared_cache_holds_no_password_hash(self):
+        self.spam_check()
+        entry = cache.get(shared_token_cache_key(self.key))
+        self.assertEqual(entry, (self.user.pk, self.user.phone_number, True))
+        self.assertNotIn(self.user.password.encode(), pickle.dumps(entry))
+        # Another process finds the user in the shared cache
+        token_user_cache.clear()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.spam_check().status_code, 200)
+        self.user.is_active = False
+        self.user.save(update_fields=['is_active'])
+        self.assertIsNone(cache.get(shared_token_cache_key(self.key)))
@@ -0,0 +1,45 @@
+import os
+
+from django.test import TestCase, override_settings
+
+from core.benchmark import BenchmarkDataset, check_budgets, load_budgets, run_benchmark, serve_async_views
+
+
+class ApiBenchmarkTests(TestCase):
+    """
+    Run the API benchmark on the small dataset and check it against the stored budgets.
+    Latency baselines are machine dependent, so they are only checked when the
+    BENCHMARK_LATENCY_TOLERANCE environment variable gives the allowed factor.
+    """
+    scale = 'small'
+    iterations = 5
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.dataset = BenchmarkDataset(cls.scale)
+
+    def test_query_count_budgets(self):
+        results = run_benchmark(self.dataset, self.iterations)
+        self.assertEqual(check_budgets(results, load_budgets()[self.scale]), [])
+
+    @override_settings(FAST_SERIALIZERS=True)
+    def test_query_count_budgets_with_fast_serializers(self):
+        results = run_benchmark(self.dataset, self.iterations)
+        self.assertEqual(check_budgets(results, load_budgets()[self.scale]), [])
+
+    def test_query_count_budgets_with_async_views(self):
+        with serve_async_views(True):
+            results = run_benchmark(self.dataset, self.iterations)
+        self.assertEqual(check_budgets(results, load_budgets()[self.scale]), [])
+
+    def test_missing_results_and_budgets_fail(self):
+        budgets = {'profile': {'max_queries': 1, 'p95_ms': 5}, 'metrics': {'max_queries': 0, 'p95_ms': 5}}
+        results = {'profile': {'max_queries': 1, 'p95_ms': 1}, 'search_batch': {'max_queries': 1, 'p95_ms': 1}}
+        self.assertEqual(check_budgets(results, budgets), ['metrics: no result', 'search_batch: no budget'])
+
+    def test_latency_baselines(self):
+        latency_tolerance = os.environ.get('BENCHMARK_LATENCY_TOLERANCE')
+        if latency_tolerance is None:
+            self.skipTest('BENCHMARK_LATENCY_TOLERANCE is not set')
+        results = run_benchmark(self.dataset, self.iterations)
+        self.assertEqual(check_budgets(results, load_budgets()[self.scale], float(latency_tolerance)), [])
@@ -0,0 +1,133 @@
+import time
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from core.cache import get_phone_search_results, profile_version_cache_key
+from core.models import Person, SpamReport, UserContact
+from core.tests.utils import PASSWORD, ApiTestCase
+
+
+class PhoneSearchCacheTests(ApiTestCase):
+    """
+    Cached phone number searches are dropped once a write changing their results commits.
+    """
+    phone_number = '+15559990001'
+
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user('+15550000001', 'Alice')
+        self.client = self.client_for(self.user)
+
+    def search(self):
+        response = self.client.get('/api/search/', {'search_by': 'phone_number', 'phone_number': self.phone_number})
+        self.assertEqual(response.status_code, 200)
+        return response.data['results']
+
+    def assert_invalidated(self, write):
+        self.search()
+        self.assertIsNotNone(get_phone_search_results(self.phone_number))
+        with self.captureOnCommitCallbacks(execute=True):
+            write()
+        self.assertIsNone(get_phone_search_results(self.phone_number))
+
+    def save_contact(self):
+        saver = self.create_user('+15550000002')
+        UserContact.objects.create(user=saver, contact=Person.objects.create_contact(self.phone_number, None), name='Bob')
+
+    def test_registration(self):
+        self.save_contact()
+        self.assert_invalidated(lambda: self.client_for().post('/api/register/', {
+            'phone_number': self.phone_number, 'name': 'Robert', 'password': PASSWORD,
+        }))
+        self.assertEqual([result['name'] for result in self.search()], ['Robert'])
+
+    def test_new_contact(self):
+        self.assert_invalidated(lambda: self.client.post('/api/contacts/', {
+            'phone_number': self.phone_number, 'name': 'Bob',
+        }))
+        self.assertEqual([result['name'] for result in self.search()], ['Bob'])
+
+    def test_spam_report(self):
+        self.save_contact()
+        self.assert_invalidated(lambda: self.client.post('/api/spam/', {'phone_number': self.phone_number}))
+        self.assertEqual([result['spam_reports'] for result in self.search()], [1])
+
+    def test_deleted_spam_report(self):
+        self.save_contact()
+        self.client.post('/api/spam/', {'phone_number': self.phone_number})
+        self.assert_invalidated(lambda: SpamReport.objects.filter(reported_by=self.user).delete())
+        self.assertEqual([result['spam_reports'] for result in self.search()], [0])
+
+    def test_rejected_registration_keeps_the_cache(self):
+        self.search()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client_for().post('/api/register/', {
+                'phone_number': self.user.phone_number, 'name': 'Mallory', 'password': PASSWORD,
+            })
+        self.assertEqual(response.status_code, 400)
+        self.assertIsNotNone(get_phone_search_results(self.phone_number))
+
+
+class ProfileCacheTests(ApiTestCase):
+    """
+    Cached profiles are dropped for every viewer when the profile changes.
+    """
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user('+15550000001', 'Alice', email='alice@example.com')
+        self.viewer = self.create_user('+15550000002', 'Bob')
+        self.client = self.client_for(self.viewer)
+
+    def profile(self):
+        response = self.client.get('/api/profile/', {'phone_number': self.user.phone_number})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_renamed_person(self):
+        self.assertEqual(self.profile()['name'], 'Alice')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.name = 'Alicia'
+            self.user.save()
+        self.assertEqual(self.profile()['name'], 'Alicia')
+
+    def test_email_shown_once_the_user_saves_the_viewer(self):
+        self.assertIsNone(self.profile()['email'])
+        with self.captureOnCommitCallbacks(execute=True):
+            UserContact.objects.create(user=self.user, contact=self.viewer, name='Bob')
+        self.assertEqual(self.profile()['email'], 'alice@example.com')
+
+    def test_unrelated_update_keeps_the_profile(self):
+        self.profile()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.spam_count = 3
+            self.user.save(update_fields=['spam_count'])
+        with self.assertNumQueries(0):
+            self.profile()
+
+    def test_email_hidden_once_the_user_removes_the_viewer(self):
+        UserContact.objects.create(user=self.user, contact=self.viewer, name='Bob')
+        self.assertEqual(self.profile()['email'], 'alice@example.com')
+        with self.captureOnCommitCallbacks(execute=True):
+            UserContact.objects.get(user=self.user).delete()
+        self.assertIsNone(self.profile()['email'])
+
+    def test_cascades_do_not_look_the_user_up(self):
+        other = self.create_user('+15550000003', 'Carol')
+        UserContact.objects.create(user=self.user, contact=self.viewer, name='Bob')
+        UserContact.objects.create(user=other, contact=self.user, name='Alice')
+        with CaptureQueriesContext(connection) as queries:
+            self.user.delete()
+        self.assertFalse([query for query in queries if '"phone_number"' in query['sql']])
+
+    def test_versions_expire(self):
+        self.profile()
+        version_key = profile_version_cache_key(self.user.phone_number)
+        with self.captureOnCommitCallbacks(execute=True):
+            UserContact.objects.create(user=self.user, contact=self.viewer, name='Bob')
+        self.assertIsNotNone(cache.get(version_key))
+        with mock.patch('time.time', return_value=time.time() + settings.PROFILE_VERSION_CACHE_TIMEOUT + 1):
+            self.assertIsNone(cache.get(version_key))
@@ -0,0 +1,37 @@
+from django.core.checks import run_checks
+from django.test import SimpleTestCase, override_settings
+
+from core.checks import check_deployed_cache, check_replica_cache
+
+LOCAL_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+SHARED_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://'}}
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class SharedCacheCheckTests(SimpleTestCase):
+    """
+    Replicas, and deployments without DEBUG, require a cache shared by every process.
+    """
+    def error_ids(self, check):
+        return [error.id for error in check(None)]
+
+    @override_settings(DATABASE_REPLICAS=['replica_0'], DEBUG=True)
+    def test_replicas(self):
+        self.assertEqual(self.error_ids(check_replica_cache), ['core.E001'])
+        with self.settings(CACHES=SHARED_CACHES):
+            self.assertEqual(self.error_ids(check_replica_cache), [])
+        with self.settings(DATABASE_REPLICAS=[]):
+            self.assertEqual(self.error_ids(check_replica_cache), [])
+
+    @override_settings(DEBUG=False)
+    def test_deployment(self):
+        self.assertEqual(self.error_ids(check_deployed_cache), ['core.E002'])
+        with self.settings(CACHES=SHARED_CACHES):
+            self.assertEqual(self.error_ids(check_deployed_cache), [])
+        with self.settings(DEBUG=True):
+            self.assertEqual(self.error_ids(check_deployed_cache), [])
+
+    @override_settings(DEBUG=False, DATABASE_REPLICAS=[])
+    def test_registered(self):
+        self.assertEqual([error.id for error in run_checks(tags=['caches'])], [])
+        self.assertEqual([error.id for error in run_checks(tags=['caches'], include_deployment_checks=True)], ['core.E002'])
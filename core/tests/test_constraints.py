@@ -0,0 +1,72 @@
+from unittest import mock
+
+from django.db import IntegrityError, transaction
+
+from core.models import Person, SpamReport, UserContact
+from core.tests.utils import ApiTestCase, MigrationTestCase
+
+
+class UniqueConstraintTests(ApiTestCase):
+    """
+    A user saves a contact and reports a number at most once.
+    """
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user('+15550000001', 'Alice')
+        self.person = Person.objects.create_contact('+15559990001', 'Bob')
+        self.client = self.client_for(self.user)
+
+    def test_duplicate_rows_are_rejected(self):
+        UserContact.objects.create(user=self.user, contact=self.person, name='Bob')
+        SpamReport.objects.create(reported_by=self.user, spam_person=self.person)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            UserContact.objects.create(user=self.user, contact=self.person, name='Robert')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            SpamReport.objects.create(reported_by=self.user, spam_person=self.person)
+
+    def test_duplicate_spam_report(self):
+        self.assertEqual(self.client.post('/api/spam/', {'phone_number': '555 999 0001'}).status_code, 201)
+        response = self.client.post('/api/spam/', {'phone_number': '+1 555 999 0001'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), ['Spam report already exists.'])
+        self.assertEqual(Person.objects.get(pk=self.person.pk).spam_count, 1)
+
+    def test_other_integrity_errors_are_raised(self):
+        with mock.patch.object(SpamReport.objects, 'create', side_effect=IntegrityError('NOT NULL constraint failed')):
+            with self.assertRaisesMessage(IntegrityError, 'NOT NULL constraint failed'):
+                self.client.post('/api/spam/', {'phone_number': '+15559990001'})
+        self.assertEqual(Person.objects.get(pk=self.person.pk).spam_count, 0)
+
+    def test_duplicate_contact(self):
+        self.assertEqual(self.client.post('/api/contacts/', {'phone_number': '5559990001', 'name': 'Bob'}).status_code, 201)
+        response = self.client.post('/api/contacts/', {'phone_number': '+15559990001', 'name': 'Robert'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(UserContact.objects.count(), 1)
+
+
+class DeleteDuplicateRowsMigrationTests(MigrationTestCase):
+    """
+    Migration 0005 deletes the duplicate contacts and spam reports before adding the
+    constraints, and fixes the spam counters.
+    """
+    migrate_from = [('core', '0004_person_phone_key')]
+    migrate_to = [('core', '0005_contact_and_report_constraints')]
+
+    def test_duplicates_are_deleted(self):
+        Person = self.apps.get_model('core', 'Person')
+        UserContact = self.apps.get_model('core', 'UserContact')
+        SpamReport = self.apps.get_model('core', 'SpamReport')
+
+        user = Person.objects.create(phone_number='+15550000001', phone_key=15550000001, name='Alice', type='user')
+        spam = Person.objects.create(phone_number='+15559990001', phone_key=15559990001, type='spam', spam_count=3)
+        contacts = [UserContact.objects.create(user=user, contact=spam, name=name) for name in ['Bob', 'Robert']]
+        reports = [SpamReport.objects.create(reported_by=user, spam_person=spam) for _ in range(3)]
+
+        apps = self.migrate()
+        UserContact = apps.get_model('core', 'UserContact')
+        SpamReport = apps.get_model('core', 'SpamReport')
+        Person = apps.get_model('core', 'Person')
+
+        self.assertEqual(list(UserContact.objects.values_list('id', flat=True)), [contacts[0].id])
+        self.assertEqual(list(SpamReport.objects.values_list('id', flat=True)), [reports[0].id])
+        self.assertEqual(Person.objects.get(pk=spam.pk).spam_count, 1)
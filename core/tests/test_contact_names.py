@@ -0,0 +1,117 @@
+import io
+from importlib import import_module
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import override_settings
+
+from core.models import ContactNameAggregate, Person, UserContact
+from core.tests.utils import ApiTestCase, MigrationTestCase
+
+
+@override_settings(THROTTLE_ENABLED=False)
+class ContactNameAggregateTests(ApiTestCase):
+    """
+    The contact name aggregates count the users who saved a person under each name, as
+    contacts are saved, renamed, removed and synced.
+    """
+    phone_number = '+15559990001'
+
+    def setUp(self):
+        super().setUp()
+        self.users = [self.create_user(f'+1555000000{index}', f'User {index}') for index in range(4)]
+        self.contact = Person.objects.create_contact(self.phone_number, None)
+
+    def counts(self):
+        return dict(
+            ContactNameAggregate.objects.filter(contact=self.contact, count__gt=0).values_list('name', 'count')
+        )
+
+    def save_contact(self, user, name):
+        return UserContact.objects.create(user=user, contact=self.contact, name=name)
+
+    def test_added_names_are_counted_together(self):
+        for user, name in zip(self.users, ['Bob Smith', 'bob  smith', 'BOB SMITH', 'Robert']):
+            self.save_contact(user, name)
+        self.assertEqual(self.counts(), {'Bob Smith': 3, 'Robert': 1})
+
+    def test_renamed_contact_moves_its_count(self):
+        self.save_contact(self.users[0], 'Bob')
+        user_contact = self.save_contact(self.users[1], 'Bob')
+        user_contact.name = 'Robert'
+        user_contact.save()
+        self.assertEqual(self.counts(), {'Bob': 1, 'Robert': 1})
+        # Saves keeping the name don't count it again
+        user_contact.save()
+        self.assertEqual(self.counts(), {'Bob': 1, 'Robert': 1})
+
+    def test_removed_contacts_are_uncounted(self):
+        user_contact = self.save_contact(self.users[0], 'Bob')
+        for user in self.users[1:]:
+            self.save_contact(user, 'Bob')
+        user_contact.delete()
+        UserContact.objects.filter(user=self.users[1]).delete()
+        self.users[2].delete()
+        self.assertEqual(self.counts(), {'Bob': 1})
+
+    def test_sync_counts_new_and_renamed_contacts(self):
+        self.save_contact(self.users[0], 'Bob')
+        self.save_contact(self.users[1], 'Bob')
+        response = self.client_for(self.users[0]).post('/api/contacts/sync/', {'contacts': [
+            {'phone_number': self.phone_number, 'name': 'Robert'},
+            {'phone_number': '+15559990002', 'name': 'Alice'},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.counts(), {'Bob': 1, 'Robert': 1})
+        self.assertEqual(
+            list(ContactNameAggregate.objects.filter(contact__phone_number='+15559990002').values_list('name', 'count')),
+            [('Alice', 1)],
+        )
+
+    def test_counts_do_not_go_below_zero(self):
+        self.save_contact(self.users[0], 'Bob')
+        ContactNameAggregate.objects.apply(removed=[(self.contact.pk, 'Bob')] * 2)
+        ContactNameAggregate.objects.apply(removed=[(self.contact.pk, 'Bob')])
+        self.assertEqual(ContactNameAggregate.objects.get(contact=self.contact).count, 0)
+        ContactNameAggregate.objects.apply(added=[(self.contact.pk, 'Bob')])
+        self.assertEqual(self.counts(), {'Bob': 1})
+
+    def test_rebuild_matches_the_incremental_counts(self):
+        for user, name in zip(self.users, ['Bob', 'bob', 'Robert', 'Rob']):
+            self.save_contact(user, name)
+        UserContact.objects.filter(user=self.users[3]).delete()
+        incremental = self.counts()
+        stdout = io.StringIO()
+        call_command('rebuild_contact_names', stdout=stdout)
+        self.assertEqual(stdout.getvalue(), 'Rebuilt 2 contact name aggregates\n')
+        self.assertEqual(self.counts(), incremental)
+
+
+class ContactNameAggregateMigrationTests(MigrationTestCase):
+    """
+    Migration 0008 counts the existing contact names in batches of contacts.
+    """
+    migrate_from = [('core', '0007_spam_score'), ('authtoken', '0003_tokenproxy')]
+    migrate_to = [('core', '0008_contact_name_aggregate'), ('authtoken', '0003_tokenproxy')]
+
+    def test_backfill(self):
+        Person = self.apps.get_model('core', 'Person')
+        UserContact = self.apps.get_model('core', 'UserContact')
+        users = [
+            Person.objects.create(phone_number=f'+1555000000{index}', phone_key=15550000000 + index, type='user')
+            for index in range(3)
+        ]
+        contacts = [
+            Person.objects.create(phone_number=f'+1555999000{index}', phone_key=15559990000 + index, type='contact')
+            for index in range(2)
+        ]
+        for user, names in zip(users, [['Bob', 'Ann'], ['bob ', 'Ann'], ['Robert', 'Anne']]):
+            for contact, name in zip(contacts, names):
+                UserContact.objects.create(user=user, contact=contact, name=name)
+
+        with mock.patch.object(import_module('core.migrations.0008_contact_name_aggregate'), 'BATCH_SIZE', 1):
+            apps = self.migrate()
+        self.assertEqual(
+            sorted(apps.get_model('core', 'ContactNameAggregate').objects.values_list('contact_id', 'name', 'count')),
+            [(contacts[0].pk, 'Bob', 2), (contacts[0].pk, 'Robert', 1), (contacts[1].pk, 'Ann', 2), (contacts[1].pk, 'Anne', 1)],
+        )
@@ -0,0 +1,53 @@
+from core.models import Person, UserContact
+from core.tests.utils import ApiTestCase
+
+
+class ContactSyncTests(ApiTestCase):
+    """
+    Syncing an address book upserts the user's contacts with set based queries.
+    """
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user('+15550000001', 'Owner')
+        self.client = self.client_for(self.user)
+        self.existing = Person.objects.create_contact('+15559990001', 'Existing')
+        UserContact.objects.create(user=self.user, contact=self.existing, name='Old Name')
+
+    def sync(self, contacts):
+        return self.client.post('/api/contacts/sync/', {'contacts': contacts}, format='json')
+
+    def saved_names(self):
+        return dict(UserContact.objects.filter(user=self.user).values_list('contact__phone_number', 'name'))
+
+    def test_creates_updates_and_counts_unchanged(self):
+        response = self.sync([
+            {'phone_number': '+15559990001', 'name': 'New Name'},
+            {'phone_number': '555 999 0002', 'name': 'Second'},
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'created': 1, 'updated': 1, 'unchanged': 0})
+        self.assertEqual(self.saved_names(), {'+15559990001': 'New Name', '+15559990002': 'Second'})
+        self.assertEqual(Person.objects.get(phone_number='+15559990002').type, 'contact')
+
+        response = self.sync([{'phone_number': '+15559990002', 'name': 'Second'}])
+        self.assertEqual(response.json(), {'created': 0, 'updated': 0, 'unchanged': 1})
+
+    def test_later_entries_win_for_repeated_numbers(self):
+        response = self.sync([
+            {'phone_number': '+15559990003', 'name': 'First'},
+            {'phone_number': '+1 555 999 0003', 'name': 'Last'},
+        ])
+        self.assertEqual(response.json(), {'created': 1, 'updated': 0, 'unchanged': 0})
+        self.assertEqual(self.saved_names()['+15559990003'], 'Last')
+
+    def test_existing_people_are_reused(self):
+        registered = self.create_user('+15550000002', 'Registered')
+        self.sync([{'phone_number': '+15550000002', 'name': 'Friend'}])
+        self.assertEqual(UserContact.objects.get(user=self.user, name='Friend').contact, registered)
+        self.assertEqual(Person.objects.filter(phone_number='+15550000002').count(), 1)
+
+    def test_invalid_requests(self):
+        self.assertEqual(self.sync([]).status_code, 400)
+        self.assertEqual(self.sync([{'phone_number': 'abc', 'name': 'Bad'}]).status_code, 400)
+        self.assertEqual(self.client_for().post('/api/contacts/sync/', {}, format='json').status_code, 401)
+        self.assertEqual(self.saved_names(), {'+15559990001': 'Old Name'})
@@ -0,0 +1,66 @@
+import csv
+import io
+import json
+
+from django.test import override_settings
+
+from core.models import Person, UserContact
+from core.tests.utils import ApiTestCase
+
+
+@override_settings(CONTACT_EXPORT_BATCH_SIZE=3)
+class ContactExportTests(ApiTestCase):
+    """
+    The contact export streams every contact of the user in batches, as NDJSON or CSV.
+    """
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user('+15550000001', 'Alice')
+        other = self.create_user('+15550000002', 'Bob')
+        self.contacts = [
+            UserContact.objects.create(
+                user=self.user, contact=Person.objects.create_contact(f'+1555999{index:04d}', None),
+                name=f'Näme, "{index}"',
+            )
+            for index in range(7)
+        ]
+        UserContact.objects.create(user=other, contact=self.user, name='Alice')
+        self.client = self.client_for(self.user)
+        self.expected = [
+            {'id': contact.id, 'name': contact.name, 'phone_number': contact.contact.phone_number}
+            for contact in self.contacts
+        ]
+
+    def export(self, **params):
+        response = self.client.get('/api/contacts/export/', params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response
+
+    def test_ndjson(self):
+        response = self.export()
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = response.getvalue().decode().splitlines()
+        self.assertEqual([json.loads(line) for line in lines], self.expected)
+
+    def test_csv(self):
+        response = self.export(export_format='csv')
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="contacts.csv"')
+        rows = list(csv.DictReader(io.StringIO(response.getvalue().decode())))
+        self.assertEqual(rows, [{key: str(value) for key, value in row.items()} for row in self.expected])
+
+    def test_rows_are_fetched_in_batches(self):
+        response = self.export()
+        # 7 contacts in batches of 3, the last one short
+        with self.assertNumQueries(3):
+            response.getvalue()
+
+    def test_empty_export(self):
+        UserContact.objects.filter(user=self.user).delete()
+        self.assertEqual(self.export().getvalue(), b'')
+        self.assertEqual(self.export(export_format='csv').getvalue(), b'id,name,phone_number\r\n')
+
+    def test_invalid_requests(self):
+        self.assertEqual(self.client.get('/api/contacts/export/', {'export_format': 'xml'}).status_code, 400)
+        self.assertEqual(self.client_for().get('/api/contacts/export/').status_code, 401)
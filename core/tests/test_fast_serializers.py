@@ -0,0 +1,73 @@
+import datetime
+import decimal
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from rest_framework.renderers import JSONRenderer
+
+from core.models import Person, SpamReport, SpamScore, UserContact
+from core.renderers import FastJSONRenderer
+from core.tests.utils import ApiTestCase
+
+
+class FastJSONRendererTests(SimpleTestCase):
+    """
+    FastJSONRenderer renders the same bytes as JSONRenderer.
+    """
+    def test_same_output(self):
+        data = {
+            'name': 'Zoë "q" \\   é',
+            'results': [{'id': 1, 'score': 0.1667, 'spam': True, 'email': None}],
+            'created_at': datetime.datetime(2026, 10, 18, 12, 30, tzinfo=datetime.timezone.utc),
+            'amount': decimal.Decimal('1.50'),
+            1: 'non string key',
+        }
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(FastJSONRenderer().render(None), JSONRenderer().render(None))
+
+
+@override_settings(THROTTLE_ENABLED=False)
+class FastSerializerTests(ApiTestCase):
+    """
+    With FAST_SERIALIZERS the contact list and search answer with the same bytes.
+    """
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user('+15550000001', 'Zoë Walker')
+        users = [self.create_user(f'+1555000010{index}', f'Walker {index}') for index in range(4)]
+        spam = Person.objects.create_contact('+15559990001', None)
+        for index, user in enumerate(users):
+            UserContact.objects.create(user=self.user, contact=user, name=f'Friend "{index}" \\ é')
+            UserContact.objects.create(user=user, contact=spam, name=f'Spam Walker {index % 2}')
+        for user in users[:3]:
+            SpamReport.objects.create(reported_by=user, spam_person=spam)
+        SpamScore.objects.refresh(full=True)
+        self.client = self.client_for(self.user)
+
+    def responses(self, fast_serializers):
+        cache.clear()
+        responses = []
+        with override_settings(FAST_SERIALIZERS=fast_serializers):
+            for url, params in [
+                ('/api/contacts/', {}),
+                ('/api/contacts/', {'limit': 2, 'offset': 1}),
+                ('/api/contacts/', {'cursor': '', 'limit': 3, 'count': 'true'}),
+                ('/api/search/', {'search_by': 'name', 'name': 'walker'}),
+                ('/api/search/', {'search_by': 'name', 'name': 'walk', 'cursor': '', 'limit': 2}),
+                ('/api/search/', {'search_by': 'phone_number', 'phone_number': '+15559990001'}),
+                ('/api/search/', {'search_by': 'phone_number', 'phone_number': '+15550000100'}),
+            ]:
+                response = self.client.get(url, params)
+                responses.append((url, params, response.status_code, response.content))
+                # Follow the cursors, the fast serializers fetch the keyset values as well
+                while 'cursor' in params and response.json()['next']:
+                    response = self.client.get(response.json()['next'])
+                    responses.append((url, params, response.status_code, response.content))
+        return responses
+
+    def test_responses_match_the_drf_serializers(self):
+        drf_responses, fast_responses = self.responses(False), self.responses(True)
+        self.assertEqual(len(fast_responses), len(drf_responses))
+        for drf_response, fast_response in zip(drf_responses, fast_responses):
+            with self.subTest(request=drf_response[:2]):
+                self.assertEqual(fast_response, drf_response)
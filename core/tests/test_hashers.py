@@ -0,0 +1,96 @@
+import threading
+from importlib.util import find_spec
+from unittest import skipUnless
+
+from django.conf import settings
+from django.contrib.auth.hashers import (
+    PBKDF2PasswordHasher, PBKDF2SHA1PasswordHasher, check_password, get_hasher, identify_hasher, make_password,
+)
+from django.test import SimpleTestCase, override_settings
+
+from core.hashers import get_hashing_executor, run_in_hashing_pool
+from core.tests.utils import PASSWORD, ApiTestCase
+
+
+def current_thread_name():
+    return threading.current_thread().name
+
+
+class HashingPoolTests(SimpleTestCase):
+    """
+    Passwords are hashed in the hashing pool, or inline without workers.
+    """
+    def setUp(self):
+        get_hashing_executor.cache_clear()
+        self.addCleanup(get_hashing_executor.cache_clear)
+
+    @override_settings(PASSWORD_HASHING_WORKERS=1)
+    def test_hashed_in_the_pool(self):
+        self.assertTrue(run_in_hashing_pool(current_thread_name).startswith('password-hashing'))
+        # Nested calls run inline rather than waiting for the only worker
+        self.assertTrue(run_in_hashing_pool(run_in_hashing_pool, current_thread_name).startswith('password-hashing'))
+        encoded = make_password(PASSWORD)
+        self.assertTrue(check_password(PASSWORD, encoded))
+        self.assertFalse(check_password('wrong', encoded))
+
+    @override_settings(PASSWORD_HASHING_WORKERS=0)
+    def test_hashed_inline_without_workers(self):
+        self.assertEqual(run_in_hashing_pool(current_thread_name), threading.current_thread().name)
+
+    @skipUnless(find_spec('argon2'), 'argon2-cffi is not installed')
+    @override_settings(PASSWORD_HASHERS=['core.hashers.Argon2PasswordHasher'])
+    def test_argon2_cost_settings(self):
+        self.assertTrue(make_password(PASSWORD).startswith(
+            f'argon2$argon2id$v=19$m={settings.ARGON2_MEMORY_COST},'
+            f't={settings.ARGON2_TIME_COST},p={settings.ARGON2_PARALLELISM}$'
+        ))
+
+    @skipUnless(find_spec('bcrypt'), 'bcrypt is not installed')
+    @override_settings(PASSWORD_HASHERS=['core.hashers.BCryptSHA256PasswordHasher'])
+    def test_bcrypt_rounds(self):
+        self.assertEqual(get_hasher().safe_summary(make_password(PASSWORD))['work factor'], settings.BCRYPT_ROUNDS)
+
+
+@override_settings(THROTTLE_ENABLED=False)
+class PasswordUpgradeTests(ApiTestCase):
+    """
+    Logging in rehashes passwords stored with an older hasher or cost with the preferred one.
+    """
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user('+15550000001', 'Alice')
+
+    def login(self, password=PASSWORD):
+        return self.client_for().post('/api/login/', {'phone_number': '+15550000001', 'password': password})
+
+    def assert_current_hash(self):
+        self.user.refresh_from_db()
+        hasher = get_hasher()
+        self.assertEqual(identify_hasher(self.user.password).algorithm, hasher.algorithm)
+        self.assertFalse(hasher.must_update(self.user.password))
+
+    def test_new_passwords_use_the_preferred_hasher(self):
+        self.assert_current_hash()
+
+    def test_login_upgrades_legacy_hashes(self):
+        legacy_hashes = {
+            'fewer iterations': PBKDF2PasswordHasher().encode(PASSWORD, 'saltsalt', 1000),
+            'sha1': PBKDF2SHA1PasswordHasher().encode(PASSWORD, 'saltsalt'),
+        }
+        for name, legacy_hash in legacy_hashes.items():
+            with self.subTest(name):
+                self.user.password = legacy_hash
+                self.user.save(update_fields=['password'])
+                response = self.login()
+                self.assertEqual(response.status_code, 200)
+                self.assertIn('token', response.json())
+                self.assert_current_hash()
+                self.assertTrue(check_password(PASSWORD, self.user.password))
+
+    def test_failed_login_keeps_the_hash(self):
+        legacy_hash = PBKDF2SHA1PasswordHasher().encode(PASSWORD, 'saltsalt')
+        self.user.password = legacy_hash
+        self.user.save(update_fields=['password'])
+        self.assertEqual(self.login('wrong').status_code, 400)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.password, legacy_hash)
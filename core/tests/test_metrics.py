@@ -0,0 +1,76 @@
+import re
+
+from django.test import SimpleTestCase, override_settings
+
+from core.metrics import MetricsRegistry, RequestMetrics, registry
+from core.models import Person
+from core.tests.utils import PASSWORD, ApiTestCase
+
+
+class MetricsRegistryTests(SimpleTestCase):
+    """
+    The registry aggregates the requests of every view into a Prometheus histogram and
+    counters of the sampled requests.
+    """
+    def test_render(self):
+        metrics_registry = MetricsRegistry(buckets=(0.01, 0.1))
+        sampled = RequestMetrics()
+        sampled.queries, sampled.db_time, sampled.serializer_time = 3, 0.002, 0.001
+        metrics_registry.observe('search', 0.005, sampled)
+        metrics_registry.observe('search', 0.05)
+        metrics_registry.observe('search', 0.5)
+        lines = metrics_registry.render().splitlines()
+        for line in [
+            'spam_api_request_duration_seconds_bucket{view="search",le="0.01"} 1',
+            'spam_api_request_duration_seconds_bucket{view="search",le="0.1"} 2',
+            'spam_api_request_duration_seconds_bucket{view="search",le="+Inf"} 3',
+            'spam_api_request_duration_seconds_count{view="search"} 3',
+            'spam_api_sampled_requests_total{view="search"} 1',
+            'spam_api_db_queries_total{view="search"} 3',
+            'spam_api_db_query_seconds_total{view="search"} 0.002',
+            'spam_api_serializer_seconds_total{view="search"} 0.001',
+        ]:
+            self.assertIn(line, lines)
+
+
+class PerformanceMiddlewareTests(ApiTestCase):
+    """
+    Every request is timed per view, and the sampled ones report their queries in a
+    Server-Timing header.
+    """
+    def setUp(self):
+        super().setUp()
+        self.admin = Person.objects.create_superuser('+15550000001', 'Admin', PASSWORD)
+        self.user = self.create_user('+15550000002', 'Alice')
+
+    def search(self):
+        return self.client_for(self.user).get('/api/search/', {'search_by': 'name', 'name': 'alice'})
+
+    def search_count(self):
+        match = re.search(r'^spam_api_request_duration_seconds_count\{view="search"\} (\d+)$', registry.render(), re.M)
+        return int(match.group(1)) if match else 0
+
+    @override_settings(PERF_SAMPLE_RATE=1.0)
+    def test_sampled_request(self):
+        count = self.search_count()
+        response = self.search()
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="\d+ queries", serialize;dur=[\d.]+, total;dur=[\d.]+$')
+        self.assertEqual(self.search_count(), count + 1)
+
+    @override_settings(PERF_SAMPLE_RATE=0.0)
+    def test_unsampled_request(self):
+        count = self.search_count()
+        response = self.search()
+        self.assertFalse(response.has_header('Server-Timing'))
+        self.assertEqual(self.search_count(), count + 1)
+
+    def test_metrics_endpoint(self):
+        self.search()
+        response = self.client_for(self.admin).get('/api/metrics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/plain; charset=utf-8')
+        self.assertIn('spam_api_request_duration_seconds_count{view="search"}', response.content.decode())
+
+    def test_metrics_endpoint_is_for_admins(self):
+        self.assertEqual(self.client_for(self.user).get('/api/metrics/').status_code, 403)
+        self.assertEqual(self.client_for().get('/api/metrics/').status_code, 401)
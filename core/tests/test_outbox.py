@@ -0,0 +1,91 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import override_settings
+
+from core.cache import get_phone_search_results, set_phone_search_results
+from core.models import Person, SpamReport, SpamReportOutbox
+from core.tests.utils import ApiTestCase
+
+
+@override_settings(SPAM_REPORTS_ASYNC=True)
+class SpamReportOutboxTests(ApiTestCase):
+    """
+    Spam reports are accepted into the outbox and applied in batches by the worker.
+    """
+    def setUp(self):
+        super().setUp()
+        self.users = [self.create_user(f'+1555000000{index}', f'User {index}') for index in range(3)]
+
+    def report(self, user, phone_number):
+        return self.client_for(user).post('/api/spam/', {'phone_number': phone_number})
+
+    def spam_counts(self):
+        return dict(Person.objects.filter(spam_count__gt=0).values_list('phone_number', 'spam_count'))
+
+    def test_reports_are_queued(self):
+        response = self.report(self.users[0], '555-999-0001')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(list(SpamReportOutbox.objects.values_list('phone_number', flat=True)), ['+15559990001'])
+        self.assertFalse(SpamReport.objects.exists())
+
+    def test_self_report_is_rejected(self):
+        response = self.report(self.users[0], self.users[0].phone_number)
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(SpamReportOutbox.objects.exists())
+
+    def test_batch_is_applied(self):
+        for user in self.users:
+            self.report(user, '+15559990001')
+        self.report(self.users[0], self.users[1].phone_number)
+        self.assertEqual(SpamReportOutbox.objects.process_batch(10), (4, 4))
+        self.assertEqual(self.spam_counts(), {'+15559990001': 3, self.users[1].phone_number: 1})
+        self.assertEqual(Person.objects.get(phone_number='+15559990001').type, 'spam')
+        self.assertFalse(SpamReportOutbox.objects.exists())
+
+    def test_duplicate_reports_are_dropped(self):
+        SpamReport.objects.create(reported_by=self.users[0], spam_person=self.users[1])
+        self.report(self.users[0], self.users[1].phone_number)
+        self.report(self.users[2], '+15559990001')
+        self.report(self.users[2], '5559990001')
+        self.assertEqual(SpamReportOutbox.objects.process_batch(10), (3, 1))
+        self.assertEqual(self.spam_counts(), {'+15559990001': 1, self.users[1].phone_number: 1})
+
+    def test_report_inserted_meanwhile_is_counted_once(self):
+        self.report(self.users[0], self.users[1].phone_number)
+        bulk_create = SpamReport.objects.bulk_create
+
+        def bulk_create_after_a_request(reports, **kwargs):
+            # The same report is made synchronously after the worker checked for it
+            SpamReport.objects.create(reported_by=self.users[0], spam_person=self.users[1])
+            return bulk_create(reports, **kwargs)
+
+        with mock.patch.object(SpamReport.objects, 'bulk_create', side_effect=bulk_create_after_a_request):
+            SpamReportOutbox.objects.process_batch(10)
+        self.assertEqual(SpamReport.objects.count(), 1)
+        self.assertEqual(self.spam_counts(), {self.users[1].phone_number: 1})
+
+    def test_queued_self_report_is_dropped(self):
+        SpamReportOutbox.objects.create(reported_by=self.users[0], phone_number=self.users[0].phone_number)
+        self.assertEqual(SpamReportOutbox.objects.process_batch(10), (1, 0))
+        self.assertEqual(self.spam_counts(), {})
+
+    def test_batches_are_applied_oldest_first(self):
+        for user in self.users:
+            self.report(user, '+15559990001')
+        self.assertEqual(SpamReportOutbox.objects.process_batch(2), (2, 2))
+        self.assertEqual(
+            list(SpamReportOutbox.objects.values_list('reported_by', flat=True)), [self.users[2].pk]
+        )
+        output = StringIO()
+        call_command('process_spam_reports', stdout=output)
+        self.assertEqual(output.getvalue(), 'Processed 1 queued reports, created 1 spam reports\n')
+        self.assertEqual(self.spam_counts(), {'+15559990001': 3})
+
+    def test_cached_search_is_invalidated(self):
+        set_phone_search_results('+15559990001', [])
+        self.report(self.users[0], '+15559990001')
+        with self.captureOnCommitCallbacks(execute=True):
+            SpamReportOutbox.objects.process_batch(10)
+        self.assertIsNone(get_phone_search_results('+15559990001'))
@@ -0,0 +1,75 @@
+import base64
+import json
+
+from django.utils import timezone
+
+from core.models import Person, UserContact
+from core.tests.utils import ApiTestCase
+
+
+def cursor(position):
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+
+class KeysetPaginationTests(ApiTestCase):
+    """
+    Keyset pages of the contact list and of name search.
+    """
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user('+15550000001', 'Owner')
+        self.client = self.client_for(self.user)
+        created_at = timezone.now()
+        for index in range(5):
+            contact = Person.objects.create_contact(f'+1555999000{index}', f'Dan Contact {index}')
+            UserContact.objects.create(user=self.user, contact=contact, name=f'Dan Contact {index}')
+        # Every row ties on created_at, so only the id orders them
+        UserContact.objects.update(created_at=created_at)
+
+    def get_all_pages(self, url, params):
+        pages = []
+        params = {**params, 'cursor': ''}
+        while True:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            pages.append(response.json())
+            if pages[-1]['next'] is None:
+                return pages
+            url, params = pages[-1]['next'], {}
+
+    def test_contact_pages_cover_rows_tied_on_created_at(self):
+        pages = self.get_all_pages('/api/contacts/', {'limit': 2})
+        self.assertEqual([len(page['results']) for page in pages], [2, 2, 1])
+        ids = [result['id'] for page in pages for result in page['results']]
+        self.assertEqual(ids, sorted(UserContact.objects.values_list('id', flat=True)))
+
+    def test_last_page_has_no_next_link(self):
+        response = self.client.get('/api/contacts/', {'cursor': '', 'limit': 5})
+        self.assertIsNone(response.json()['next'])
+        self.assertEqual(len(response.json()['results']), 5)
+
+    def test_count_only_when_asked(self):
+        response = self.client.get('/api/contacts/', {'cursor': '', 'limit': 2})
+        self.assertNotIn('count', response.json())
+        pages = self.get_all_pages('/api/contacts/', {'limit': 2, 'count': 'true'})
+        self.assertEqual({page['count'] for page in pages}, {5})
+
+    def test_name_search_pages(self):
+        pages = self.get_all_pages('/api/search/', {'search_by': 'name', 'name': 'dan', 'limit': 2})
+        names = [result['name'] for page in pages for result in page['results']]
+        self.assertEqual(names, [f'Dan Contact {index}' for index in range(5)])
+
+    def test_malformed_cursors_are_not_found(self):
+        last_id = UserContact.objects.order_by('id').first().id
+        cursors = [
+            'not base64!', cursor({'a': 1}), cursor([1]), cursor(['abc', 1]), cursor([{'a': 1}, 1]),
+            cursor([None, 1]), cursor([timezone.now().isoformat(), 'x']), cursor([[1], last_id]),
+            cursor([timezone.now().isoformat(), True]),
+        ]
+        for value in cursors:
+            with self.subTest(cursor=value):
+                response = self.client.get('/api/contacts/', {'cursor': value})
+                self.assertEqual(response.status_code, 404)
+                self.assertEqual(response.json(), {'detail': 'Invalid cursor'})
+        response = self.client.get('/api/search/', {'search_by': 'name', 'name': 'dan', 'cursor': cursor([{}, 'a', 1])})
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,78 @@
+from django.test import SimpleTestCase, override_settings
+
+from core.phone import normalize_phone_number, phone_number_key
+from core.tests.utils import MigrationTestCase
+
+
+class NormalizePhoneNumberTests(SimpleTestCase):
+    """
+    Phone numbers are normalized to E.164 under the default country code.
+    """
+    def test_formats_of_the_same_number(self):
+        for phone_number in ['+1 555 0200', '555-0200', '15550200', '1-555-0200', '001 5550200', '(555) 0200 ext. 12']:
+            with self.subTest(phone_number=phone_number):
+                self.assertEqual(normalize_phone_number(phone_number), '+15550200')
+
+    def test_ten_digit_national_numbers(self):
+        self.assertEqual(normalize_phone_number('(202) 555-0143'), '+12025550143')
+        self.assertEqual(normalize_phone_number('1 202 555 0143'), '+12025550143')
+
+    def test_international_numbers_are_kept(self):
+        self.assertEqual(normalize_phone_number('+44 20 7946 0958'), '+442079460958')
+        self.assertEqual(normalize_phone_number('0044 20 7946 0958'), '+442079460958')
+
+    @override_settings(DEFAULT_COUNTRY_CODE='44', DEFAULT_NATIONAL_NUMBER_LENGTHS=[10])
+    def test_other_default_country(self):
+        self.assertEqual(normalize_phone_number('020 7946 0958'), '+442079460958')
+        self.assertEqual(normalize_phone_number('44 20 7946 0958'), '+442079460958')
+
+    def test_invalid_numbers(self):
+        for phone_number in ['', 'abc', '12', '+0123456', '+1234567890123456']:
+            with self.subTest(phone_number=phone_number):
+                with self.assertRaises(ValueError):
+                    normalize_phone_number(phone_number)
+
+    def test_phone_number_key(self):
+        self.assertEqual(phone_number_key('+15550200'), 15550200)
+
+
+class MergeDuplicatePeopleMigrationTests(MigrationTestCase):
+    """
+    Migration 0004 normalizes the stored numbers and merges the people sharing one.
+    """
+    migrate_from = [('core', '0003_name_ngram'), ('authtoken', '0003_tokenproxy')]
+    migrate_to = [('core', '0004_person_phone_key'), ('authtoken', '0003_tokenproxy')]
+
+    def test_duplicates_are_merged_into_the_registered_user(self):
+        Person = self.apps.get_model('core', 'Person')
+        UserContact = self.apps.get_model('core', 'UserContact')
+        SpamReport = self.apps.get_model('core', 'SpamReport')
+        Token = self.apps.get_model('authtoken', 'Token')
+
+        contact = Person.objects.create(phone_number='15550200', name='Old Contact', type='contact')
+        user = Person.objects.create(phone_number='+1 555 0200', name='Alice', type='user')
+        spam = Person.objects.create(phone_number='555-0200', name=None, type='spam')
+        other = Person.objects.create(phone_number='+15550300', name='Bob', type='user')
+        Token.objects.create(key='a' * 40, user=contact)
+        Token.objects.create(key='b' * 40, user=user)
+        UserContact.objects.create(user=other, contact=contact, name='Alice Old')
+        UserContact.objects.create(user=other, contact=user, name='Alice')
+        SpamReport.objects.create(reported_by=other, spam_person=spam)
+        SpamReport.objects.create(reported_by=other, spam_person=contact)
+        SpamReport.objects.create(reported_by=contact, spam_person=user)
+
+        apps = self.migrate()
+        Person = apps.get_model('core', 'Person')
+        UserContact = apps.get_model('core', 'UserContact')
+        SpamReport = apps.get_model('core', 'SpamReport')
+        Token = apps.get_model('authtoken', 'Token')
+
+        self.assertEqual(
+            sorted(Person.objects.values_list('id', 'phone_number', 'phone_key')),
+            [(user.id, '+15550200', 15550200), (other.id, '+15550300', 15550300)],
+        )
+        self.assertEqual(list(Token.objects.values_list('user_id', flat=True)), [user.id])
+        self.assertEqual(list(UserContact.objects.values_list('user_id', 'contact_id')), [(other.id, user.id)])
+        # The duplicate reports collapse into one, and the merged self report is dropped
+        self.assertEqual(list(SpamReport.objects.values_list('reported_by_id', 'spam_person_id')), [(other.id, user.id)])
+        self.assertEqual(Person.objects.get(id=user.id).spam_count, 1)
@@ -0,0 +1,120 @@
+from asgiref.sync import async_to_sync
+from django.test import SimpleTestCase, override_settings
+from rest_framework.authtoken.models import Token
+
+from core.benchmark import TokenAsyncClient, serve_async_views
+from core.models import Person, UserContact
+from core.pool import ConnectionPool, get_connection_pool
+from core.tests.utils import ApiTestCase
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    """
+    The pool hands out at most size slots, and counts the checkouts, waits and timeouts.
+    """
+    def test_slots(self):
+        pool = ConnectionPool(2, 0.01)
+        self.assertTrue(pool.acquire())
+        self.assertTrue(pool.try_acquire())
+        self.assertTrue(pool.saturated)
+        self.assertFalse(pool.try_acquire())
+        self.assertFalse(pool.acquire())
+        pool.release()
+        self.assertFalse(pool.saturated)
+        self.assertTrue(pool.acquire())
+        stats = pool.stats()
+        self.assertEqual(
+            {key: stats[key] for key in ['size', 'in_use', 'checkouts', 'waits', 'timeouts']},
+            {'size': 2, 'in_use': 2, 'checkouts': 3, 'waits': 1, 'timeouts': 1},
+        )
+        self.assertGreater(stats['wait_time'], 0)
+
+    def test_reset_keeps_the_slots_in_use(self):
+        pool = ConnectionPool(1, 0.01)
+        pool.acquire()
+        pool.opened()
+        pool.reset()
+        self.assertEqual(pool.stats(), {
+            'size': 1, 'in_use': 1, 'checkouts': 0, 'waits': 0, 'wait_time': 0.0, 'timeouts': 0, 'opens': 0,
+        })
+
+    def test_render(self):
+        pool = ConnectionPool(3, 0.01)
+        pool.acquire()
+        rendered = pool.render()
+        self.assertIn('# TYPE spam_api_db_pool_size gauge\nspam_api_db_pool_size 3\n', rendered)
+        self.assertIn('spam_api_db_pool_in_use 1\n', rendered)
+        self.assertIn('spam_api_db_pool_checkouts_total 1\n', rendered)
+
+
+@override_settings(DB_POOL_SIZE=1, DB_POOL_TIMEOUT=0.01, THROTTLE_ENABLED=False)
+class ConnectionPoolMiddlewareTests(ApiTestCase):
+    """
+    Requests finding no free slot get a 503, and every request gives its slot back, streamed
+    responses once they are sent.
+    """
+    def setUp(self):
+        super().setUp()
+        get_connection_pool.cache_clear()
+        self.addCleanup(get_connection_pool.cache_clear)
+        self.pool = get_connection_pool()
+        self.user = Person.objects.create_superuser('+15550000001', 'Admin', 'test-Password-1')
+        UserContact.objects.create(user=self.user, contact=Person.objects.create_contact('+15550000002', None), name='Bob')
+        self.client = self.client_for(self.user)
+
+    def test_slot_is_released(self):
+        self.assertEqual(self.client.get('/api/contacts/').status_code, 200)
+        self.assertEqual(self.client.post('/api/contacts/', {'phone_number': 'bad'}).status_code, 400)
+        self.assertEqual(self.pool.in_use, 0)
+        self.assertEqual(self.pool.stats()['checkouts'], 2)
+
+    def test_streamed_response_keeps_its_slot(self):
+        response = self.client.get('/api/contacts/export/')
+        self.assertEqual(self.pool.in_use, 1)
+        b''.join(response.streaming_content)
+        response.close()
+        self.assertEqual(self.pool.in_use, 0)
+
+    def test_streamed_response_keeps_its_slot_until_closed(self):
+        response = self.client.get('/api/contacts/export/')
+        next(response.streaming_content)
+        self.assertEqual(self.pool.in_use, 1)
+        # The client went away before the whole response was sent
+        response.close()
+        self.assertEqual(self.pool.in_use, 0)
+        # Responses closed before they are sent release their slot too, once
+        self.client.get('/api/contacts/export/').close()
+        self.assertEqual(self.pool.in_use, 0)
+        response.close()
+        self.assertEqual(self.pool.in_use, 0)
+
+    def test_busy(self):
+        self.pool.acquire()
+        self.addCleanup(self.pool.release)
+        response = self.client.get('/api/contacts/')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(response.json(), {'detail': 'The service is busy, try again later.'})
+        self.assertEqual(self.pool.stats()['timeouts'], 1)
+
+    def test_busy_async(self):
+        client = TokenAsyncClient(Token.objects.get(user=self.user).key)
+
+        @async_to_sync
+        async def get_profile():
+            return await client.get('/api/profile/', {'phone_number': '+15550000002'})
+
+        with serve_async_views(True):
+            self.pool.acquire()
+            response = get_profile()
+            self.assertEqual(response.status_code, 503)
+            self.pool.release()
+            response = get_profile()
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.pool.in_use, 0)
+
+    def test_metrics(self):
+        response = self.client.get('/api/metrics/')
+        self.assertEqual(response.status_code, 200)
+        # The metrics request holds the only slot itself
+        self.assertIn('spam_api_db_pool_in_use 1\n', response.content.decode())
@@ -0,0 +1,104 @@
+import random
+from collections import Counter
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db.models import Count, F
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+
+from core.management.commands.populate_db import Command
+from core.models import ContactNameAggregate, NameNgram, Person, SpamReport, UserContact
+from core.search import get_name_search_index
+
+
+class RandomPairsTests(SimpleTestCase):
+    """
+    The random pairs are distinct, never pair an id with itself and are spread over the ids.
+    """
+    def random_pairs(self, person_ids, count):
+        command = Command()
+        command.random = random.Random(7)
+        return list(command.random_pairs(person_ids, count))
+
+    def test_every_pair(self):
+        person_ids = [10, 20, 30, 40]
+        pairs = self.random_pairs(person_ids, 12)
+        self.assertEqual(sorted(pairs), [(first, second) for first in person_ids for second in person_ids if first != second])
+
+    def test_pairs_are_spread(self):
+        pairs = self.random_pairs(list(range(10)), 25)
+        self.assertEqual(len(set(pairs)), 25)
+        self.assertFalse([pair for pair in pairs if pair[0] == pair[1]])
+        self.assertEqual(sorted(Counter(first for first, _ in pairs).values()), [2] * 5 + [3] * 5)
+        self.assertEqual(self.random_pairs(list(range(10)), 0), [])
+
+
+class PopulateDbMixin:
+    """
+    Runs populate_db on a small dataset and checks the rows it created.
+    """
+    def populate(self, *args):
+        call_command(
+            'populate_db', '--num_users', '20', '--num_contacts', '60', '--num_spam_reports', '30',
+            '--seed', '7', *args, stdout=StringIO(),
+        )
+
+    def people(self):
+        return list(Person.objects.order_by('phone_number').values_list('phone_number', 'name', 'phone_key'))
+
+    def assert_populated(self):
+        self.assertEqual(Person.objects.filter(type='user').count(), 20)
+        self.assertEqual(UserContact.objects.count(), 60)
+        self.assertEqual(SpamReport.objects.count(), 30)
+        self.assertFalse(UserContact.objects.filter(user=F('contact')).exists())
+        self.assertFalse(SpamReport.objects.filter(reported_by=F('spam_person')).exists())
+        self.assertFalse(
+            Person.objects.annotate(reports=Count('spam_reports_as_spam')).exclude(spam_count=F('reports')).exists()
+        )
+        self.assertEqual(
+            sum(ContactNameAggregate.objects.values_list('count', flat=True)), UserContact.objects.count()
+        )
+        postings = set(NameNgram.objects.values_list('person_id', 'gram'))
+        get_name_search_index().rebuild()
+        self.assertEqual(set(NameNgram.objects.values_list('person_id', 'gram')), postings)
+
+
+class PopulateDbTests(PopulateDbMixin, TestCase):
+    """
+    populate_db creates the requested rows, without duplicate or self pairs, and keeps the
+    denormalized tables in sync in both modes.
+    """
+    def test_default_mode(self):
+        self.populate()
+        self.assert_populated()
+        self.assertFalse(Person.objects.filter(phone_key__isnull=True).exists())
+
+    def test_bulk_mode(self):
+        self.populate('--bulk', '--batch_size', '8')
+        self.assert_populated()
+        self.assertFalse(Person.objects.filter(phone_key__isnull=True).exists())
+
+    def test_bulk_mode_is_reproducible(self):
+        self.populate('--bulk', '--batch_size', '8')
+        people = self.people()
+        contacts = sorted(UserContact.objects.values_list('user__phone_number', 'contact__phone_number', 'name'))
+        self.populate('--bulk', '--batch_size', '8')
+        self.assertEqual(self.people(), people)
+        self.assertEqual(
+            sorted(UserContact.objects.values_list('user__phone_number', 'contact__phone_number', 'name')), contacts
+        )
+
+    def test_too_many_pairs(self):
+        with self.assertRaises(CommandError):
+            call_command('populate_db', '--num_users', '3', '--num_contacts', '7', stdout=StringIO())
+
+
+class PopulateDbWorkersTests(PopulateDbMixin, TransactionTestCase):
+    """
+    Worker processes are forked with the database connections closed, so this runs outside a
+    test transaction.
+    """
+    def test_bulk_mode_with_workers(self):
+        self.populate('--bulk', '--batch_size', '8', '--workers', '2')
+        self.assert_populated()
@@ -0,0 +1,107 @@
+import unittest
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db import connections
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from core.models import Person, UserContact
+from core.routers import ReplicaRouter, choose_read_database, read_database, read_from_primary, sticky_cache_key
+from core.tests.utils import ApiTestCase
+
+
+@override_settings(DATABASE_REPLICAS=['replica_0'])
+class ReplicaRouterTests(SimpleTestCase):
+    """
+    Reads go to the replica chosen for the request, writes and migrations to the primary.
+    """
+    def setUp(self):
+        self.router = ReplicaRouter()
+        self.token = read_database.set('replica_0')
+        self.addCleanup(read_database.reset, self.token)
+
+    def test_reads_go_to_the_chosen_replica(self):
+        self.assertEqual(self.router.db_for_read(Person), 'replica_0')
+        self.assertEqual(self.router.db_for_write(Person), 'default')
+
+    def test_read_from_primary(self):
+        with read_from_primary():
+            self.assertIsNone(self.router.db_for_read(Person))
+        self.assertEqual(self.router.db_for_read(Person), 'replica_0')
+
+    def test_migrations_skip_the_replicas(self):
+        self.assertFalse(self.router.allow_migrate('replica_0', 'core'))
+        self.assertIsNone(self.router.allow_migrate('default', 'core'))
+
+
+@override_settings(THROTTLE_ENABLED=False, DATABASE_REPLICAS=['replica_0'])
+class ReplicaStickinessTests(ApiTestCase):
+    """
+    Users who wrote keep reading from the primary for REPLICA_STICKY_SECONDS, everybody else
+    reads from a replica.
+    """
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user('+15550000001', 'Alice')
+        self.other = self.create_user('+15550000002', 'Bob')
+        self.client = self.client_for(self.user)
+
+    def test_reads_do_not_stick(self):
+        self.client.get('/api/contacts/')
+        self.client.get('/api/search/', {'search_by': 'name', 'name': 'bob'})
+        self.assertEqual(choose_read_database(self.user), 'replica_0')
+
+    def test_writes_stick_to_the_primary(self):
+        response = self.client.post('/api/contacts/', {'phone_number': '+15559990001', 'name': 'New'})
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(cache.get(sticky_cache_key(self.user.pk)))
+        self.assertIsNone(choose_read_database(self.user))
+        self.assertEqual(choose_read_database(self.other), 'replica_0')
+        self.assertEqual(choose_read_database(AnonymousUser()), 'replica_0')
+        # Once the window has passed the reads go back to the replicas
+        cache.delete(sticky_cache_key(self.user.pk))
+        self.assertEqual(choose_read_database(self.user), 'replica_0')
+
+    def test_failed_writes_do_not_stick(self):
+        response = self.client.post('/api/contacts/', {'phone_number': 'not a number', 'name': 'New'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIsNone(cache.get(sticky_cache_key(self.user.pk)))
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas(self):
+        self.client.post('/api/contacts/', {'phone_number': '+15559990001', 'name': 'New'})
+        self.assertIsNone(cache.get(sticky_cache_key(self.user.pk)))
+        self.assertIsNone(choose_read_database(self.user))
+
+
+@unittest.skipUnless(settings.DATABASE_REPLICAS, 'DB_REPLICA_HOSTS is not set')
+@override_settings(THROTTLE_ENABLED=False)
+class ReplicaRoutingTests(TransactionTestCase):
+    """
+    Against real replicas, the contact list reads from a replica until the user writes.
+    """
+    databases = {'default', *settings.DATABASE_REPLICAS}
+
+    def setUp(self):
+        cache.clear()
+        self.user = ApiTestCase.create_user('+15550000001', 'Alice')
+        UserContact.objects.create(user=self.user, contact=ApiTestCase.create_user('+15550000002', 'Bob'), name='Bob')
+        self.client = ApiTestCase.client_for(self.user)
+
+    def replica_queries(self, *args, **kwargs):
+        with ExitStack() as stack:
+            contexts = [
+                stack.enter_context(CaptureQueriesContext(connections[alias])) for alias in settings.DATABASE_REPLICAS
+            ]
+            response = self.client.get(*args, **kwargs)
+        self.assertEqual(response.status_code, 200)
+        return sum(len(context) for context in contexts)
+
+    def test_routing(self):
+        self.assertGreater(self.replica_queries('/api/contacts/'), 0)
+        self.client.post('/api/contacts/', {'phone_number': '+15559990001', 'name': 'New'})
+        self.assertEqual(self.replica_queries('/api/contacts/'), 0)
+        self.assertIn('New', [contact['name'] for contact in self.client.get('/api/contacts/').json()])
@@ -0,0 +1,178 @@
+from importlib import import_module
+from unittest import mock
+
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
+from core.models import NameNgram, Person, SpamReport, UserContact
+from core.search import fold_name, get_name_search_index, name_ngrams
+from core.tests.utils import ApiTestCase, MigrationTestCase
+
+
+class NameNgramTests(ApiTestCase):
+    """
+    The n-gram index narrows name search to the people whose names may contain the query.
+    """
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user('+15550000001', 'Alice Walker')
+        self.contact = Person.objects.create_contact('+15559990001', 'José Ramírez')
+
+    def candidates(self, search_query):
+        return set(get_name_search_index().candidate_ids(search_query).values_list('person', flat=True))
+
+    def postings(self):
+        return set(NameNgram.objects.values_list('person_id', 'gram'))
+
+    def test_names_are_folded_like_the_collation(self):
+        self.assertEqual(fold_name('JOSÉ Ramírez'), 'jose ramirez')
+        self.assertEqual(fold_name('Straße'), 'strasse')
+        self.assertEqual(name_ngrams('Ab'), set())
+
+    def test_accents_and_case_are_ignored(self):
+        self.assertEqual(self.candidates('jose'), {self.contact.pk})
+        self.assertEqual(self.candidates('RAMIR'), {self.contact.pk})
+        self.assertEqual(self.candidates('walk'), {self.user.pk})
+        self.assertEqual(self.candidates('xyz'), set())
+
+    def test_contact_names_are_indexed_for_the_contact(self):
+        UserContact.objects.create(user=self.user, contact=self.contact, name='Pepe Uncle')
+        self.assertEqual(self.candidates('uncle'), {self.contact.pk})
+
+    def test_new_contact_name_does_not_read_the_other_names(self):
+        for index in range(3):
+            saver = self.create_user(f'+1555000010{index}')
+            UserContact.objects.create(user=saver, contact=self.contact, name=f'Saver {index}')
+        with CaptureQueriesContext(connection) as queries:
+            UserContact.objects.create(user=self.user, contact=self.contact, name='Pepe')
+        self.assertFalse([
+            query['sql'] for query in queries
+            if query['sql'].startswith('SELECT') and 'core_usercontact' in query['sql']
+        ])
+        self.assertEqual(self.candidates('pepe'), {self.contact.pk})
+
+    def test_renamed_and_removed_names_are_unindexed(self):
+        user_contact = UserContact.objects.create(user=self.user, contact=self.contact, name='Pepe')
+        user_contact.name = 'Joe'
+        user_contact.save()
+        self.assertEqual(self.candidates('pepe'), set())
+        self.assertEqual(self.candidates('joe'), {self.contact.pk})
+        with self.captureOnCommitCallbacks(execute=True):
+            user_contact.delete()
+        self.assertEqual(self.candidates('joe'), set())
+
+    def test_deleted_contact_is_unindexed(self):
+        UserContact.objects.create(user=self.user, contact=self.contact, name='Pepe')
+        contact_pk = self.contact.pk
+        with self.captureOnCommitCallbacks(execute=True):
+            self.contact.delete()
+        self.assertFalse(NameNgram.objects.filter(person_id=contact_pk).exists())
+
+    def test_contact_deleted_through_a_queryset_is_unindexed(self):
+        UserContact.objects.create(user=self.user, contact=self.contact, name='Pepe')
+        with self.captureOnCommitCallbacks(execute=True):
+            Person.objects.filter(pk=self.contact.pk).delete()
+        self.assertFalse(NameNgram.objects.filter(person_id=self.contact.pk).exists())
+        self.assertEqual(self.candidates('walk'), {self.user.pk})
+
+    def test_renamed_person_is_reindexed(self):
+        self.user.name = 'Alice Cooper'
+        self.user.save()
+        self.assertEqual(self.candidates('walker'), set())
+        self.assertEqual(self.candidates('cooper'), {self.user.pk})
+
+    def test_rebuild_matches_the_incremental_index(self):
+        UserContact.objects.create(user=self.user, contact=self.contact, name='Pepe')
+        incremental = self.postings()
+        get_name_search_index().rebuild()
+        self.assertEqual(self.postings(), incremental)
+
+    def test_name_search_uses_the_contact_names(self):
+        UserContact.objects.create(user=self.user, contact=self.contact, name='Pepe Uncle')
+        response = self.client_for(self.user).get('/api/search/', {'search_by': 'name', 'name': 'uncle'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([result['name'] for result in response.json()['results']], ['Pepe Uncle'])
+
+
+class PhoneSearchTests(ApiTestCase):
+    """
+    Phone number search returns the registered user, or else the names the number is saved
+    under, each once, the most common first.
+    """
+    phone_number = '+15559990001'
+
+    def setUp(self):
+        super().setUp()
+        self.savers = [self.create_user(f'+1555000000{index}', f'Saver {index}') for index in range(4)]
+        self.contact = Person.objects.create_contact(self.phone_number, None)
+
+    def save_contact(self, saver, name, contact=None):
+        UserContact.objects.create(user=saver, contact=contact or self.contact, name=name)
+
+    def search(self, phone_number=None):
+        response = self.client_for(self.savers[0]).get(
+            '/api/search/', {'search_by': 'phone_number', 'phone_number': phone_number or self.phone_number}
+        )
+        self.assertEqual(response.status_code, 200)
+        return [(result['name'], result['spam_reports']) for result in response.json()['results']]
+
+    def test_names_are_grouped_by_count(self):
+        for saver, name in zip(self.savers, ['Bob', 'Rob', 'bob ', 'Aaron']):
+            self.save_contact(saver, name)
+        SpamReport.objects.create(reported_by=self.savers[0], spam_person=self.contact)
+        self.assertEqual(self.search(), [('Bob', 1), ('Aaron', 1), ('Rob', 1)])
+
+    @override_settings(SEARCH_CONTACT_NAMES_LIMIT=2)
+    def test_names_are_limited(self):
+        for saver, name in zip(self.savers, ['Bob', 'Rob', 'Bob', 'Aaron']):
+            self.save_contact(saver, name)
+        self.assertEqual(self.search(), [('Bob', 0), ('Aaron', 0)])
+
+    def test_registered_user_hides_the_contact_names(self):
+        self.save_contact(self.savers[1], 'Bob')
+        self.save_contact(self.savers[2], self.savers[3].name, self.savers[3])
+        self.assertEqual(self.search(self.savers[3].phone_number), [('Saver 3', 0)])
+
+    def test_queries_do_not_grow_with_the_names(self):
+        other = Person.objects.create_contact('+15559990002', None)
+        self.save_contact(self.savers[0], 'Bob', other)
+        for saver, name in zip(self.savers, ['Bob', 'Rob', 'Ann', 'Aaron']):
+            self.save_contact(saver, name)
+        # Authenticate first, so both searches find the token cached
+        self.search('+15559990003')
+        with CaptureQueriesContext(connection) as few_names:
+            self.search(other.phone_number)
+        with CaptureQueriesContext(connection) as many_names:
+            self.search()
+        self.assertEqual(len(many_names), len(few_names))
+
+
+class NameNgramMigrationTests(MigrationTestCase):
+    """
+    Migration 0003 indexes the folded names of the people and their contact names in batches.
+    """
+    migrate_from = [('core', '0002_person_spam_count'), ('authtoken', '0003_tokenproxy')]
+    migrate_to = [('core', '0003_name_ngram'), ('authtoken', '0003_tokenproxy')]
+
+    def test_backfill(self):
+        Person = self.apps.get_model('core', 'Person')
+        UserContact = self.apps.get_model('core', 'UserContact')
+        people = [
+            Person.objects.create(phone_number=f'+1555000000{index}', name=name, type='user')
+            for index, name in enumerate(['José Ramírez', 'Alice', None, 'Bob'])
+        ]
+        UserContact.objects.create(user=people[1], contact=people[0], name='Pepe')
+        UserContact.objects.create(user=people[0], contact=people[2], name='Straße')
+
+        with mock.patch.object(import_module('core.migrations.0003_name_ngram'), 'BATCH_SIZE', 2):
+            apps = self.migrate()
+        expected = {
+            (person.pk, gram)
+            for person, name in [
+                (people[0], 'José Ramírez'), (people[0], 'Pepe'), (people[1], 'Alice'),
+                (people[2], 'Straße'), (people[3], 'Bob'),
+            ]
+            for gram in name_ngrams(name)
+        }
+        self.assertEqual(set(apps.get_model('core', 'NameNgram').objects.values_list('person_id', 'gram')), expected)
@@ -0,0 +1,60 @@
+from django.conf import settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from core.models import Person, SpamReport, UserContact
+from core.tests.utils import ApiTestCase
+
+
+class SearchBatchTests(ApiTestCase):
+    """
+    Batch search returns the phone number search results of many numbers at once.
+    """
+    def setUp(self):
+        super().setUp()
+        self.users = [self.create_user(f'+1555000000{index}', f'User {index}') for index in range(3)]
+        self.spam = Person.objects.create_contact('+15559990001', None)
+        for user, name in zip(self.users, ['Spam Caller', 'Spam Caller', 'Bad']):
+            UserContact.objects.create(user=user, contact=self.spam, name=name)
+        SpamReport.objects.create(reported_by=self.users[0], spam_person=self.spam)
+        self.client = self.client_for(self.users[0])
+
+    def search_batch(self, phone_numbers):
+        return self.client.post('/api/search/batch/', {'phone_numbers': phone_numbers}, format='json')
+
+    def search(self, phone_number):
+        return self.client.get(
+            '/api/search/', {'search_by': 'phone_number', 'phone_number': phone_number}
+        ).json()['results']
+
+    def test_results_match_the_single_searches(self):
+        response = self.search_batch(['555 999 0001', '+15550000001', '+15559990002', '+1 555 999 0001'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.json()), ['+15559990001', '+15550000001', '+15559990002'])
+        self.assertEqual(response.json()['+15559990001'], [
+            {'name': 'Spam Caller', 'phone_number': '+15559990001', 'spam_reports': 1, 'spam_score': None},
+            {'name': 'Bad', 'phone_number': '+15559990001', 'spam_reports': 1, 'spam_score': None},
+        ])
+        self.assertEqual(response.json()['+15559990002'], [])
+        for phone_number, results in response.json().items():
+            self.assertEqual(self.search(phone_number), results)
+
+    def test_queries_do_not_grow_with_the_numbers(self):
+        self.search_batch(['+15559990003'])
+        with CaptureQueriesContext(connection) as few_numbers:
+            self.search_batch(['+15559990001', '+15550000001'])
+        with CaptureQueriesContext(connection) as many_numbers:
+            self.search_batch(['+15559990004', '+15550000002', '+15550000003', '+15559990005'])
+        self.assertEqual(len(many_numbers), len(few_numbers))
+
+    def test_cached_results_skip_the_database(self):
+        self.search_batch(['+15559990001', '+15550000001'])
+        with self.assertNumQueries(0):
+            response = self.search_batch(['+15559990001', '+15550000001'])
+        self.assertEqual(len(response.json()['+15550000001']), 1)
+
+    def test_invalid_batches(self):
+        too_many = [f'+1555{index:07d}' for index in range(settings.SEARCH_BATCH_MAX_NUMBERS + 1)]
+        for phone_numbers in [[], ['not a number'], too_many]:
+            with self.subTest(count=len(phone_numbers)):
+                self.assertEqual(self.search_batch(phone_numbers).status_code, 400)
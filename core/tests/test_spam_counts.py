@@ -0,0 +1,54 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from core.models import Person, SpamReport
+
+
+class SpamCountTests(TestCase):
+    """
+    The denormalized spam counter follows the spam reports and is rebuilt from them.
+    """
+    def setUp(self):
+        self.reporters = [
+            Person.objects.create_user(f'+1555000000{index}', f'Reporter {index}', 'password')
+            for index in range(3)
+        ]
+        self.spam_person = Person.objects.create_spam_person('+15559990001')
+
+    def spam_count(self):
+        return Person.objects.get(pk=self.spam_person.pk).spam_count
+
+    def test_reports_increment_the_counter(self):
+        for reporter in self.reporters:
+            SpamReport.objects.create(reported_by=reporter, spam_person=self.spam_person)
+        self.assertEqual(self.spam_count(), 3)
+
+    def test_deleted_reports_decrement_the_counter(self):
+        reports = [
+            SpamReport.objects.create(reported_by=reporter, spam_person=self.spam_person)
+            for reporter in self.reporters
+        ]
+        reports[0].delete()
+        self.assertEqual(self.spam_count(), 2)
+
+    def test_deleting_the_reporter_decrements_the_counter(self):
+        for reporter in self.reporters:
+            SpamReport.objects.create(reported_by=reporter, spam_person=self.spam_person)
+        self.reporters[0].delete()
+        self.assertEqual(self.spam_count(), 2)
+
+    def test_counter_does_not_go_negative(self):
+        report = SpamReport.objects.create(reported_by=self.reporters[0], spam_person=self.spam_person)
+        Person.objects.filter(pk=self.spam_person.pk).update(spam_count=0)
+        report.delete()
+        self.assertEqual(self.spam_count(), 0)
+
+    def test_rebuild_spam_counts(self):
+        for reporter in self.reporters[:2]:
+            SpamReport.objects.create(reported_by=reporter, spam_person=self.spam_person)
+        Person.objects.update(spam_count=7)
+        call_command('rebuild_spam_counts', stdout=StringIO())
+        self.assertEqual(self.spam_count(), 2)
+        self.assertEqual(Person.objects.get(pk=self.reporters[0].pk).spam_count, 0)
@@ -0,0 +1,94 @@
+from django.test import SimpleTestCase, override_settings
+
+from core.models import Person, SpamReport
+from core.spam_filter import BloomFilter, SpamNumberFilter, spam_number_filter
+from core.tests.utils import ApiTestCase
+
+
+class BloomFilterTests(SimpleTestCase):
+    """
+    The Bloom filter has no false negatives and about error_rate false positives.
+    """
+    def test_membership(self):
+        bloom_filter = BloomFilter(1000, 0.01)
+        keys = range(15550000000, 15550001000)
+        for key in keys:
+            bloom_filter.add(key)
+        self.assertTrue(all(key in bloom_filter for key in keys))
+        false_positives = sum(key in bloom_filter for key in range(15560000000, 15560010000))
+        self.assertLess(false_positives, 300)
+
+    def test_keys_are_counted_once(self):
+        bloom_filter = BloomFilter(1000, 0.01)
+        bloom_filter.add(15550000001)
+        bloom_filter.add(15550000001)
+        bloom_filter.add(-1)
+        self.assertEqual(bloom_filter.count, 2)
+
+
+@override_settings(SPAM_FILTER_CAPACITY=100, SPAM_FILTER_REFRESH_INTERVAL=0, SPAM_FILTER_REFRESH_OVERLAP=0)
+class SpamNumberFilterTests(ApiTestCase):
+    """
+    The spam filter holds the phone keys of every reported person, and keeps up with the new
+    reports.
+    """
+    def setUp(self):
+        super().setUp()
+        self.users = [self.create_user(f'+1555000000{index}', f'User {index}') for index in range(3)]
+        self.spam_filter = SpamNumberFilter()
+
+    def report(self, reporter, phone_number):
+        spam_person = Person.objects.get_by_phone_number(phone_number) or Person.objects.create_spam_person(phone_number)
+        return SpamReport.objects.create(reported_by=reporter, spam_person=spam_person)
+
+    def test_built_from_the_reported_people(self):
+        self.report(self.users[0], '+15559990001')
+        self.assertTrue(self.spam_filter.might_be_spam(15559990001))
+        self.assertFalse(self.spam_filter.might_be_spam(15559990002))
+
+    def test_refresh_adds_new_reports(self):
+        self.spam_filter.build()
+        self.report(self.users[0], '+15559990001')
+        self.assertTrue(self.spam_filter.might_be_spam(15559990001))
+
+    @override_settings(SPAM_FILTER_REFRESH_OVERLAP=10)
+    def test_late_commit_is_caught_by_the_overlap(self):
+        late = self.report(self.users[0], '+15559990001')
+        # A refresh saw a higher id while this report wasn't committed yet
+        self.spam_filter.bloom_filter = BloomFilter(100, 0.01)
+        self.spam_filter.last_report_id = late.id + 1
+        self.assertTrue(self.spam_filter.might_be_spam(15559990001))
+        self.assertEqual(self.spam_filter.last_report_id, late.id + 1)
+
+    def test_rebuilt_once_over_capacity(self):
+        self.spam_filter.build()
+        capacity = self.spam_filter.bloom_filter.capacity
+        for index in range(capacity + 1):
+            self.report(self.users[index % 3], f'+1555888{index:04d}')
+        self.spam_filter.refresh()
+        self.assertGreater(self.spam_filter.bloom_filter.capacity, capacity)
+        self.assertTrue(self.spam_filter.might_be_spam(15558880000))
+
+    def test_warm_up(self):
+        self.report(self.users[0], '+15559990001')
+        self.spam_filter.warm_up()
+        self.assertIsNotNone(self.spam_filter.bloom_filter)
+        self.assertIn(15559990001, self.spam_filter.bloom_filter)
+
+    @override_settings(SPAM_FILTER_REFRESH_INTERVAL=3600)
+    def test_new_report_is_added_without_a_refresh(self):
+        self.assertFalse(spam_number_filter.might_be_spam(15559990001))
+        self.report(self.users[0], '+15559990001')
+        self.assertTrue(spam_number_filter.might_be_spam(15559990001))
+
+    @override_settings(SPAM_FILTER_REFRESH_INTERVAL=3600)
+    def test_spam_check(self):
+        self.report(self.users[0], '+15559990001')
+        client = self.client_for(self.users[1])
+        response = client.get('/api/spam/check/', {'phone_number': '555 999 0001'})
+        self.assertEqual(response.json(), {
+            'phone_number': '+15559990001', 'spam': True, 'spam_reports': 1, 'spam_score': None,
+        })
+        with self.assertNumQueries(0):
+            response = client.get('/api/spam/check/', {'phone_number': '+15559990002'})
+        self.assertEqual(response.json()['spam'], False)
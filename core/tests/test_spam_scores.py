@@ -0,0 +1,109 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import DatabaseError
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from core.models import Person, SpamReport, SpamScore, Watermark
+
+
+@override_settings(
+    SPAM_SCORE_HALF_WEIGHT=10, SPAM_SCORE_RECENT_DAYS=30, SPAM_SCORE_ESTABLISHED_DAYS=90,
+    SPAM_SCORE_REFRESH_OVERLAP=0,
+)
+class SpamScoreTests(TestCase):
+    """
+    Spam scores are recomputed from the reports, incrementally or in full.
+    """
+    def setUp(self):
+        self.reporters = [
+            Person.objects.create_user(f'+1555000000{index}', f'Reporter {index}', 'password')
+            for index in range(3)
+        ]
+        self.spam_people = [Person.objects.create_spam_person(f'+1555999000{index}') for index in range(2)]
+
+    def report(self, reporter, spam_person):
+        return SpamReport.objects.create(reported_by=reporter, spam_person=spam_person)
+
+    def scores(self):
+        return dict(SpamScore.objects.values_list('person_id', 'score'))
+
+    def test_compute_score(self):
+        self.assertEqual(SpamScore.objects.compute_score(0, 0, 0), 0)
+        self.assertEqual(SpamScore.objects.compute_score(5, 5, 0), 0.5)
+        self.assertEqual(SpamScore.objects.compute_score(1, 1, 1), 0.2308)
+
+    def test_old_reports_from_new_accounts_weigh_less(self):
+        Person.objects.filter(pk=self.reporters[0].pk).update(created_at=timezone.now() - timedelta(days=100))
+        self.report(self.reporters[0], self.spam_people[0])
+        old_report = self.report(self.reporters[1], self.spam_people[1])
+        SpamReport.objects.filter(pk=old_report.pk).update(created_at=timezone.now() - timedelta(days=40))
+        self.assertEqual(SpamScore.objects.refresh(), 2)
+        score = SpamScore.objects.get(person=self.spam_people[0])
+        self.assertEqual(
+            (score.reporters, score.recent_reports, score.established_reporters, score.score), (1, 1, 1, 0.2308)
+        )
+        score = SpamScore.objects.get(person=self.spam_people[1])
+        self.assertEqual(
+            (score.reporters, score.recent_reports, score.established_reporters, score.score), (1, 0, 0, 0.0909)
+        )
+
+    def test_incremental_refresh_only_recomputes_new_reports(self):
+        self.report(self.reporters[0], self.spam_people[0])
+        SpamScore.objects.refresh()
+        self.report(self.reporters[1], self.spam_people[1])
+        self.assertEqual(SpamScore.objects.refresh(), 1)
+        self.assertEqual(SpamScore.objects.refresh(), 0)
+        self.assertEqual(self.scores(), {self.spam_people[0].pk: 0.1667, self.spam_people[1].pk: 0.1667})
+
+    @override_settings(SPAM_SCORE_REFRESH_OVERLAP=10)
+    def test_late_commit_is_caught_by_the_overlap(self):
+        late = self.report(self.reporters[0], self.spam_people[0])
+        # A refresh saw a higher id while this report wasn't committed yet
+        Watermark.objects.create(name=SpamScore.objects.WATERMARK, last_id=late.id + 1)
+        self.report(self.reporters[1], self.spam_people[1])
+        self.assertEqual(SpamScore.objects.refresh(), 2)
+        self.assertEqual(set(self.scores()), {self.spam_people[0].pk, self.spam_people[1].pk})
+
+    def test_full_refresh_catches_up_and_drops_stale_scores(self):
+        late = self.report(self.reporters[0], self.spam_people[0])
+        deleted = self.report(self.reporters[1], self.spam_people[1])
+        SpamScore.objects.refresh()
+        deleted.delete()
+        self.report(self.reporters[2], self.spam_people[0])
+        Watermark.objects.filter(name=SpamScore.objects.WATERMARK).update(last_id=late.id + 10)
+        self.assertEqual(SpamScore.objects.refresh(), 0)
+        call_command('refresh_spam_scores', '--full', stdout=StringIO())
+        self.assertEqual(self.scores(), {self.spam_people[0].pk: 0.2857})
+
+    def test_interrupted_full_refresh_resumes(self):
+        for spam_person in self.spam_people:
+            self.report(self.reporters[0], spam_person)
+        # No longer reported, and in the range of the first batch
+        SpamScore.objects.create(
+            person=self.reporters[1], score=0.5, reporters=1, recent_reports=1, established_reporters=0,
+            last_reported_at=timezone.now(),
+        )
+        upsert = SpamScore.objects.upsert
+        batches = []
+
+        def upsert_first_batch(aggregates):
+            batches.append(aggregates)
+            if len(batches) > 1:
+                raise DatabaseError('Interrupted')
+            upsert(aggregates)
+
+        with mock.patch.object(SpamScore.objects, 'upsert', side_effect=upsert_first_batch):
+            with self.assertRaises(DatabaseError):
+                SpamScore.objects.refresh(full=True, batch_size=1)
+        # The first batch was committed, along with the progress of the run
+        self.assertEqual(set(self.scores()), {self.spam_people[0].pk})
+        self.assertEqual(Watermark.objects.get(name=SpamScore.objects.FULL_WATERMARK).last_id, self.spam_people[0].pk)
+
+        self.assertEqual(SpamScore.objects.refresh(full=True, batch_size=1), 1)
+        self.assertEqual(self.scores(), {self.spam_people[0].pk: 0.1667, self.spam_people[1].pk: 0.1667})
+        self.assertEqual(Watermark.objects.get(name=SpamScore.objects.FULL_WATERMARK).last_id, 0)
+        self.assertEqual(SpamScore.objects.refresh(), 0)
@@ -0,0 +1,144 @@
+import time
+
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from rest_framework.authtoken.models import Token
+
+from core.benchmark import TokenAsyncClient, serve_async_views
+from core.pool import get_connection_pool
+from core.throttling import CacheBucketStore, LocalBucketStore, get_bucket_store, take_tokens
+from core.tests.utils import ApiTestCase
+
+
+class TakeTokensTests(SimpleTestCase):
+    """
+    Buckets refill at the rate up to the burst, and tell how long to wait for missing tokens.
+    """
+    def test_missing_bucket_starts_full(self):
+        self.assertEqual(take_tokens(None, 3, 1, 10, 100.0), ((7, 100.0), 0))
+
+    def test_refill(self):
+        bucket, wait = take_tokens((0, 100.0), 1, 2, 10, 100.25)
+        self.assertEqual((bucket, wait), ((0.5, 100.25), 0.25))
+        self.assertEqual(take_tokens(bucket, 1, 2, 10, 100.5), ((0, 100.5), 0))
+        # Idle buckets refill up to the burst only
+        self.assertEqual(take_tokens((0, 100.0), 1, 2, 10, 200.0), ((9, 200.0), 0))
+
+    def test_clock_going_back_takes_no_tokens(self):
+        self.assertEqual(take_tokens((5, 100.0), 1, 2, 10, 99.0), ((4, 99.0), 0))
+
+    def test_cost_is_capped_at_the_burst(self):
+        self.assertEqual(take_tokens(None, 50, 1, 10, 100.0), ((0, 100.0), 0))
+        self.assertEqual(take_tokens((4, 100.0), 50, 2, 10, 100.0), ((4, 100.0), 3))
+
+
+class LocalBucketStoreTests(SimpleTestCase):
+    """
+    The local store keeps the THROTTLE_STORE_SIZE most recently used buckets.
+    """
+    @override_settings(THROTTLE_STORE_SIZE=2)
+    def test_least_recently_used_buckets_are_dropped(self):
+        store = LocalBucketStore()
+        for key in ['a', 'b', 'a', 'c']:
+            store.take(key, 1, 1, 10)
+        self.assertEqual(list(store.buckets), ['a', 'c'])
+
+
+@override_settings(
+    THROTTLE_ENABLED=True, THROTTLE_RATE=0.01, THROTTLE_BURST=10, THROTTLE_ANON_RATE=0.01, THROTTLE_ANON_BURST=3,
+    THROTTLE_NAME_SEARCH_COST=5, THROTTLE_SHED_COST=5, THROTTLE_SHED_RETRY_AFTER=2,
+)
+class TokenBucketThrottleTests(ApiTestCase):
+    """
+    Requests take tokens from the bucket of their user, or IP address when anonymous, by the
+    cost of their view, and get a 429 with Retry-After once it runs out.
+    """
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user('+15550000001', 'Alice')
+        self.client = self.client_for(self.user)
+
+    def name_search(self, client=None):
+        return (client or self.client).get('/api/search/', {'search_by': 'name', 'name': 'alice'})
+
+    def phone_search(self, client=None):
+        return (client or self.client).get('/api/search/', {'search_by': 'phone_number', 'phone_number': '+15559990001'})
+
+    def test_burst(self):
+        self.assertEqual([self.name_search().status_code for _ in range(3)], [200, 200, 429])
+        # The bucket is empty, so even a request costing one token waits
+        self.assertEqual(self.phone_search().status_code, 429)
+        other = self.client_for(self.create_user('+15550000002', 'Bob'))
+        self.assertEqual(self.name_search(other).status_code, 200)
+
+    def test_retry_after(self):
+        self.name_search()
+        self.name_search()
+        response = self.name_search()
+        self.assertEqual(response.status_code, 429)
+        # 5 tokens at 0.01 tokens per second, in whole seconds rounded up
+        self.assertEqual(response['Retry-After'], '500')
+        self.assertIn('500 seconds', response.json()['detail'])
+
+    def test_refill(self):
+        self.name_search()
+        self.name_search()
+        self.assertEqual(self.phone_search().status_code, 429)
+        # Move the bucket back in time by the seconds one token takes to refill
+        key = f'user:{self.user.pk}'
+        tokens, updated_at = get_bucket_store().buckets[key]
+        get_bucket_store().buckets[key] = (tokens, updated_at - 100)
+        self.assertEqual(self.phone_search().status_code, 200)
+        self.assertEqual(self.phone_search().status_code, 429)
+
+    def test_anonymous_requests_are_keyed_by_ip_address(self):
+        client = self.client_for()
+        self.assertEqual([self.phone_search(client).status_code for _ in range(4)], [200, 200, 200, 429])
+        self.assertEqual(self.phone_search(self.client_for()).status_code, 429)
+        other_address = self.client_for()
+        other_address.defaults['REMOTE_ADDR'] = '10.0.0.2'
+        self.assertEqual(self.phone_search(other_address).status_code, 200)
+        # Authenticated requests from the same address have their own bucket
+        self.assertEqual(self.phone_search().status_code, 200)
+
+    @override_settings(DB_POOL_SIZE=2)
+    def test_expensive_requests_are_shed_while_the_pool_is_saturated(self):
+        get_connection_pool.cache_clear()
+        self.addCleanup(get_connection_pool.cache_clear)
+        pool = get_connection_pool()
+        # The request takes the other slot
+        pool.acquire()
+        response = self.name_search()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '2')
+        # Cheap requests still go through
+        self.assertEqual(self.phone_search(self.client_for()).status_code, 200)
+        pool.release()
+        # Shed requests took no tokens
+        self.assertEqual([self.name_search().status_code for _ in range(2)], [200, 200])
+
+    @override_settings(THROTTLE_ENABLED=False)
+    def test_disabled(self):
+        self.assertEqual({self.name_search().status_code for _ in range(4)}, {200})
+
+    def test_async_views(self):
+        client = TokenAsyncClient(Token.objects.get(user=self.user).key)
+
+        @async_to_sync
+        async def name_search():
+            return await client.get('/api/search/', {'search_by': 'name', 'name': 'alice'})
+
+        with serve_async_views(True):
+            responses = [name_search() for _ in range(3)]
+        self.assertEqual([response.status_code for response in responses], [200, 200, 429])
+        self.assertEqual(responses[-1]['Retry-After'], '500')
+
+    @override_settings(THROTTLE_STORE='core.throttling.CacheBucketStore')
+    def test_cache_store(self):
+        get_bucket_store.cache_clear()
+        self.addCleanup(get_bucket_store.cache_clear)
+        self.assertEqual([self.name_search().status_code for _ in range(3)], [200, 200, 429])
+        tokens, updated_at = cache.get(CacheBucketStore.cache_key(f'user:{self.user.pk}'))
+        self.assertLess(tokens, 1)
+        self.assertAlmostEqual(updated_at, time.time(), delta=60)
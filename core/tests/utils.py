@@ -0,0 +1,68 @@
+from django.core.cache import cache
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.authentication import token_user_cache
+from core.models import Person
+from core.spam_filter import spam_number_filter
+from core.throttling import LocalBucketStore, get_bucket_store
+
+PASSWORD = 'test-Password-1'
+
+
+class ApiTestCase(TestCase):
+    """
+    Base of the API tests. The process wide caches, spam filter and throttle buckets outlive
+    the test transactions, so every test starts with them empty.
+    """
+    def setUp(self):
+        cache.clear()
+        token_user_cache.clear()
+        spam_number_filter.clear()
+        if isinstance(get_bucket_store(), LocalBucketStore):
+            get_bucket_store().clear()
+
+    @staticmethod
+    def create_user(phone_number, name='User', **kwargs):
+        return Person.objects.create_user(phone_number, name, PASSWORD, **kwargs)
+
+    @staticmethod
+    def client_for(user=None):
+        """
+        Return an API client authenticated with a token of the user, or anonymous.
+        """
+        client = APIClient()
+        if user is not None:
+            token, _ = Token.objects.get_or_create(user=user)
+            client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        return client
+
+
+class MigrationTestCase(TransactionTestCase):
+    """
+    Base of the data migration tests. Every test starts with the database migrated to
+    migrate_from, and migrates it back to the latest state once done.
+    """
+    migrate_from = []
+    migrate_to = []
+
+    def setUp(self):
+        executor = MigrationExecutor(connection)
+        self.latest = executor.loader.graph.leaf_nodes()
+        executor.migrate(self.migrate_from)
+        self.apps = executor.loader.project_state(self.migrate_from).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.latest)
+
+    def migrate(self):
+        """
+        Migrate to migrate_to and return the historical apps of that state.
+        """
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.migrate_to)
+        return executor.loader.project_state(self.migrate_to).apps
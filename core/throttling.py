@@ -0,0 +1,155 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+from rest_framework.throttling import BaseThrottle
+
+from core.pool import get_connection_pool
+
+
+def take_tokens(bucket, cost, rate, burst, now):
+    """
+    Refill the (tokens, updated at) bucket at rate tokens per second up to burst, then take
+    cost tokens from it. Return the new bucket and the seconds to wait before the tokens are
+    available, 0 when they were taken. A missing bucket starts full.
+    """
+    tokens, updated_at = bucket or (burst, now)
+    tokens = min(burst, tokens + max(now - updated_at, 0) * rate)
+    # A request costing more than a full bucket would never get through
+    cost = min(cost, burst)
+    if tokens >= cost:
+        return (tokens - cost, now), 0
+    return (tokens, now), (cost - tokens) / rate
+
+
+class LocalBucketStore:
+    """
+    Thread safe in-process LRU of token buckets, bounded by THROTTLE_STORE_SIZE. Every process
+    enforces the limits on its own, so a client spread over several processes gets more.
+    """
+    def __init__(self):
+        self.max_size = settings.THROTTLE_STORE_SIZE
+        self.buckets = OrderedDict()
+        self.lock = threading.Lock()
+
+    def take(self, key, cost, rate, burst):
+        """
+        Take cost tokens from the bucket of the key, and return the seconds to wait before
+        they are available, 0 when they were taken.
+        """
+        with self.lock:
+            self.buckets[key], wait = take_tokens(self.buckets.get(key), cost, rate, burst, time.monotonic())
+            self.buckets.move_to_end(key)
+            while len(self.buckets) > self.max_size:
+                self.buckets.popitem(last=False)
+        return wait
+
+    async def atake(self, key, cost, rate, burst):
+        return self.take(key, cost, rate, burst)
+
+    def clear(self):
+        with self.lock:
+            self.buckets.clear()
+
+
+class CacheBucketStore:
+    """
+    Token buckets kept in the shared cache, so the limits hold across processes. Buckets are
+    read and written back without a lock, so concurrent requests of a client may take a few
+    tokens more than allowed. Buckets expire once they would have refilled.
+    """
+    @staticmethod
+    def cache_key(key):
+        return f'throttle:{key}'
+
+    def take(self, key, cost, rate, burst):
+        """
+        Take cost tokens from the bucket of the key, and return the seconds to wait before
+        they are available, 0 when they were taken.
+        """
+        cache_key = self.cache_key(key)
+        bucket, wait = take_tokens(cache.get(cache_key), cost, rate, burst, time.time())
+        cache.set(cache_key, bucket, math.ceil(burst / rate))
+        return wait
+
+    async def atake(self, key, cost, rate, burst):
+        """
+        Async version of take.
+        """
+        cache_key = self.cache_key(key)
+        bucket, wait = take_tokens(await cache.aget(cache_key), cost, rate, burst, time.time())
+        await cache.aset(cache_key, bucket, math.ceil(burst / rate))
+        return wait
+
+
+@lru_cache(maxsize=None)
+def get_bucket_store():
+    """
+    Return the token bucket store configured by the THROTTLE_STORE setting.
+    """
+    return import_string(settings.THROTTLE_STORE)()
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Throttle giving every user, and every IP address for anonymous requests, a token bucket
+    refilled at THROTTLE_RATE tokens per second up to THROTTLE_BURST tokens, or
+    THROTTLE_ANON_RATE and THROTTLE_ANON_BURST. Requests take the number of tokens returned by
+    the view's get_throttle_cost, 1 by default, so expensive searches run out sooner. While
+    every connection pool slot is taken, requests costing THROTTLE_SHED_COST or more are
+    refused outright, shedding the expensive load before the queries queue up.
+    """
+    retry_after = None
+
+    def get_bucket(self, request):
+        """
+        Return the key, rate and burst of the bucket of the request.
+        """
+        if request.user and request.user.is_authenticated:
+            return f'user:{request.user.pk}', settings.THROTTLE_RATE, settings.THROTTLE_BURST
+        return f'ip:{self.get_ident(request)}', settings.THROTTLE_ANON_RATE, settings.THROTTLE_ANON_BURST
+
+    def get_cost(self, request, view):
+        get_throttle_cost = getattr(view, 'get_throttle_cost', None)
+        return get_throttle_cost(request) if get_throttle_cost else 1
+
+    def shed(self, cost):
+        """
+        Return whether a request of the given cost is refused to shed load.
+        """
+        if cost >= settings.THROTTLE_SHED_COST and get_connection_pool().saturated:
+            self.retry_after = settings.THROTTLE_SHED_RETRY_AFTER
+            return True
+        return False
+
+    def allow_request(self, request, view):
+        if not settings.THROTTLE_ENABLED:
+            return True
+        cost = self.get_cost(request, view)
+        if self.shed(cost):
+            return False
+        key, rate, burst = self.get_bucket(request)
+        self.retry_after = get_bucket_store().take(key, cost, rate, burst)
+        return not self.retry_after
+
+    async def aallow_request(self, request, view):
+        """
+        Async version of allow_request.
+        """
+        if not settings.THROTTLE_ENABLED:
+            return True
+        cost = self.get_cost(request, view)
+        if self.shed(cost):
+            return False
+        key, rate, burst = self.get_bucket(request)
+        self.retry_after = await get_bucket_store().atake(key, cost, rate, burst)
+        return not self.retry_after
+
+    def wait(self):
+        # Retry-After is sent in whole seconds, rounded up so the retry finds the tokens
+        return math.ceil(self.retry_after) if self.retry_after else None
@@ -1,11 +1,27 @@
+from django.conf import settings
 from django.urls import path
-from core.views import RegisterView, LoginView, ProfileView, ContactView, SpamReportView, SearchView
+from core.async_views import AsyncProfileView, AsyncSearchView
+from core.views import (
+    RegisterView, LoginView, ProfileView, ContactView, ContactExportView, ContactSyncView, SpamReportView,
+    SpamCheckView, SearchView, SearchBatchView, MetricsView
+)
+
+# The async views only pay off when served by the ASGI application
+if settings.ASYNC_VIEWS:
+    profile_view, search_view = AsyncProfileView.as_view(), AsyncSearchView.as_view()
+else:
+    profile_view, search_view = ProfileView.as_view(), SearchView.as_view()
 
 urlpatterns = [
     path('register/', RegisterView.as_view(), name='register'),
     path('login/', LoginView.as_view(), name='login'),
-    path('profile/', ProfileView.as_view(), name='profile'),
+    path('profile/', profile_view, name='profile'),
     path('contacts/', ContactView.as_view(), name='contacts'),
+    path('contacts/export/', ContactExportView.as_view(), name='contacts-export'),
+    path('contacts/sync/', ContactSyncView.as_view(), name='contacts-sync'),
     path('spam/', SpamReportView.as_view(), name='spam'),
-    path('search/', SearchView.as_view(), name='search'),
+    path('spam/check/', SpamCheckView.as_view(), name='spam-check'),
+    path('search/', search_view, name='search'),
+    path('search/batch/', SearchBatchView.as_view(), name='search-batch'),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
 ]
@@ -1,23 +1,79 @@
+import csv
+import json
+
+from django.conf import settings
 from django.contrib.auth import authenticate
-from django.db.models import Case, F, CharField, OuterRef, Q, Subquery, Value, When
+from django.http import StreamingHttpResponse
 from rest_framework import generics, permissions
 from rest_framework.authtoken.models import Token
 from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
+from core.cache import (
+    get_many_phone_search_results, get_phone_search_results, get_profile, get_profile_cache_key,
+    set_many_phone_search_results, set_phone_search_results, set_profile
+)
+from core.metrics import PrometheusRenderer, registry
 from core.models import Person, SpamReport, UserContact
+from core.pagination import KeysetPaginationMixin
+from core.phone import phone_number_key
+from core.pool import get_connection_pool
+from core.renderers import FastJSONRenderer
+from core.routers import ReplicaReadMixin, read_from_primary
+from core.spam_filter import spam_number_filter
 from core.serializers import (
+    ContactExportQueryParamSerializer,
+    ContactSyncSerializer,
+    FastSearchResultSerializer,
+    FastUserContactOutputSerializer,
     LoginSerializer,
     PersonSerializer,
     ProfileQueryParamSerializer,
     SearchResultSerializer,
+    SearchBatchSerializer,
     SearchQueryParamSerializer,
+    SpamCheckQueryParamSerializer,
     SpamReportSerializer,
     UserContactSerializer,
     UserContactOutputSerializer
 )
 
 
+class FastSerializerMixin:
+    """
+    Mixin for list views to serve GET requests with their fast_serializer_class when the
+    FAST_SERIALIZERS setting is on: rows are fetched with .values(), serialized by a values
+    serializer and rendered by FastJSONRenderer, producing the same response bytes.
+    """
+    fast_serializer_class = None
+
+    def use_fast_serializer(self):
+        return settings.FAST_SERIALIZERS and self.request.method == 'GET'
+
+    def get_renderers(self):
+        renderers = super().get_renderers()
+        if not self.use_fast_serializer():
+            return renderers
+        return [
+            FastJSONRenderer() if type(renderer) is JSONRenderer else renderer
+            for renderer in renderers
+        ]
+
+    def list(self, request, *args, **kwargs):
+        if not self.use_fast_serializer():
+            return super().list(request, *args, **kwargs)
+        # The keyset ordering values are fetched too, for the next page cursor.
+        queryset = self.fast_serializer_class.values(
+            self.filter_queryset(self.get_queryset()), *(self.get_keyset_ordering() or ())
+        )
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(self.fast_serializer_class(page).data)
+        return Response(self.fast_serializer_class(queryset).data)
+
+
 class RegisterView(generics.CreateAPIView):
     """
     API view to register a new user.
@@ -63,30 +119,48 @@ class ProfileView(generics.RetrieveAPIView):
     queryset = Person.objects.all()
     serializer_class = PersonSerializer
     permission_classes = [permissions.IsAuthenticated]
-    
+
+    def get_phone_number(self):
+        query_params = ProfileQueryParamSerializer(data=self.request.query_params)
+        query_params.is_valid(raise_exception=True)
+        return query_params.validated_data['phone_number']
+
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Serve the profile from the cache of the profiles the user viewed, falling back to the
+        database on a miss. Profiles are cached for a while, so they are read from the primary
+        rather than a replica. Missing profiles aren't cached, so new people need no invalidation.
+        """
+        cache_key = get_profile_cache_key(self.get_phone_number(), request.user.pk)
+        profile = get_profile(cache_key)
+        if profile is None:
+            person = self.get_object()
+            profile = dict(self.get_serializer(person).data)
+            if person is not None:
+                set_profile(cache_key, profile)
+        return Response(profile)
+
     def get_object(self):
         """
-        Return the user whose phone number is provided
+        Return the user whose phone number is provided, with one query deciding whether the
+        email is shown.
         """
-        query_params = ProfileQueryParamSerializer(data=self.request.query_params)
-        query_params.is_valid(raise_exception=True)
-        person = Person.objects.filter(phone_number=query_params.validated_data['phone_number']).first()
-        if person:
-            # Not adding registered user check here as only registered users will have email populated.
-            show_email = UserContact.objects.filter(user=person, contact=self.request.user).exists() or person==self.request.user
-            if not show_email:
-                person.email = None
+        person = Person.objects.get_profile_queryset(self.get_phone_number(), self.request.user).first()
+        # Not adding registered user check here as only registered users will have email populated.
+        if person and not (person.saved_viewer or person.pk == self.request.user.pk):
+            person.email = None
         return person
 
 
-
-class ContactView(generics.ListCreateAPIView):
+class ContactView(ReplicaReadMixin, FastSerializerMixin, KeysetPaginationMixin, generics.ListCreateAPIView):
     """
     API view to list and create user contacts.
     """
     queryset = UserContact.objects.all().select_related('contact')
     serializer_class = UserContactSerializer
+    fast_serializer_class = FastUserContactOutputSerializer
     permission_classes = [permissions.IsAuthenticated]
+    keyset_ordering = ('created_at', 'id')
 
     def get_serializer_class(self):
         if self.request.method == 'GET':
@@ -106,6 +180,76 @@ class ContactView(generics.ListCreateAPIView):
         return self.queryset.filter(user=self.request.user)
 
 
+class EchoBuffer:
+    """
+    File-like object returning what is written to it, to stream the csv writer's output.
+    """
+    def write(self, value):
+        return value
+
+
+class ContactExportView(generics.GenericAPIView):
+    """
+    API view to export all the contacts of the logged-in user in one streamed response.
+    """
+    serializer_class = ContactExportQueryParamSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    fields = ['id', 'name', 'phone_number']
+
+    def get(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        if serializer.validated_data['export_format'] == ContactExportQueryParamSerializer.CSV:
+            response = StreamingHttpResponse(self.csv_lines(), content_type='text/csv; charset=utf-8')
+            response['Content-Disposition'] = 'attachment; filename="contacts.csv"'
+        else:
+            response = StreamingHttpResponse(self.ndjson_lines(), content_type='application/x-ndjson')
+        return response
+
+    def get_rows(self):
+        """
+        Yield the (id, name, phone number) of every contact, fetching CONTACT_EXPORT_BATCH_SIZE
+        rows per query. Batches seek on the id rather than using a single cursor, as MySQL
+        clients buffer the whole result set of a query.
+        """
+        contacts = UserContact.objects.filter(user=self.request.user).order_by('id').values_list(
+            'id', 'name', 'contact__phone_number'
+        )
+        last_id = 0
+        while True:
+            rows = list(contacts.filter(id__gt=last_id)[:settings.CONTACT_EXPORT_BATCH_SIZE])
+            yield from rows
+            if len(rows) < settings.CONTACT_EXPORT_BATCH_SIZE:
+                return
+            last_id = rows[-1][0]
+
+    def ndjson_lines(self):
+        for row in self.get_rows():
+            yield json.dumps(dict(zip(self.fields, row)), ensure_ascii=False) + '\n'
+
+    def csv_lines(self):
+        writer = csv.writer(EchoBuffer())
+        yield writer.writerow(self.fields)
+        for row in self.get_rows():
+            yield writer.writerow(row)
+
+
+class ContactSyncView(generics.GenericAPIView):
+    """
+    API view to sync a whole address book into the user's contacts.
+    """
+    serializer_class = ContactSyncSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        """
+        Upsert the given contacts and return how many were created, updated and unchanged.
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response(serializer.save())
+
+
 class SpamReportView(generics.CreateAPIView):
     """
     API view to create a spam report.
@@ -122,29 +266,128 @@ class SpamReportView(generics.CreateAPIView):
         serializer.validated_data['reported_by'] = self.request.user
         serializer.save()
 
+    def create(self, request, *args, **kwargs):
+        """
+        Create the spam report, or with SPAM_REPORTS_ASYNC queue it and accept the request
+        without waiting for the report to be applied.
+        """
+        if not settings.SPAM_REPORTS_ASYNC:
+            return super().create(request, *args, **kwargs)
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        serializer.enqueue(reported_by=request.user)
+        return Response({'detail': 'Spam report accepted.'}, status=202)
+
 
-class SearchView(generics.ListAPIView):
+class SpamCheckView(generics.GenericAPIView):
+    """
+    API view to check whether a phone number is reported as spam, e.g. for an incoming call.
+    """
+    serializer_class = SpamCheckQueryParamSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        """
+        Answer from the in-memory spam filter, only querying the database to confirm a number
+        the filter reports as possibly spam.
+        """
+        serializer = self.get_serializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        phone_number = serializer.validated_data['phone_number']
+        phone_key = phone_number_key(phone_number)
+        person = None
+        if spam_number_filter.might_be_spam(phone_key):
+            person = Person.objects.filter(
+                phone_key=phone_key, spam_count__gt=0
+            ).select_related('spam_score').only('spam_count', 'spam_score__score').first()
+        return Response({
+            'phone_number': phone_number,
+            'spam': person is not None,
+            'spam_reports': person.spam_count if person else 0,
+            # Scores are refreshed separately, so a reported number may not have one yet
+            'spam_score': getattr(getattr(person, 'spam_score', None), 'score', None),
+        })
+
+
+class SearchView(ReplicaReadMixin, FastSerializerMixin, KeysetPaginationMixin, generics.ListAPIView):
     """
     API view to search for people by name or phone number.
     """
     serializer_class = SearchResultSerializer
+    fast_serializer_class = FastSearchResultSerializer
     pagination_class = LimitOffsetPagination
 
+    def get_keyset_ordering(self):
+        """
+        Seek on the rank bucket, display name and id for name search. Phone number search
+        results are small and keep limit/offset pagination.
+        """
+        if self.request.query_params.get('search_by') == SearchQueryParamSerializer.NAME:
+            return ('order_field', 'display_name', 'id')
+        return None
+
+    def get_throttle_cost(self, request):
+        """
+        Name search scans far more rows than a phone number lookup, so it costs more tokens.
+        """
+        if request.query_params.get('search_by') == SearchQueryParamSerializer.NAME:
+            return settings.THROTTLE_NAME_SEARCH_COST
+        return 1
+
+    def get_query_params(self):
+        """
+        Return the validated search query params.
+        """
+        if not hasattr(self, '_query_params'):
+            query_params = SearchQueryParamSerializer(data=self.request.query_params)
+            query_params.is_valid(raise_exception=True)
+            self._query_params = query_params.validated_data
+        return self._query_params
+
+    def list(self, request, *args, **kwargs):
+        """
+        Serve phone number searches from the cache, falling back to the database on a miss.
+        """
+        query_params = self.get_query_params()
+        if query_params['search_by'] != SearchQueryParamSerializer.PHONE_NUMBER:
+            return super().list(request, *args, **kwargs)
+
+        phone_number = query_params['phone_number']
+        results = get_phone_search_results(phone_number)
+        if results is None:
+            # Cached results would outlive the replication lag, so they are read from the primary
+            with read_from_primary():
+                results = self.get_phone_number_results(phone_number)
+            set_phone_search_results(phone_number, results)
+        return self.get_paginated_response(self.paginate_queryset(results))
+
+    def get_phone_number_results(self, phone_number):
+        """
+        Return the serialized results of a phone number search, as cached.
+        """
+        if not self.use_fast_serializer():
+            serializer = self.get_serializer(self.get_people_by_phone_number(phone_number), many=True)
+            return [dict(result) for result in serializer.data]
+        phone_keys = [phone_number_key(phone_number)]
+        rows = list(self.fast_serializer_class.values(Person.objects.search_registered_users(phone_keys)))
+        if not rows:
+            rows = self.fast_serializer_class.values(Person.objects.search_contact_names(phone_keys))
+        return self.fast_serializer_class(rows).data
+
     def get_queryset(self):
         """
         Handle search requests and return search results queryset.
         """
-        query_params = SearchQueryParamSerializer(data=self.request.query_params)
-        query_params.is_valid(raise_exception=True)
-        search_by = query_params.validated_data['search_by']
+        query_params = self.get_query_params()
+        search_by = query_params['search_by']
 
         if search_by == SearchQueryParamSerializer.NAME:
             results = self.get_people_by_name(
-                query_params.validated_data['name']
+                query_params['name']
             )
         elif search_by == SearchQueryParamSerializer.PHONE_NUMBER:
             results = self.get_people_by_phone_number(
-                query_params.validated_data['phone_number']
+                query_params['phone_number']
             )
         return results
 
@@ -152,54 +395,65 @@ class SearchView(generics.ListAPIView):
         """
         Handle search requests by phone number and return search results queryset.
         """
-        person = Person.objects.filter(phone_number=search_query, type='user')
+        phone_keys = [phone_number_key(search_query)]
+        person = Person.objects.search_registered_users(phone_keys)
         if person:
             return person
-        raw_query = """
-            SELECT 
-                p.id,
-                p.phone_number AS phone_number,
-                uc.name AS name
-            FROM 
-                core_person p
-            INNER JOIN 
-                core_usercontact uc ON p.id = uc.contact_id
-            WHERE 
-                uc.id IS NOT NULL AND p.phone_number = %s
-        """
-        return Person.objects.raw(raw_query, [search_query])
-
+        return Person.objects.search_contact_names(phone_keys)
 
     def get_people_by_name(self, search_query):
         """
         Handle search requests by name and return search results queryset.
         """
-        # This will have the side effect of adding Persons name whose contact name includes the
-        # search query but their name doesn't includes the search query which is intentional as
-        # they are ordered last and it will expose the real name of the same phone number to
-        # the user
-        base_qs = Person.objects.annotate(
-            display_name=Case(
-                When(contact_users__name__icontains=search_query, then=F('contact_users__name')),
-                default=F('name'),
-                output_field=CharField()
-            ),
-            order_field=Case(
-                When(
-                    Q(name__istartswith=search_query) |
-                    Q(contact_users__name__istartswith=search_query),
-                    then=Value('1')
-                ),
-                When(
-                    Q(name__icontains=search_query) |
-                    Q(contact_users__name__icontains=search_query),
-                    then=Value('2')
-                ),
-                default=Value('3'),
-                output_field=CharField()
-            )
-        ).filter(
-            Q(name__icontains=search_query) | Q(contact_users__name__icontains=search_query)
-        )
-        final_qs = base_qs.order_by('order_field', 'display_name')
-        return final_qs.distinct()
+        return Person.objects.search_names(search_query)
+
+
+class SearchBatchView(generics.GenericAPIView):
+    """
+    API view to search for many phone numbers at once.
+    """
+    serializer_class = SearchBatchSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_throttle_cost(self, request):
+        return settings.THROTTLE_BATCH_SEARCH_COST
+
+    def post(self, request, *args, **kwargs):
+        """
+        Return the phone number search results of every given number, keyed by its normalized
+        form. Cached results are fetched in one round trip and the rest are resolved with two
+        queries, one for the registered users and one for the contact names of the others.
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        phone_numbers = list(dict.fromkeys(serializer.validated_data['phone_numbers']))
+
+        results = get_many_phone_search_results(phone_numbers)
+        missing = {
+            phone_number_key(phone_number): phone_number
+            for phone_number in phone_numbers if phone_number not in results
+        }
+        if missing:
+            found = {phone_number: [] for phone_number in missing.values()}
+            people = list(Person.objects.search_registered_users(list(missing)))
+            registered = {person.phone_key for person in people}
+            unregistered = [phone_key for phone_key in missing if phone_key not in registered]
+            if unregistered:
+                people += Person.objects.search_contact_names(unregistered)
+            for result in SearchResultSerializer(people, many=True).data:
+                found[result['phone_number']].append(dict(result))
+            set_many_phone_search_results(found)
+            results.update(found)
+        return Response({phone_number: results[phone_number] for phone_number in phone_numbers})
+
+
+class MetricsView(APIView):
+    """
+    API view exposing the request and connection pool metrics of this process in the Prometheus
+    text format.
+    """
+    permission_classes = [permissions.IsAdminUser]
+    renderer_classes = [PrometheusRenderer]
+
+    def get(self, request, *args, **kwargs):
+        return Response(registry.render() + get_connection_pool().render())
@@ -9,8 +9,13 @@ https://docs.djangoproject.com/en/4.1/howto/deployment/asgi/
 
 import os
 
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'spam_api.settings')
 
 application = get_asgi_application()
+
+if settings.SPAM_FILTER_WARM_UP:
+    from core.spam_filter import spam_number_filter
+    spam_number_filter.warm_up()
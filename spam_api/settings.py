@@ -10,9 +10,10 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.1/ref/settings/
 """
 
+from importlib.util import find_spec
 from pathlib import Path
 
-from decouple import config
+from decouple import Csv, config
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -45,6 +46,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.PerformanceMiddleware',
+    'core.middleware.ConnectionPoolMiddleware',
+    'core.middleware.ReplicaStickinessMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -58,11 +62,95 @@ AUTH_USER_MODEL = 'core.Person'
 
 REST_FRAMEWORK = {
    'DEFAULT_AUTHENTICATION_CLASSES': (
-       'rest_framework.authentication.TokenAuthentication',
+       'core.authentication.CachedTokenAuthentication',
+   ),
+   'DEFAULT_THROTTLE_CLASSES': (
+       'core.throttling.TokenBucketThrottle',
    ),
    'PAGE_SIZE': 25
 }
 
+# Token bucket throttling, see core.throttling. Users get THROTTLE_RATE tokens per second up
+# to THROTTLE_BURST, anonymous clients the THROTTLE_ANON_* limits per IP address. Name and
+# batch searches cost more tokens than other requests, which cost one. Set THROTTLE_STORE to
+# core.throttling.CacheBucketStore to share the buckets between processes through the cache.
+THROTTLE_ENABLED = config('THROTTLE_ENABLED', True, cast=bool)
+THROTTLE_RATE = config('THROTTLE_RATE', 10, cast=float)
+THROTTLE_BURST = config('THROTTLE_BURST', 60, cast=int)
+THROTTLE_ANON_RATE = config('THROTTLE_ANON_RATE', 2, cast=float)
+THROTTLE_ANON_BURST = config('THROTTLE_ANON_BURST', 20, cast=int)
+THROTTLE_NAME_SEARCH_COST = config('THROTTLE_NAME_SEARCH_COST', 5, cast=int)
+THROTTLE_BATCH_SEARCH_COST = config('THROTTLE_BATCH_SEARCH_COST', 10, cast=int)
+THROTTLE_STORE = config('THROTTLE_STORE', 'core.throttling.LocalBucketStore')
+THROTTLE_STORE_SIZE = config('THROTTLE_STORE_SIZE', 10000, cast=int)
+# Requests costing this much are refused with a 429 while the connection pool is saturated,
+# asking clients to retry after THROTTLE_SHED_RETRY_AFTER seconds
+THROTTLE_SHED_COST = config('THROTTLE_SHED_COST', 5, cast=int)
+THROTTLE_SHED_RETRY_AFTER = config('THROTTLE_SHED_RETRY_AFTER', 1, cast=int)
+
+# Token authentication cache, see core.authentication
+TOKEN_AUTH_CACHE_SIZE = config('TOKEN_AUTH_CACHE_SIZE', 10000, cast=int)
+TOKEN_AUTH_CACHE_TTL = config('TOKEN_AUTH_CACHE_TTL', 30, cast=int)
+TOKEN_AUTH_SHARED_CACHE = config('TOKEN_AUTH_SHARED_CACHE', False, cast=bool)
+
+# Country calling code assumed for phone numbers given without an international prefix
+DEFAULT_COUNTRY_CODE = config('DEFAULT_COUNTRY_CODE', '1')
+# Digit counts of the national numbers of that country. A number without a prefix which only
+# has one of these lengths once a leading country code is dropped already includes the code.
+DEFAULT_NATIONAL_NUMBER_LENGTHS = config('DEFAULT_NATIONAL_NUMBER_LENGTHS', '7,10', cast=Csv(int))
+
+# Index used to resolve name searches to candidate people, see core.search
+NAME_SEARCH_INDEX = config('NAME_SEARCH_INDEX', 'core.search.NgramNameSearchIndex')
+
+# Limits of the bulk contact sync endpoint
+CONTACT_SYNC_MAX_ENTRIES = config('CONTACT_SYNC_MAX_ENTRIES', 10000, cast=int)
+CONTACT_SYNC_BATCH_SIZE = config('CONTACT_SYNC_BATCH_SIZE', 1000, cast=int)
+
+# Contacts fetched per query by the streaming contact export
+CONTACT_EXPORT_BATCH_SIZE = config('CONTACT_EXPORT_BATCH_SIZE', 2000, cast=int)
+
+# Serve search and profile with async views using the async ORM, for deployments running the
+# ASGI application
+ASYNC_VIEWS = config('ASYNC_VIEWS', False, cast=bool)
+
+# Most phone numbers accepted by the batch search endpoint
+SEARCH_BATCH_MAX_NUMBERS = config('SEARCH_BATCH_MAX_NUMBERS', 1000, cast=int)
+
+# Most contact names returned per number by phone number search, the most common first
+SEARCH_CONTACT_NAMES_LIMIT = config('SEARCH_CONTACT_NAMES_LIMIT', 10, cast=int)
+
+# Queue spam reports in an outbox applied by the process_spam_reports worker instead of
+# applying them in the request
+SPAM_REPORTS_ASYNC = config('SPAM_REPORTS_ASYNC', False, cast=bool)
+SPAM_REPORT_OUTBOX_BATCH_SIZE = config('SPAM_REPORT_OUTBOX_BATCH_SIZE', 1000, cast=int)
+
+# Spam score parameters, see core.managers.SpamScoreManager. A number reaches a score of 0.5
+# once its reports weigh SPAM_SCORE_HALF_WEIGHT.
+SPAM_SCORE_HALF_WEIGHT = config('SPAM_SCORE_HALF_WEIGHT', 10, cast=float)
+SPAM_SCORE_RECENT_DAYS = config('SPAM_SCORE_RECENT_DAYS', 30, cast=int)
+SPAM_SCORE_ESTABLISHED_DAYS = config('SPAM_SCORE_ESTABLISHED_DAYS', 90, cast=int)
+# Number of report ids behind the watermark scanned again by an incremental refresh, to catch
+# the reports committed after a higher id was seen
+SPAM_SCORE_REFRESH_OVERLAP = config('SPAM_SCORE_REFRESH_OVERLAP', 1000, cast=int)
+
+# In-memory filter of reported numbers behind the spam check endpoint, see core.spam_filter.
+# The default capacity takes 12MB per process.
+SPAM_FILTER_CAPACITY = config('SPAM_FILTER_CAPACITY', 10000000, cast=int)
+SPAM_FILTER_ERROR_RATE = config('SPAM_FILTER_ERROR_RATE', 0.01, cast=float)
+SPAM_FILTER_REFRESH_INTERVAL = config('SPAM_FILTER_REFRESH_INTERVAL', 5, cast=float)
+# Number of report ids behind the last one seen scanned again by a refresh, to catch the reports
+# committed after a higher id was seen
+SPAM_FILTER_REFRESH_OVERLAP = config('SPAM_FILTER_REFRESH_OVERLAP', 1000, cast=int)
+# Build the spam filter as the WSGI or ASGI application starts instead of in the first check
+SPAM_FILTER_WARM_UP = config('SPAM_FILTER_WARM_UP', True, cast=bool)
+
+# Serve the contact list and search with lean values serializers and orjson, when installed,
+# instead of the DRF serializers and json, see core.views.FastSerializerMixin
+FAST_SERIALIZERS = config('FAST_SERIALIZERS', False, cast=bool)
+
+# Fraction of requests whose database and serializer time is measured, see core.middleware
+PERF_SAMPLE_RATE = config('PERF_SAMPLE_RATE', 0.01, cast=float)
+
 ROOT_URLCONF = 'spam_api.urls'
 
 TEMPLATES = [
@@ -102,9 +190,63 @@ DATABASES = {
         'PASSWORD': config('DB_PASSWORD', 'root'),
         'HOST': config('DB_HOST', 'localhost'),
         'PORT': config('DB_PORT', '3306'),
+        # Keep connections open across requests, checking they still work before reusing them
+        'CONN_MAX_AGE': config('DB_CONN_MAX_AGE', 60, cast=int),
+        'CONN_HEALTH_CHECKS': config('DB_CONN_HEALTH_CHECKS', True, cast=bool),
+    }
+}
+
+# Read replicas of the default database, as comma separated host or host:port entries. Search
+# and contact list reads go to a random one, see core.routers. Tests run them as
+# mirrors of the test database, so with SQLite any host gives a second alias of the same file.
+for index, replica_host in enumerate(config('DB_REPLICA_HOSTS', '', cast=Csv())):
+    replica_host, _, replica_port = replica_host.partition(':')
+    DATABASES[f'replica_{index}'] = dict(
+        DATABASES['default'],
+        HOST=replica_host,
+        PORT=replica_port or DATABASES['default']['PORT'],
+        TEST={'MIRROR': 'default'},
+    )
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+
+# Requests holding a database connection at once per process, see core.pool. Set it to the
+# threads per worker with WSGI servers, with ASGI servers it bounds the requests in flight.
+# Requests wait up to DB_POOL_TIMEOUT seconds for a free slot before getting a 503.
+DB_POOL_SIZE = config('DB_POOL_SIZE', 8, cast=int)
+DB_POOL_TIMEOUT = config('DB_POOL_TIMEOUT', 5, cast=float)
+
+# Seconds the reads of a user stay on the primary after they write, longer than the replication lag
+REPLICA_STICKY_SECONDS = config('REPLICA_STICKY_SECONDS', 5, cast=int)
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+
+CACHE_BACKEND = config('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache')
+
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': config('CACHE_LOCATION', 'spam-api'),
+        'TIMEOUT': config('CACHE_TIMEOUT', 300, cast=int),
     }
 }
 
+# Only the local backends understand MAX_ENTRIES, shared backends are bounded by their own
+# eviction policy
+if CACHE_BACKEND.rsplit('.', 1)[-1] in ('LocMemCache', 'FileBasedCache', 'DatabaseCache'):
+    CACHES['default']['OPTIONS'] = {'MAX_ENTRIES': config('CACHE_MAX_ENTRIES', 10000, cast=int)}
+
+# Seconds to cache the results of a phone number search
+PHONE_SEARCH_CACHE_TIMEOUT = config('PHONE_SEARCH_CACHE_TIMEOUT', 300, cast=int)
+
+# Seconds to cache a profile as seen by a user
+PROFILE_CACHE_TIMEOUT = config('PROFILE_CACHE_TIMEOUT', 300, cast=int)
+# Seconds to keep the version of a profile, longer than PROFILE_CACHE_TIMEOUT so the profiles
+# cached under a version expire first
+PROFILE_VERSION_CACHE_TIMEOUT = config('PROFILE_VERSION_CACHE_TIMEOUT', 3600, cast=int)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
@@ -124,6 +266,37 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Password hashing
+# https://docs.djangoproject.com/en/4.2/topics/auth/passwords/
+
+# Algorithm of new password hashes: argon2 (needs argon2-cffi), bcrypt (needs bcrypt) or pbkdf2,
+# which is used when the library of the chosen one isn't installed. Hashes of the other
+# algorithms still verify and are upgraded on login, as are hashes with outdated costs.
+PASSWORD_HASHER = config('PASSWORD_HASHER', 'argon2')
+PASSWORD_HASHER_CLASSES = {
+    'argon2': 'core.hashers.Argon2PasswordHasher',
+    'bcrypt': 'core.hashers.BCryptSHA256PasswordHasher',
+    'pbkdf2': 'core.hashers.PBKDF2PasswordHasher',
+}
+if PASSWORD_HASHER != 'pbkdf2' and find_spec(PASSWORD_HASHER) is None:
+    PASSWORD_HASHER = 'pbkdf2'
+PASSWORD_HASHERS = [PASSWORD_HASHER_CLASSES[PASSWORD_HASHER]] + [
+    hasher for name, hasher in PASSWORD_HASHER_CLASSES.items() if name != PASSWORD_HASHER
+] + [
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+ARGON2_TIME_COST = config('ARGON2_TIME_COST', 2, cast=int)
+# KiB
+ARGON2_MEMORY_COST = config('ARGON2_MEMORY_COST', 19456, cast=int)
+ARGON2_PARALLELISM = config('ARGON2_PARALLELISM', 1, cast=int)
+BCRYPT_ROUNDS = config('BCRYPT_ROUNDS', 12, cast=int)
+PBKDF2_ITERATIONS = config('PBKDF2_ITERATIONS', 600000, cast=int)
+
+# Threads hashing passwords per process, bounding the CPU logins and registrations take from
+# the other requests, see core.hashers. 0 hashes in the request thread.
+PASSWORD_HASHING_WORKERS = config('PASSWORD_HASHING_WORKERS', 2, cast=int)
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/4.1/topics/i18n/
@@ -9,8 +9,13 @@ https://docs.djangoproject.com/en/4.1/howto/deployment/wsgi/
 
 import os
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'spam_api.settings')
 
 application = get_wsgi_application()
+
+if settings.SPAM_FILTER_WARM_UP:
+    from core.spam_filter import spam_number_filter
+    spam_number_filter.warm_up()